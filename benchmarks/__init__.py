@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# Importing the package configures the database and the storage, the benchmarks use throwaway ones by default
+_directory = tempfile.mkdtemp(prefix="dataspace-benchmarks-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_directory, 'database.db')}")
+os.environ.setdefault("FILE_STORAGE_DIRECTORY", os.path.join(_directory, "storage"))
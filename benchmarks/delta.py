@@ -0,0 +1,96 @@
+"""
+Benchmark of the delta storage (see ComponentConfiguration.delta_keyframe_interval): the size of the stored
+payloads against the payloads stored in full, and the latency of reading a payload stored in full, or as a delta
+with its keyframe parsed or not (see DELTA_KEYFRAME_CACHE_SIZE), on ticks of vehicle positions of which a
+fraction moved since the previous tick.
+
+    python -m benchmarks.delta [--ticks 100] [--features 2000] [--moving 0.1] [--interval 30]
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from digitaltwin_dataspace.data import delta
+from digitaltwin_dataspace.data.cache import blob_cache
+from digitaltwin_dataspace.data.delta import is_delta
+from digitaltwin_dataspace.data.engine import engine
+from digitaltwin_dataspace.data.retrieve import read_payload
+from digitaltwin_dataspace.data.sync_db import get_or_create_standard_component_table
+from digitaltwin_dataspace.data.write import write_result
+from digitaltwin_dataspace.serialization import dumps
+
+
+def _ticks(count: int, features: int, moving: float):
+    generator = random.Random(0)
+    positions = [[4.3 + generator.random() / 10, 50.8 + generator.random() / 10] for _ in range(features)]
+    for _ in range(count):
+        for index in generator.sample(range(features), int(features * moving)):
+            positions[index] = [positions[index][0] + 0.0001, positions[index][1] + 0.0001]
+        yield dumps({
+            "type": "FeatureCollection",
+            "features": [
+                {
+                    "type": "Feature",
+                    "geometry": {"type": "Point", "coordinates": position},
+                    "properties": {"id": f"vehicle-{index}"},
+                }
+                for index, position in enumerate(positions)
+            ],
+        })
+
+
+def _write(payloads, interval):
+    table_name = f"benchmark_{uuid.uuid4().hex[:8]}"
+    table = get_or_create_standard_component_table(table_name)
+    start = datetime(2025, 1, 1)
+    for tick, payload in enumerate(payloads):
+        write_result(table_name, "application/json", table, payload, start + timedelta(seconds=tick),
+                     delta_keyframe_interval=interval)
+    with engine.connect() as connection:
+        return connection.execute(select(table).order_by(table.c.date.asc())).fetchall()
+
+
+def _read_seconds(rows, keep_keyframes: bool) -> float:
+    durations = []
+    for row in rows:
+        blob_cache.clear()
+        if not keep_keyframes:
+            delta._keyframes.clear()
+        started_at = time.perf_counter()
+        read_payload(row.data, row.hash, row.encoding)
+        durations.append(time.perf_counter() - started_at)
+    return statistics.median(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the delta storage")
+    parser.add_argument("--ticks", type=int, default=100, help="The number of payloads written")
+    parser.add_argument("--features", type=int, default=2000, help="The number of features of each payload")
+    parser.add_argument("--moving", type=float, default=0.1, help="The fraction of the features moving per tick")
+    parser.add_argument("--interval", type=int, default=30, help="The maximum number of rows between keyframes")
+    arguments = parser.parse_args()
+
+    payloads = list(_ticks(arguments.ticks, arguments.features, arguments.moving))
+    full_rows = _write(payloads, None)
+    delta_rows = _write(payloads, arguments.interval)
+
+    full_bytes = sum(os.path.getsize(row.data) for row in full_rows)
+    delta_bytes = sum(os.path.getsize(row.data) for row in delta_rows)
+    deltas = [row for row in delta_rows if is_delta(row.encoding)]
+
+    print(f"{len(payloads)} payloads of {len(payloads[0]) / 1024:.0f} KiB, {len(deltas)} stored as deltas")
+    print(f"Storage:    {full_bytes / 1024:.0f} KiB in full, {delta_bytes / 1024:.0f} KiB with deltas "
+          f"({delta_bytes / full_bytes:.1%})")
+    print(f"Read, median: {_read_seconds(full_rows, False) * 1000:.2f} ms in full, "
+          f"{_read_seconds(deltas, True) * 1000:.2f} ms as a delta with its keyframe parsed, "
+          f"{_read_seconds(deltas, False) * 1000:.2f} ms as a delta without")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark of the GeoJSON FeatureCollection builder (see digitaltwin_dataspace.geojson) against the row by row
+loop it replaced in the position collectors, on DataFrames of aircraft states.
+
+    python -m benchmarks.geojson [--rows 10000 100000] [--iterations 3]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from digitaltwin_dataspace.geojson import feature_collection
+from digitaltwin_dataspace.serialization import dumps
+
+
+def _states(rows: int) -> pd.DataFrame:
+    generator = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "icao24": [f"{index:06x}" for index in range(rows)],
+        "callsign": generator.choice(["BEL1", "RYR2", "DLH3", None], rows),
+        "longitude": generator.uniform(2, 7, rows),
+        "latitude": generator.uniform(49, 52, rows),
+        "baro_altitude": generator.uniform(0, 12000, rows),
+        "velocity": generator.uniform(0, 300, rows),
+        "on_ground": generator.random(rows) < 0.1,
+    })
+    # Missing positions and measures
+    df.loc[df.sample(frac=0.05, random_state=0).index, "longitude"] = np.nan
+    df.loc[df.sample(frac=0.1, random_state=1).index, "velocity"] = np.nan
+    return df
+
+
+def _iterrows(df: pd.DataFrame) -> bytes:
+    # The loop of the collectors before feature_collection
+    features = []
+    for _, row in df.iterrows():
+        if pd.isna(row["longitude"]) or pd.isna(row["latitude"]):
+            continue
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [row["longitude"], row["latitude"]]},
+            "properties": {
+                key: None if pd.isna(value) else value
+                for key, value in row.items() if key not in ("longitude", "latitude")
+            },
+            "id": row["icao24"],
+        })
+    return dumps({"type": "FeatureCollection", "features": features})
+
+
+def _measure(func, df, iterations: int) -> float:
+    started_at = time.perf_counter()
+    for _ in range(iterations):
+        func(df)
+    return (time.perf_counter() - started_at) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the GeoJSON FeatureCollection builder")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000], help="The sizes of the DataFrames")
+    parser.add_argument("--iterations", type=int, default=3, help="The number of times each DataFrame is converted")
+    arguments = parser.parse_args()
+
+    for rows in arguments.rows:
+        df = _states(rows)
+        vectorized = _measure(lambda data: feature_collection(data, id="icao24"), df, arguments.iterations)
+        iterrows = _measure(_iterrows, df, arguments.iterations)
+        print(f"{rows:>8} rows: feature_collection {vectorized * 1000:8.1f} ms, "
+              f"iterrows {iterrows * 1000:8.1f} ms ({iterrows / vectorized:.1f}x slower)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Record STIB line pages as fixtures of the parsing tests and benchmark (see stib_parser).
+
+    python -m benchmarks.record_stib_pages 1:V 1:F 7:V N04:F
+"""
+import argparse
+from pathlib import Path
+
+import requests
+
+from tests.test_stib_scraping import FIXTURES
+
+URL = (
+    "https://www.stib-mivb.be/irj/servlet/prt/portal/prtroot/"
+    "pcd!3aportal_content!2fSTIBMIVB!2fWebsite!2fFrontend!2fPublic!2f"
+    "iViews!2fcom.stib.HorairesServletService"
+    "?l=fr&_line={line}&_directioncode={direction}&_mode=rt"
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record STIB line pages as test fixtures")
+    parser.add_argument("pages", nargs="+", help="The pages to record, as line:direction (V or F)")
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES, help="The directory of the recorded pages")
+    arguments = parser.parse_args()
+
+    arguments.fixtures.mkdir(parents=True, exist_ok=True)
+    for page in arguments.pages:
+        line, direction = page.split(":")
+        response = requests.get(URL.format(line=line, direction=direction), timeout=10)
+        response.raise_for_status()
+        path = arguments.fixtures / f"line_{line}_{direction}.html"
+        path.write_bytes(response.content)
+        print(f"Recorded {path} ({len(response.content)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
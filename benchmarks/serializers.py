@@ -0,0 +1,65 @@
+"""
+Microbenchmark of the JSON serializers (see digitaltwin_dataspace.serialization): the time to encode and decode a
+FeatureCollection of points, such as the collectors of vehicle positions produce, with each installed backend.
+
+    python -m benchmarks.serializers [--features 5000] [--iterations 20]
+"""
+import argparse
+import random
+import time
+
+from digitaltwin_dataspace import serialization
+from digitaltwin_dataspace.serialization import create_serializer
+
+
+def _feature_collection(size: int) -> dict:
+    generator = random.Random(0)
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {
+                    "type": "Point",
+                    "coordinates": [4.3 + generator.random() / 10, 50.8 + generator.random() / 10],
+                },
+                "properties": {
+                    "id": f"vehicle-{index}",
+                    "line": generator.randint(1, 99),
+                    "speed": generator.random() * 50,
+                    # Missing measures, encoded as null
+                    "delay": float("nan") if index % 10 == 0 else generator.randint(-60, 600),
+                },
+            }
+            for index in range(size)
+        ],
+    }
+
+
+def _measure(func, value, iterations: int) -> float:
+    started_at = time.perf_counter()
+    for _ in range(iterations):
+        func(value)
+    return (time.perf_counter() - started_at) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the JSON serializers")
+    parser.add_argument("--features", type=int, default=5000, help="The number of features of the payload")
+    parser.add_argument("--iterations", type=int, default=20, help="The number of times the payload is encoded")
+    arguments = parser.parse_args()
+
+    value = _feature_collection(arguments.features)
+    backends = ["json"] + [name for name in ("orjson", "msgspec") if getattr(serialization, name) is not None]
+
+    for name in backends:
+        serializer = create_serializer(name)
+        encoded = serializer.dumps(value)
+        dumps_seconds = _measure(serializer.dumps, value, arguments.iterations)
+        loads_seconds = _measure(serializer.loads, encoded, arguments.iterations)
+        print(f"{name:8} dumps {dumps_seconds * 1000:8.2f} ms, loads {loads_seconds * 1000:8.2f} ms, "
+              f"{len(encoded) / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
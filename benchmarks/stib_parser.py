@@ -0,0 +1,42 @@
+"""
+Benchmark of the parsing of the STIB line pages: the lxml parser of STIBStopsCollector against the BeautifulSoup
+parsing it replaced, on the pages of tests/fixtures/stib (see record_stib_pages to record live pages).
+
+    python -m benchmarks.stib_parser [--iterations 200]
+"""
+import argparse
+import time
+from pathlib import Path
+
+from tests.test_stib_scraping import FIXTURES, _load_stib, parse_with_beautifulsoup
+
+
+def _measure(parse, pages, iterations: int) -> float:
+    started_at = time.perf_counter()
+    for _ in range(iterations):
+        for page in pages:
+            list(parse(page))
+    return (time.perf_counter() - started_at) / (iterations * len(pages))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parsing of the STIB line pages")
+    parser.add_argument("--iterations", type=int, default=200, help="The number of times each page is parsed")
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES, help="The directory of the recorded pages")
+    arguments = parser.parse_args()
+
+    pages = [path.read_bytes() for path in sorted(arguments.fixtures.glob("*.html"))]
+    stib = _load_stib()
+
+    lxml_seconds = _measure(stib._parse_thermometer_stops, pages, arguments.iterations)
+    soup_seconds = _measure(parse_with_beautifulsoup, pages, arguments.iterations)
+
+    print(f"{len(pages)} pages, {sum(map(len, pages)) / len(pages) / 1024:.1f} KiB on average")
+    print(f"lxml:          {lxml_seconds * 1000:.3f} ms per page")
+    print(f"BeautifulSoup: {soup_seconds * 1000:.3f} ms per page ({soup_seconds / lxml_seconds:.1f}x slower)")
+    # The ~220 pages of a tick, parsed sequentially
+    print(f"Per tick:      {lxml_seconds * 220:.2f} s with lxml, {soup_seconds * 220:.2f} s with BeautifulSoup")
+
+
+if __name__ == "__main__":
+    main()
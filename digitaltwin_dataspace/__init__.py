@@ -1,5 +1,6 @@
 from .components import (
     Collector,
+    Compactor,
     Harvester,
     Handler,
     ScheduleRunnable,
@@ -7,6 +8,7 @@ from .components import (
     servable_endpoint,
     HarvesterConfiguration,
     ComponentConfiguration,
+    RetentionPolicy,
 )
 from .data.retrieve import Data
 from .runner import run_components
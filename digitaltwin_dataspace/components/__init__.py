@@ -1,4 +1,5 @@
 from .base import *
 from .collector import Collector
+from .compactor import Compactor
 from .handler import Handler
 from .harvester import Harvester, HarvesterConfiguration
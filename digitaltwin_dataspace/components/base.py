@@ -5,6 +5,7 @@ from typing import Optional, List, Any, Literal
 from pydantic import BaseModel, Field
 
 __all__ = [
+    "RetentionPolicy",
     "ComponentConfiguration",
     "Component",
     "ScheduleRunnable",
@@ -14,6 +15,13 @@ __all__ = [
 
 
 
+class RetentionPolicy(BaseModel):
+    raw: str = Field(..., description="How long every result is kept, e.g. '7d'.")
+    hourly: Optional[str] = Field(None,
+                                  description="How long the first result of each hour is kept once older than raw, e.g. '30d'. None to go straight to the daily tier.")
+    daily: Optional[str] = Field(None,
+                                 description="How long the first result of each day is kept once older than hourly (or raw), e.g. '52w'. None to keep them forever.")
+
 
 class ComponentConfiguration(BaseModel):
     name: str = Field(...,
@@ -23,6 +31,18 @@ class ComponentConfiguration(BaseModel):
                               description="Content type of the data, 'application/json' or 'application/octet-stream'.")
     tags: Optional[List[str]] = Field(None,
                                       description="List of tags for the component, used for documentation purposes to group endpoints together.")
+    deduplicate: bool = Field(False,
+                              description="If True, results whose hash matches an already stored result are not uploaded again, the new row points to the original one through its copy_id.")
+    compression: Optional[Literal["zstd", "gzip"]] = Field(None,
+                                                           description="Compression of the stored results, 'zstd' (falls back to 'gzip' if zstandard is not installed) or 'gzip'. Results are decompressed transparently when read.")
+    storage_format: Optional[Literal["parquet"]] = Field(None,
+                                                         description="Format of the stored results, 'parquet' stores JSON results (GeoJSON FeatureCollections of points or lists of records) as (Geo)Parquet files, rendered back to JSON when served. Requires pyarrow, the compression is then ignored.")
+    delta_keyframe_interval: Optional[int] = Field(None,
+                                                   description="If set, JSON results (FeatureCollections or lists of records) are stored as their differences with the last full result, a full result (keyframe) being stored every delta_keyframe_interval results. Results are reconstructed transparently when read. Ignored with a storage format.")
+    retention: Optional[RetentionPolicy] = Field(None,
+                                                 description="Retention of the results, older results are thinned to one per hour, then one per day, then deleted. None to keep every result forever.")
+    buffered: bool = Field(False,
+                           description="If True and a write buffer is configured (see WRITE_BUFFER_DIRECTORY), the results of the collector are appended to a local log and written to the storage and database in batches by a background flusher, for components scheduled every few seconds.")
 
 
 
@@ -45,6 +65,25 @@ class ScheduleRunnable(abc.ABC):
     def get_schedule(self) -> str:
         pass
 
+    def get_max_concurrency(self) -> int:
+        """Maximum number of runs of the component allowed to overlap."""
+        return 1
+
+    def get_overrun_policy(self) -> Literal["skip", "coalesce", "queue"]:
+        """
+        What to do with a scheduled run when the maximum concurrency is reached, either skip it,
+        coalesce it with the other overrunning runs into a single run started once a running one finishes,
+        or queue it to be run after the running ones (see EXECUTION_MAX_QUEUED).
+        """
+        return "skip"
+
+    def get_jitter(self) -> float:
+        """
+        Maximum random delay added to each scheduled run, in seconds, on top of the phase offset spreading
+        the components sharing a schedule (see Scheduler).
+        """
+        return 0.0
+
 
 def servable_endpoint(path: str, method: Literal["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"] = "GET", response_model: Optional[Any] = None):
     def inner(func):
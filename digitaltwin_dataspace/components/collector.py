@@ -1,35 +1,80 @@
 import abc
 from datetime import datetime
-from typing import Any
+from typing import Any, Literal
 
-from fastapi import Response
+from fastapi import Request, Response
 
 from .base import Component, ScheduleRunnable, Servable, servable_endpoint
-from ..data.retrieve import retrieve_latest_row_before_datetime
+from .serving import retrieve_response, history_response, history_data_response
+from ..data.buffer import write_buffer
 from ..data.sync_db import get_or_create_standard_component_table
 from ..data.write import write_result
+from ..http_client import HttpClient
+from ..serialization import dumps
 
 
 class Collector(Component, ScheduleRunnable, Servable, abc.ABC):
 
+    @property
+    def http(self) -> HttpClient:
+        """
+        The HTTP client of the collector, with pooled connections, timeouts, retries and conditional requests.
+        """
+        if getattr(self, "_http", None) is None:
+            self._http = HttpClient(self.get_configuration().name)
+        return self._http
+
+    @staticmethod
+    def to_json(value: Any) -> bytes:
+        """
+        Serialize a value to JSON bytes with the configured serializer (see serialization).
+        """
+        return dumps(value)
+
     def get_table(self):
         return get_or_create_standard_component_table(self.get_configuration().name)
 
     @servable_endpoint(path="/")
-    def retrieve(self, timestamp: datetime = None) -> Response:
-        data = retrieve_latest_row_before_datetime(
-            self.get_table(),
-            timestamp if timestamp else datetime.now(),
-        )
+    def retrieve(self, request: Request, timestamp: datetime = None) -> Response:
+        return retrieve_response(request, self.get_table(), timestamp)
 
-        return Response(content=data.data, media_type=data.content_type)
+    @servable_endpoint(path="/history")
+    def history(self, start: datetime = None, end: datetime = None, limit: int = 100, cursor: str = None) -> dict:
+        return history_response(self.get_table(), start, end, limit, cursor)
+
+    @servable_endpoint(path="/history/data")
+    def history_data(
+            self,
+            start: datetime = None,
+            end: datetime = None,
+            limit: int = 100,
+            cursor: str = None,
+            format: Literal["ndjson", "multipart"] = "ndjson",
+    ) -> Response:
+        return history_data_response(self.get_table(), start, end, limit, cursor, format)
 
     def run(self) -> Any:
-        result = self.collect()
+        try:
+            result = self.collect()
+
+            if result is not None:
+                config = self.get_configuration()
+                if config.buffered and write_buffer is not None:
+                    write_buffer.append(config.name, config.content_type, result, datetime.now(),
+                                        deduplicate=config.deduplicate, compression=config.compression,
+                                        storage_format=config.storage_format,
+                                        delta_keyframe_interval=config.delta_keyframe_interval)
+                else:
+                    write_result(config.name, config.content_type, self.get_table(), result, datetime.now(),
+                                 deduplicate=config.deduplicate, compression=config.compression,
+                                 storage_format=config.storage_format,
+                                 delta_keyframe_interval=config.delta_keyframe_interval)
+        except Exception:
+            self.http.rollback()
+            raise
 
-        if result is not None:
-            config = self.get_configuration()
-            write_result(config.name, config.content_type, self.get_table(), result, datetime.now())
+        # The validators of the conditional requests are only kept once their result is stored
+        self.http.commit()
 
         return result
 
@@ -37,5 +82,6 @@ class Collector(Component, ScheduleRunnable, Servable, abc.ABC):
     def collect(self) -> bytes:
         """
         Overrides the `collect` method to retrieve content from a distant data provider.
+        Returning None skips the write, e.g. when a conditional request of `self.http` answered with a 304.
         """
         pass
@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta
+from typing import Any, Iterator, Literal, Tuple
+
+from fastapi import Request, Response
+
+from .base import Component, ScheduleRunnable, Servable, servable_endpoint, ComponentConfiguration
+from .serving import retrieve_response, history_response, history_data_response, fetch_payloads
+from ..data.columnar import COMPACTION_BATCH_SIZE, PARQUET_CONTENT_TYPE, compact
+from ..data.retrieve import retrieve_latest_row, retrieve_first_row, retrieve_between_datetime, retrieve_page
+from ..data.sync_db import get_or_create_standard_component_table
+from ..data.write import write_result
+
+Granularity = Literal["hour", "day"]
+
+PERIODS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+
+def period_start(date: datetime, granularity: Granularity) -> datetime:
+    """
+    The start of the hour or day of a date.
+    """
+    date = date.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        date = date.replace(hour=0)
+    return date
+
+
+class _Snapshots:
+    """
+    The snapshots of a period of a source, read page by page on each iteration (see compact).
+    """
+
+    def __init__(self, table, start: datetime, end: datetime, page_size: int = None):
+        self.table = table
+        self.start = start
+        self.end = end
+        self.page_size = page_size or COMPACTION_BATCH_SIZE
+
+    def __iter__(self) -> Iterator[Tuple[datetime, Any]]:
+        after = None
+        while True:
+            rows = retrieve_page(self.table, self.start, self.end, self.page_size, after)
+            for row, _ in fetch_payloads(rows):
+                yield row.date, row.json()
+            if len(rows) < self.page_size:
+                return
+            after = (rows[-1].date, rows[-1].id)
+
+
+class Compactor(Component, ScheduleRunnable, Servable):
+    """
+    Rolls the per-tick results of a component (GeoJSON FeatureCollections of points or lists of records, stored as
+    JSON or Parquet) into one Parquet file per hour or day, each row recording the date of its snapshot.
+
+    The files are stored in the table of the compactor, named after the source and the granularity
+    (e.g. opensky_collector_hourly), one row per period dated by the start of the period. A period is compacted
+    once the source has a row after it. The source rows are kept, see the retention policies to delete them.
+    """
+
+    def __init__(self, source: str, granularity: Granularity = "hour", max_periods: int = 24, schedule: str = None):
+        """
+        :param source: The name of the component to compact
+        :param granularity: The period of the files, "hour" or "day"
+        :param max_periods: The maximum number of periods compacted per run
+        :param schedule: The schedule of the compaction, every 10 minutes for hourly files and every hour
+            for daily files by default
+        """
+        if granularity not in PERIODS:
+            raise ValueError(f"Invalid granularity: {granularity}")
+
+        self.source = source
+        self.granularity = granularity
+        self.max_periods = max_periods
+        self.schedule = schedule or ("10m" if granularity == "hour" else "1h")
+
+    def get_configuration(self) -> ComponentConfiguration:
+        return ComponentConfiguration(
+            name=f"{self.source}_{'hourly' if self.granularity == 'hour' else 'daily'}",
+            description=f"{self.granularity.capitalize()}ly Parquet files of {self.source}",
+            content_type=PARQUET_CONTENT_TYPE,
+            tags=["Compaction"],
+        )
+
+    def get_schedule(self) -> str:
+        return self.schedule
+
+    def get_table(self):
+        return get_or_create_standard_component_table(self.get_configuration().name)
+
+    def run(self) -> bool:
+        configuration = self.get_configuration()
+        table = self.get_table()
+        source_table = get_or_create_standard_component_table(self.source)
+        period = PERIODS[self.granularity]
+
+        latest_row = retrieve_latest_row(table)
+        if latest_row is not None:
+            start = latest_row.date + period
+        else:
+            first_row = retrieve_first_row(source_table)
+            if first_row is None:
+                return False
+            start = period_start(first_row.date, self.granularity)
+
+        compacted = 0
+        while compacted < self.max_periods:
+            end = start + period
+
+            # The period is complete once the source has a row after it
+            if not retrieve_between_datetime(source_table, end - timedelta(microseconds=1), None, 1):
+                break
+
+            if not retrieve_between_datetime(source_table, start - timedelta(microseconds=1), end, 1):
+                # Skip to the period of the next row
+                next_row = retrieve_between_datetime(source_table, start, None, 1)[0]
+                start = period_start(next_row.date, self.granularity)
+                continue
+
+            snapshots = _Snapshots(source_table, start, end)
+            write_result(configuration.name, configuration.content_type, table, compact(snapshots), start)
+
+            compacted += 1
+            start = end
+
+        return compacted > 0
+
+    @servable_endpoint(path="/")
+    def retrieve(self, request: Request, timestamp: datetime = None) -> Response:
+        return retrieve_response(request, self.get_table(), timestamp)
+
+    @servable_endpoint(path="/history")
+    def history(self, start: datetime = None, end: datetime = None, limit: int = 100, cursor: str = None) -> dict:
+        return history_response(self.get_table(), start, end, limit, cursor)
+
+    @servable_endpoint(path="/history/data")
+    def history_data(
+            self,
+            start: datetime = None,
+            end: datetime = None,
+            limit: int = 100,
+            cursor: str = None,
+            format: Literal["ndjson", "multipart"] = "ndjson",
+    ) -> Response:
+        return history_data_response(self.get_table(), start, end, limit, cursor, format)
@@ -1,14 +1,18 @@
 import abc
 from datetime import timedelta, datetime
-from typing import List, Optional, Any
+from typing import List, Optional, Any, Literal, Tuple
 
-from fastapi import Response
+from fastapi import Request, Response
 
 from .base import ScheduleRunnable, Servable, Component, servable_endpoint, ComponentConfiguration
+from .serving import retrieve_response, history_response, history_data_response
 from ..data.retrieve import retrieve_latest_row, retrieve_first_row, retrieve_between_datetime, retrieve_after_datetime, \
-    retrieve_latest_rows_before_datetime, retrieve_latest_row_before_datetime
+    retrieve_latest_rows_before_datetime, prefetch
+from .. import metrics
+from ..data.engine import engine
+from ..data.events import publish_new_row
 from ..data.sync_db import get_or_create_standard_component_table
-from ..data.write import write_result
+from ..data.write import write_result, write_results
 
 ZERO_DATE = datetime(1970, 1, 1)
 
@@ -74,9 +78,34 @@ class HarvesterConfiguration(ComponentConfiguration):
     dependencies: Optional[List[str]] = None
     dependencies_limit: Optional[List[int]] = None
 
+    # Catch-up mode, harvests up to catch_up_max_batch consecutive windows per run
+    catch_up: bool = False
+    catch_up_max_batch: int = 100
+
+    # Read the payloads of the source and dependency rows concurrently before harvesting them
+    prefetch: bool = True
+
 
 class Harvester(Component, ScheduleRunnable, Servable, abc.ABC):
     def run(self):
+        # A single connection and transaction is used for the whole read-then-write cycle
+        with engine.begin() as connection:
+            harvested = self._run(connection)
+
+        if harvested:
+            publish_new_row(self.get_configuration().name)
+
+        return harvested
+
+    def get_triggers(self) -> List[str]:
+        """
+        The components whose new rows can make this harvester produce a result, its source and dependencies.
+        When an event bus is configured, the harvester is run as soon as one of them writes a row.
+        """
+        configuration = self.get_configuration()
+        return [configuration.source] + (configuration.dependencies or [])
+
+    def _run(self, connection):
         configuration = self.get_configuration()
         table = get_or_create_standard_component_table(configuration.name)
         source_table = get_or_create_standard_component_table(
@@ -84,35 +113,159 @@ class Harvester(Component, ScheduleRunnable, Servable, abc.ABC):
         )
 
         # Get latest date harvested
-        latest_row = retrieve_latest_row(table, with_null=True)
+        latest_row = retrieve_latest_row(table, with_null=True, connection=connection)
 
         if latest_row is None:
             # In case the harvester has never been run, get the first row from the source table
-            row = retrieve_first_row(source_table)
+            row = retrieve_first_row(source_table, connection=connection)
             # Minus one second to make sure we include the first row
             latest_date = (row and (row.date - timedelta(seconds=1))) or ZERO_DATE
         else:
             latest_date = latest_row.date
 
+        if configuration.catch_up:
+            harvested_date = self._catch_up(connection, configuration, table, source_table, latest_date)
+        else:
+            harvested_date = self._harvest_window(connection, configuration, table, source_table, latest_date)
+
+        # Lag of the harvester, how far its latest harvested date is behind the latest date of its source
+        latest_source_row = retrieve_latest_row(source_table, connection=connection)
+        if latest_source_row is not None:
+            metrics.set_gauge(
+                f"harvester.{configuration.name}.lag_seconds",
+                max((latest_source_row.date - (harvested_date or latest_date)).total_seconds(), 0),
+            )
+
+        return harvested_date is not None
+
+    def _harvest_window(self, connection, configuration, table, source_table, latest_date) -> Optional[datetime]:
+        """
+        Harvest the window following the latest harvested date, skipping the periods with no source rows.
+        :return: The date of the stored result, None if there was nothing to harvest
+        """
         # Get source range
         start_date, end_date, limit = source_range_to_period_and_limit(
             latest_date, configuration.source_range
         )
 
-        source_data = retrieve_between_datetime(source_table, start_date, end_date, limit)
+        source_data = retrieve_between_datetime(source_table, start_date, end_date, limit, connection=connection)
+
+        if end_date:
+            period = end_date - start_date
+            start_date, source_data = self._skip_empty_periods(
+                connection, source_table, start_date, period, 1, source_data
+            )
+            end_date = start_date + period
 
         if not source_data:
-            return False  # No new data to harvest
+            return None  # No new data to harvest
 
         if limit and configuration.source_range_strict and len(source_data) < limit:
-            return False  # No new data to harvest, still building the amount of data specified by the limit
+            return None  # No new data to harvest, still building the amount of data specified by the limit
 
-        if end_date and not retrieve_after_datetime(table, latest_date, 1):
-            return False  # No new data to harvest, still building the same period
+        if end_date and not retrieve_after_datetime(source_table, end_date - timedelta(microseconds=1), 1,
+                                                    connection=connection):
+            return None  # No new data to harvest, still building the same period
 
         storage_date = end_date or source_data[-1].date
 
-        if limit == 1 and not end_date:
+        self._write(connection, configuration, table, self._harvest_source(connection, configuration, source_data,
+                                                                           storage_date, limit == 1 and not end_date))
+
+        return storage_date
+
+    def _catch_up(self, connection, configuration, table, source_table, latest_date) -> Optional[datetime]:
+        """
+        Harvest up to catch_up_max_batch consecutive windows following the latest harvested date.
+        The source rows of all the windows are retrieved in a single query, and all the results are written at once.
+        :return: The date of the last stored result, None if there was nothing to harvest
+        """
+        max_batch = configuration.catch_up_max_batch
+        start_date, end_date, limit = source_range_to_period_and_limit(
+            latest_date, configuration.source_range
+        )
+
+        if end_date is None:
+            # Windows of a fixed number of rows
+            source_data = retrieve_between_datetime(
+                source_table, start_date, None, limit * max_batch, connection=connection
+            )
+            windows = [source_data[i:i + limit] for i in range(0, len(source_data), limit)]
+            if windows and configuration.source_range_strict and len(windows[-1]) < limit:
+                windows.pop()  # Still building the amount of data specified by the limit
+            windows = [(window[-1].date, window) for window in windows]
+        else:
+            # Windows of a fixed period, a window is complete once the source has data after its end
+            period = end_date - start_date
+            source_data = retrieve_between_datetime(
+                source_table, start_date, start_date + period * max_batch, None, connection=connection
+            )
+            start_date, source_data = self._skip_empty_periods(
+                connection, source_table, start_date, period, max_batch, source_data
+            )
+            if not source_data:
+                return None
+
+            grouped = {}
+            for row in source_data:
+                grouped.setdefault((row.date - start_date) // period, []).append(row)
+
+            windows = [(start_date + period * (index + 1), rows) for index, rows in sorted(grouped.items())]
+            if windows and not retrieve_after_datetime(source_table, windows[-1][0] - timedelta(microseconds=1), 1,
+                                                       connection=connection):
+                windows.pop()  # Still building the same period
+
+        if not windows:
+            return None
+
+        if configuration.prefetch:
+            prefetch([row for _, window in windows for row in window])
+
+        results = []
+        for storage_date, window in windows:
+            results.extend(
+                self._harvest_source(connection, configuration, window, storage_date, limit == 1 and not end_date)
+            )
+
+        self._write(connection, configuration, table, results)
+        metrics.increment(f"harvester.{configuration.name}.caught_up_windows", len(windows))
+
+        return windows[-1][0]
+
+    def _skip_empty_periods(
+            self, connection, source_table, start_date, period, count, source_data
+    ) -> Tuple[Optional[datetime], list]:
+        """
+        Move the given periods forward to the period holding the next source row when they hold no source row,
+        otherwise a gap in the source would block the harvester on its first empty period.
+        :param start_date: The start of the first period
+        :param period: The duration of a period
+        :param count: The number of consecutive periods retrieved
+        :param source_data: The source rows of the periods
+        :return: The start of the first period and its source rows, the rows are empty if the source has no row
+            after the periods
+        """
+        after = start_date + period * count
+        while not source_data:
+            next_rows = retrieve_between_datetime(source_table, after, None, 1, connection=connection)
+            if not next_rows:
+                return start_date, source_data
+
+            # The first period ending at or after the next row, the rows at the bounds of the periods are excluded
+            # from them, so the loop goes on after the periods if it was on their end
+            start_date += period * ((next_rows[0].date - start_date - timedelta(microseconds=1)) // period)
+            after = start_date + period * count
+            source_data = retrieve_between_datetime(source_table, start_date, after, None, connection=connection)
+
+        return start_date, source_data
+
+    def _harvest_source(self, connection, configuration, source_data, storage_date, single: bool) -> list:
+        """
+        Run the harvest method on the given source rows.
+        :return: The results to write, with their date
+        """
+        rows = list(source_data)
+        if single:
             source_data = source_data[0]
 
         dependencies = configuration.dependencies or []
@@ -125,7 +278,7 @@ class Harvester(Component, ScheduleRunnable, Servable, abc.ABC):
             ):
                 dependency_table = get_or_create_standard_component_table(dependency)
                 dependency_data = retrieve_latest_rows_before_datetime(
-                    dependency_table, storage_date, dependency_limit
+                    dependency_table, storage_date, dependency_limit, connection=connection
                 )
 
                 if dependency_limit == 1:
@@ -133,25 +286,38 @@ class Harvester(Component, ScheduleRunnable, Servable, abc.ABC):
                         raise ValueError(f"Dependency {dependency} not found")
 
                     dependency_data = dependency_data[0]
+                    rows.append(dependency_data)
+                else:
+                    rows.extend(dependency_data)
                 dependencies_data[dependency] = dependency_data
 
+        if configuration.prefetch:
+            prefetch(rows)
+
         result = self.harvest(source_data, **dependencies_data)
 
         if configuration.multiple_results:
-            for item, source in zip(result, source_data):
-                write_result(configuration.name, configuration.content_type, table, item,
-                             source.date)
-        elif result is not None:
+            return [(item, source.date) for item, source in zip(result, source_data)]
+
+        return [(result, storage_date)]
+
+    def _write(self, connection, configuration, table, results: list):
+        if len(results) == 1:
+            result, date = results[0]
             write_result(
-                configuration.name, configuration.content_type, table, result, storage_date
+                configuration.name, configuration.content_type, table, result, date,
+                deduplicate=configuration.deduplicate and result is not None,
+                compression=configuration.compression, storage_format=configuration.storage_format,
+                delta_keyframe_interval=configuration.delta_keyframe_interval, connection=connection
             )
         else:
-            write_result(
-                configuration.name, configuration.content_type, table, None, storage_date
+            write_results(
+                configuration.name, configuration.content_type, table, results,
+                deduplicate=configuration.deduplicate, compression=configuration.compression,
+                storage_format=configuration.storage_format,
+                delta_keyframe_interval=configuration.delta_keyframe_interval, connection=connection
             )
 
-        return True
-
     def harvest(self, source_data, **dependencies_data):
         """
         Override this method to implement the harvesting logic.
@@ -159,13 +325,31 @@ class Harvester(Component, ScheduleRunnable, Servable, abc.ABC):
         raise NotImplementedError("The 'harvest' method must be implemented by subclasses.")
 
     @servable_endpoint(path="/")
-    def retrieve(self, timestamp: datetime = None) -> Response:
-        data = retrieve_latest_row_before_datetime(
+    def retrieve(self, request: Request, timestamp: datetime = None) -> Response:
+        return retrieve_response(
+            request,
             get_or_create_standard_component_table(self.get_configuration().name),
-            timestamp if timestamp else datetime.now(),
+            timestamp,
         )
 
-        return Response(content=data.data, media_type=data.content_type)
+    @servable_endpoint(path="/history")
+    def history(self, start: datetime = None, end: datetime = None, limit: int = 100, cursor: str = None) -> dict:
+        return history_response(
+            get_or_create_standard_component_table(self.get_configuration().name), start, end, limit, cursor
+        )
+
+    @servable_endpoint(path="/history/data")
+    def history_data(
+            self,
+            start: datetime = None,
+            end: datetime = None,
+            limit: int = 100,
+            cursor: str = None,
+            format: Literal["ndjson", "multipart"] = "ndjson",
+    ) -> Response:
+        return history_data_response(
+            get_or_create_standard_component_table(self.get_configuration().name), start, end, limit, cursor, format
+        )
 
     def get_schedule(self) -> str:
         return "1s"
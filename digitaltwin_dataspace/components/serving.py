@@ -0,0 +1,374 @@
+import base64
+import os
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple, List, Iterator, Literal
+
+from fastapi import Request, Response, HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy import Table
+
+from ..data.cache import blob_cache
+from ..data.columnar import is_parquet, render_json
+from ..data.compression import is_http_encoding
+from ..data.retrieve import Data, retrieve_latest_row_before_datetime, retrieve_latest_row_cached, retrieve_page
+from ..data.storage import storage_manager
+from ..serialization import dumps, loads
+
+MAX_PAGE_SIZE = 1000
+HISTORY_FETCH_WORKERS = int(os.environ.get("HISTORY_FETCH_WORKERS", 8))
+
+
+def _is_not_modified(request: Request, data: Data, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etags = [value.strip().replace("W/", "", 1) for value in if_none_match.split(",")]
+        return "*" in etags or etag in etags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            return int(data.date.timestamp()) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+
+    return False
+
+
+def _parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single "bytes" range, multiple ranges are not supported.
+    :return: The first and last (inclusive) offsets of the range, None if the header is not a supported range
+    :raise ValueError: If the range cannot be satisfied
+    """
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in ranges:
+        return None
+
+    first, _, last = ranges.strip().partition("-")
+    try:
+        if not first:
+            # Suffix range, the last bytes of the payload
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+
+    if start > end or start >= size:
+        raise ValueError(f"Range {range_header} cannot be satisfied for a payload of {size} bytes")
+
+    return start, end
+
+
+def _accepts_encoding(request: Request, encoding: str) -> bool:
+    for value in request.headers.get("accept-encoding", "").split(","):
+        coding, _, parameters = value.strip().partition(";")
+        if coding.strip() in (encoding, "*"):
+            return parameters.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def _payload_response(
+        request: Request, data: Data, headers: dict, payload: Optional[bytes], media_type: str = None
+) -> Response:
+    """
+    Serve the given payload, or stream the stored one as is if no payload is given.
+    """
+    media_type = media_type or data.content_type
+    range_header = request.headers.get("range")
+
+    size = None
+    if payload is not None:
+        size = len(payload)
+    elif range_header is not None:
+        size = storage_manager.size(data.url)
+
+    byte_range = None
+    if range_header is not None:
+        try:
+            byte_range = _parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        if payload is not None:
+            return Response(content=payload, media_type=media_type, headers=headers)
+        return StreamingResponse(storage_manager.stream(data.url), media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers = {**headers, "Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(end - start + 1)}
+
+    if payload is not None:
+        return Response(content=payload[start:end + 1], status_code=206, media_type=media_type, headers=headers)
+    return StreamingResponse(
+        storage_manager.stream(data.url, start, end), status_code=206, media_type=media_type, headers=headers
+    )
+
+
+def _accepts_parquet(request: Request) -> bool:
+    return "parquet" in request.headers.get("accept", "")
+
+
+def rendered_json(data: Data) -> Tuple[bytes, str]:
+    """
+    Render the payload of a row stored as Parquet back to JSON, going through the blob cache.
+    :return: The JSON, and its content type
+    """
+    key = f"{data.url}#json"
+    payload = blob_cache.get(key, data.hash)
+    if payload is None:
+        payload = render_json(data.data)
+        blob_cache.put(key, data.hash, payload)
+    # FeatureCollections are rendered as objects, lists of records as arrays
+    return payload, "application/geo+json" if payload.startswith(b"{") else "application/json"
+
+
+def _rendered_json_response(request: Request, data: Data) -> Response:
+    headers = {
+        "ETag": f'"{data.hash}-json"',
+        "Last-Modified": formatdate(data.date.timestamp(), usegmt=True),
+        "Cache-Control": "no-cache",
+        "Vary": "Accept",
+        "Accept-Ranges": "bytes",
+    }
+
+    if _is_not_modified(request, data, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    payload, media_type = rendered_json(data)
+    return _payload_response(request, data, headers, payload, media_type)
+
+
+def data_response(request: Request, data: Optional[Data]) -> Response:
+    """
+    Build the response serving the payload of a row.
+
+    The response carries the hash of the row as ETag and its date as Last-Modified, conditional requests
+    (If-None-Match, If-Modified-Since) matching the row are answered with a 304 without reading the storage.
+    Payloads not already in memory are streamed from the storage (or sent as files when stored on the local
+    file system), single byte ranges are supported.
+    Compressed payloads are sent as is, with a Content-Encoding header, to clients accepting their encoding,
+    and decompressed for the other clients.
+
+    Payloads stored as Parquet are rendered back to (Geo)JSON, unless the client accepts Parquet.
+
+    :param request: The request being answered
+    :param data: The row to serve, None if no row matched the request
+    :return: The response
+    """
+    if data is None:
+        return Response(status_code=404)
+
+    if is_parquet(data.content_type) and not _accepts_parquet(request):
+        return _rendered_json_response(request, data)
+
+    # The stored payload is sent as is if it is not compressed, or if the client accepts its encoding
+    send_stored = data.encoding is None or (
+            is_http_encoding(data.encoding) and _accepts_encoding(request, data.encoding)
+    )
+
+    headers = {
+        # Each representation of the payload has its own ETag
+        "ETag": f'"{data.hash}"' if data.encoding is None or not send_stored else f'"{data.hash}-{data.encoding}"',
+        "Last-Modified": formatdate(data.date.timestamp(), usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+    if data.encoding is not None:
+        headers["Vary"] = "Accept-Encoding"
+
+    if _is_not_modified(request, data, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    if not send_stored:
+        headers["Accept-Ranges"] = "bytes"
+        return _payload_response(request, data, headers, data.data)
+
+    if data.encoding is not None:
+        headers["Content-Encoding"] = data.encoding
+        payload = None
+    else:
+        payload = data.cached_data
+
+    path = storage_manager.local_path(data.url)
+    if path is not None and payload is None:
+        # Served with sendfile, FileResponse handles the byte ranges itself
+        return FileResponse(path, media_type=data.content_type, headers=headers)
+
+    headers["Accept-Ranges"] = "bytes"
+    return _payload_response(request, data, headers, payload)
+
+
+def retrieve_response(request: Request, table: Table, timestamp: Optional[datetime] = None) -> Response:
+    """
+    Serve the latest row of a table before the given timestamp, or the latest row if no timestamp is given.
+    :param request: The request being answered
+    :param table: The table of the component
+    :param timestamp: The timestamp, None for the latest row
+    :return: The response
+    """
+    if timestamp is None:
+        return data_response(request, retrieve_latest_row_cached(table))
+
+    return data_response(request, retrieve_latest_row_before_datetime(table, timestamp))
+
+
+def encode_cursor(data: Data) -> str:
+    """
+    Encode the position of a row in a history listing as an opaque cursor.
+    :param data: The last row of a page
+    :return: The cursor
+    """
+    return base64.urlsafe_b64encode(f"{data.date.isoformat()}|{data.id}".encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a cursor built by encode_cursor.
+    :param cursor: The cursor
+    :return: The date and id of the last row of the previous page
+    """
+    try:
+        date, _, id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").partition("|")
+        return datetime.fromisoformat(date), int(id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _retrieve_page(
+        table: Table, start: Optional[datetime], end: Optional[datetime], limit: int, cursor: Optional[str]
+) -> Tuple[List[Data], Optional[str]]:
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
+    rows = retrieve_page(table, start, end, limit, decode_cursor(cursor) if cursor else None)
+    return rows, encode_cursor(rows[-1]) if len(rows) == limit else None
+
+
+def history_response(
+        table: Table, start: Optional[datetime], end: Optional[datetime], limit: int, cursor: Optional[str]
+) -> dict:
+    """
+    List the rows of a table between two dates, without their payloads.
+    :param table: The table of the component
+    :param start: The start date (inclusive), None for no lower bound
+    :param end: The end date (exclusive), None for no upper bound
+    :param limit: The maximum number of rows returned, bounded by MAX_PAGE_SIZE
+    :param cursor: The cursor returned with the previous page, None for the first page
+    :return: The rows, and the cursor of the next page (None if this is the last page)
+    """
+    rows, next_cursor = _retrieve_page(table, start, end, limit, cursor)
+
+    return {
+        "items": [
+            {"id": row.id, "date": row.date.isoformat(), "hash": row.hash, "content_type": row.content_type}
+            for row in rows
+        ],
+        "next_cursor": next_cursor,
+    }
+
+
+def fetch_payloads(rows: List[Data], workers: int = HISTORY_FETCH_WORKERS) -> Iterator[Tuple[Data, bytes]]:
+    """
+    Fetch the payloads of the given rows concurrently, yielding them in order.
+    At most twice as many payloads as workers are held in memory at once.
+    :param rows: The rows
+    :param workers: The number of payloads fetched concurrently
+    :return: Iterator over the rows and their payloads
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for row in rows:
+            pending.append((row, executor.submit(lambda data: data.data, row)))
+            if len(pending) >= 2 * workers:
+                data, future = pending.popleft()
+                yield data, future.result()
+        while pending:
+            data, future = pending.popleft()
+            yield data, future.result()
+
+
+def _single_line_json(payload: bytes) -> Optional[bytes]:
+    """
+    The JSON payload on a single line, re-encoded compactly if it spans several lines.
+    :return: The payload, None if it spans several lines and is not valid JSON
+    """
+    if b"\n" not in payload and b"\r" not in payload:
+        return payload
+    try:
+        return dumps(loads(payload))
+    except Exception:
+        return None
+
+
+def _ndjson_lines(rows: List[Data]) -> Iterator[bytes]:
+    for row, payload in fetch_payloads(rows):
+        metadata = {"id": row.id, "date": row.date.isoformat(), "hash": row.hash, "content_type": row.content_type}
+
+        if is_parquet(row.content_type):
+            payload, metadata["content_type"] = rendered_json(row)
+
+        embedded = None
+        content_type = metadata["content_type"]
+        if content_type and "json" in content_type and payload.strip():
+            # JSON payloads are embedded as is, without being parsed again, unless they span several lines
+            # (e.g. pretty-printed), which would break the NDJSON framing
+            embedded = _single_line_json(payload)
+
+        if embedded is not None:
+            metadata["encoding"] = "json"
+            line = dumps(metadata)[:-1] + b', "data": ' + embedded + b"}\n"
+        else:
+            metadata["encoding"] = "base64"
+            metadata["data"] = base64.b64encode(payload).decode("ascii")
+            line = dumps(metadata) + b"\n"
+
+        yield line
+
+
+def _multipart_parts(rows: List[Data], boundary: str) -> Iterator[bytes]:
+    for row, payload in fetch_payloads(rows):
+        headers = (
+            f"--{boundary}\r\n"
+            f"Content-Type: {row.content_type or 'application/octet-stream'}\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"ETag: \"{row.hash}\"\r\n"
+            f"Date: {formatdate(row.date.timestamp(), usegmt=True)}\r\n"
+            f"X-Date: {row.date.isoformat()}\r\n"
+            f"\r\n"
+        )
+        yield headers.encode("utf-8") + payload + b"\r\n"
+
+    yield f"--{boundary}--\r\n".encode("utf-8")
+
+
+def history_data_response(
+        table: Table,
+        start: Optional[datetime],
+        end: Optional[datetime],
+        limit: int,
+        cursor: Optional[str],
+        format: Literal["ndjson", "multipart"] = "ndjson",
+) -> Response:
+    """
+    Stream the payloads of the rows of a table between two dates in a single response.
+    The cursor of the next page, if any, is returned in the X-Next-Cursor header.
+    :param table: The table of the component
+    :param start: The start date (inclusive), None for no lower bound
+    :param end: The end date (exclusive), None for no upper bound
+    :param limit: The maximum number of rows returned, bounded by MAX_PAGE_SIZE
+    :param cursor: The cursor returned with the previous page, None for the first page
+    :param format: "ndjson" for one JSON document per row, "multipart" for a multipart/mixed response
+    :return: The response
+    """
+    rows, next_cursor = _retrieve_page(table, start, end, limit, cursor)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+
+    if format == "multipart":
+        boundary = uuid.uuid4().hex
+        return StreamingResponse(
+            _multipart_parts(rows, boundary), media_type=f"multipart/mixed; boundary={boundary}", headers=headers
+        )
+
+    return StreamingResponse(_ndjson_lines(rows), media_type="application/x-ndjson", headers=headers)
@@ -0,0 +1,486 @@
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+
+from .engine import connect
+from .sync_db import get_or_create_standard_component_table
+from .write import to_bytes, write_results
+from .. import metrics
+from ..serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# Length of the metadata, length of the data (NO_DATA for None) and CRC32 of both, followed by the metadata and data
+_HEADER = struct.Struct("<III")
+_NO_DATA = 0xFFFFFFFF
+
+# Segments being appended to end with .open, they are renamed to .log once full. Their offset is stored under the
+# name of the segment without its suffix, so that it follows the segment when it is sealed
+_OPEN = ".open"
+_SEALED = ".log"
+_OFFSET = ".offset"
+
+
+# Subdirectory of the segments of the records that kept failing to be written
+DEAD_LETTER = "dead-letter"
+
+
+def _stem(segment: str) -> str:
+    return segment.rsplit(".", 1)[0]
+
+
+class _Record(NamedTuple):
+    segment: str
+    start: int
+    end: int
+    metadata: dict
+    data: Optional[bytes]
+    raw: bytes
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class WriteBuffer:
+    """
+    Local write-ahead buffer of the results of the components: results are appended to a local log, and written to
+    the storage and database by a background flusher, so that storage latency does not slow down the collection.
+
+    Each process appends to its own segment of the log (a file of CRC-checked records), so results can be appended
+    from the processes of the "process" execution engine, while the flusher runs in the main process (see start).
+    The flusher reads the segments in batches, writes the results of each component with a single write_results
+    call (concurrent uploads, a single transaction and new row event), coalescing the results of a component
+    sharing the same date (the last one wins). The offset up to which a segment has been written is persisted next
+    to it, and results whose date is already in the table are skipped, so the results buffered before a crash are
+    written once on restart.
+
+    The components are written independently: when the write of a component fails, the others progress, and its
+    results are retried on the next flushes. After max_attempts failed flushes, its results are written one by one,
+    and those still failing are moved to a dead-letter segment (in the dead-letter subdirectory, with the format of
+    the log, so they can be replayed by moving them back to the directory once the cause is fixed).
+
+    When the backlog (appended but not yet written) exceeds max_backlog_bytes, appends wait for the flusher, up to
+    max_wait seconds, after which the result is written synchronously.
+    """
+
+    def __init__(
+            self,
+            directory: str,
+            batch_size: int = 500,
+            flush_interval: float = 1.0,
+            max_backlog_bytes: int = 256 * 1024 * 1024,
+            max_wait: float = 10.0,
+            segment_bytes: int = 16 * 1024 * 1024,
+            fsync: bool = False,
+            max_attempts: int = 5,
+    ):
+        """
+        :param directory: The directory of the log
+        :param batch_size: The maximum number of results written per flush
+        :param flush_interval: The interval between two flushes when the log is drained, in seconds
+        :param max_backlog_bytes: The backlog above which appends wait for the flusher
+        :param max_wait: The maximum time an append waits for the backlog to shrink, in seconds
+        :param segment_bytes: The size above which a process starts a new segment
+        :param fsync: If True, each append is synced to disk before returning
+        :param max_attempts: The number of failed flushes of the results of a component after which the failing
+            results are moved to the dead-letter segments
+        """
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backlog_bytes = max_backlog_bytes
+        self.max_wait = max_wait
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.max_attempts = max_attempts
+
+        os.makedirs(directory, exist_ok=True)
+
+        self._append_lock = threading.Lock()
+        self._fd: Optional[int] = None
+        self._segment: Optional[str] = None
+        self._segment_size = 0
+
+        # Offsets up to which the segments have been written, persisted in their .offset files
+        self._offsets: Dict[str, int] = {}
+        self._flush_lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        # Number of consecutive failed flushes of the results of each component and options
+        self._failures: Dict[tuple, int] = {}
+
+        os.register_at_fork(after_in_child=self._reset_in_child)
+
+    def _reset_in_child(self):
+        # The child appends to its own segment, and never flushes
+        self._append_lock = threading.Lock()
+        self._fd = None
+        self._segment = None
+        self._flusher = None
+
+    def _path(self, segment: str) -> str:
+        return os.path.join(self.directory, segment)
+
+    # Appending
+
+    def _open_segment(self):
+        self._segment = f"{os.getpid()}-{time.time_ns()}{_OPEN}"
+        self._fd = os.open(self._path(self._segment), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._segment_size = 0
+
+    def _seal_segment(self):
+        os.close(self._fd)
+        os.replace(self._path(self._segment), self._path(self._segment[:-len(_OPEN)] + _SEALED))
+        self._fd = None
+
+    def append(
+            self, name: str, content_type: str, data, date: datetime, deduplicate: bool = False,
+            compression: Optional[str] = None, storage_format: Optional[str] = None,
+            delta_keyframe_interval: Optional[int] = None,
+    ):
+        """
+        Append a result to the log, see write_result for the parameters.
+        """
+        data_bytes = to_bytes(data)
+
+        if self.backlog() > self.max_backlog_bytes and not self._wait_for_backlog():
+            # The flusher cannot keep up, the result is written synchronously, slowing down the component
+            metrics.increment("write_buffer.overflows")
+            write_results(
+                name, content_type, get_or_create_standard_component_table(name), [(data_bytes, date)],
+                deduplicate=deduplicate, compression=compression, storage_format=storage_format,
+                delta_keyframe_interval=delta_keyframe_interval,
+            )
+            return
+
+        metadata = dumps({
+            "name": name,
+            "content_type": content_type,
+            "date": date.isoformat(),
+            "deduplicate": deduplicate,
+            "compression": compression,
+            "storage_format": storage_format,
+            "delta_keyframe_interval": delta_keyframe_interval,
+        })
+        payload = data_bytes or b""
+        header = _HEADER.pack(
+            len(metadata), _NO_DATA if data_bytes is None else len(payload), zlib.crc32(metadata + payload)
+        )
+        record = header + metadata + payload
+
+        with self._append_lock:
+            if self._fd is None:
+                self._open_segment()
+            # A single write per record, appended atomically with O_APPEND
+            os.write(self._fd, record)
+            if self.fsync:
+                os.fsync(self._fd)
+            self._segment_size += len(record)
+            if self._segment_size >= self.segment_bytes:
+                self._seal_segment()
+
+        metrics.increment("write_buffer.appended")
+
+    def backlog(self) -> int:
+        """
+        The number of bytes appended to the log and not yet written, by all the processes.
+        """
+        backlog = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(_OPEN) or entry.name.endswith(_SEALED):
+                    backlog += entry.stat().st_size - self._read_offset(entry.name)
+        metrics.set_gauge("write_buffer.backlog_bytes", backlog)
+        return backlog
+
+    def _wait_for_backlog(self) -> bool:
+        started_at = time.monotonic()
+        while time.monotonic() - started_at < self.max_wait:
+            time.sleep(min(self.flush_interval, 0.1))
+            if self.backlog() <= self.max_backlog_bytes:
+                metrics.observe("write_buffer.backpressure_seconds", time.monotonic() - started_at)
+                return True
+        metrics.observe("write_buffer.backpressure_seconds", time.monotonic() - started_at)
+        return False
+
+    # Flushing
+
+    def _offset_path(self, segment: str) -> str:
+        return self._path(_stem(segment)) + _OFFSET
+
+    def _read_offset(self, segment: str) -> int:
+        if _stem(segment) in self._offsets:
+            return self._offsets[_stem(segment)]
+        try:
+            with open(self._offset_path(segment), "r") as file:
+                return int(file.read())
+        except (OSError, ValueError):
+            return 0
+
+    def _write_offset(self, segment: str, offset: int):
+        path = self._offset_path(segment)
+        with open(path + ".tmp", "w") as file:
+            file.write(str(offset))
+        os.replace(path + ".tmp", path)
+        self._offsets[_stem(segment)] = offset
+
+    def _segments(self) -> List[str]:
+        names = os.listdir(self.directory)
+        segments = [name for name in names if name.endswith(_OPEN) or name.endswith(_SEALED)]
+
+        # Offsets left behind by a removal interrupted by a crash
+        stems = {_stem(segment) for segment in segments}
+        for name in names:
+            if name.endswith(_OFFSET) and name[:-len(_OFFSET)] not in stems:
+                try:
+                    os.remove(self._path(name))
+                except FileNotFoundError:
+                    pass
+
+        # Oldest first, the segments are named after their process and creation time
+        return sorted(segments, key=lambda name: int(name.split("-")[1].split(".")[0]))
+
+    def _read_records(self, segment: str, offset: int, limit: int) -> Tuple[List[_Record], int, bool]:
+        """
+        Read the complete records of a segment from an offset.
+        :return: The records, the offset following the last one, and whether the segment is corrupted after it
+        """
+        with open(self._path(segment), "rb") as file:
+            file.seek(offset)
+            content = file.read()
+
+        records = []
+        position = 0
+        while len(records) < limit and position + _HEADER.size <= len(content):
+            metadata_length, data_length, crc = _HEADER.unpack_from(content, position)
+            payload_length = 0 if data_length == _NO_DATA else data_length
+            end = position + _HEADER.size + metadata_length + payload_length
+            if end > len(content):
+                # Being appended
+                break
+
+            metadata = content[position + _HEADER.size:position + _HEADER.size + metadata_length]
+            payload = content[position + _HEADER.size + metadata_length:end]
+            if zlib.crc32(metadata + payload) != crc:
+                return records, offset + position, True
+
+            records.append(_Record(
+                segment, offset + position, offset + end, loads(metadata),
+                None if data_length == _NO_DATA else payload, content[position:end],
+            ))
+            position = end
+
+        return records, offset + position, False
+
+    def _is_finished(self, segment: str) -> bool:
+        # No more records will be appended to the segment
+        return segment.endswith(_SEALED) or not _is_alive(int(segment.split("-")[0]))
+
+    def _remove(self, segment: str):
+        for path in (self._path(segment), self._offset_path(segment)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self._offsets.pop(_stem(segment), None)
+
+    def flush(self) -> int:
+        """
+        Write a batch of the buffered results to the storage and database.
+        :return: The number of results read from the log
+        """
+        with self._flush_lock:
+            started_at = time.monotonic()
+            records: List[_Record] = []
+            read_segments = []
+
+            for segment in self._segments():
+                if len(records) >= self.batch_size:
+                    break
+
+                offset = self._read_offset(segment)
+                limit = self.batch_size - len(records)
+                try:
+                    segment_records, end, corrupted = self._read_records(segment, offset, limit)
+                except FileNotFoundError:
+                    # Sealed meanwhile, read again on the next flush
+                    continue
+
+                if len(segment_records) < limit and not corrupted:
+                    # Only an incomplete record may follow, left by a crash if no more records will be appended
+                    corrupted = self._is_finished(segment) and end < os.path.getsize(self._path(segment))
+
+                records.extend(segment_records)
+                read_segments.append((segment, end, corrupted))
+
+            failed = self._write(records) if records else []
+
+            # A segment is written up to its first record to retry, the following ones are skipped when retried
+            retry_offsets: Dict[str, int] = {}
+            for record in failed:
+                retry_offsets[record.segment] = min(record.start, retry_offsets.get(record.segment, record.start))
+
+            for segment, end, corrupted in read_segments:
+                if segment in retry_offsets:
+                    if retry_offsets[segment] != self._read_offset(segment):
+                        self._write_offset(segment, retry_offsets[segment])
+                    continue
+
+                if corrupted:
+                    metrics.increment("write_buffer.corrupted_segments")
+                    logger.error(f"Corrupted write buffer segment {segment}, the records after {end} are lost")
+                if corrupted or (self._is_finished(segment) and end >= os.path.getsize(self._path(segment))):
+                    self._remove(segment)
+                elif end != self._read_offset(segment):
+                    self._write_offset(segment, end)
+
+            if records:
+                metrics.increment("write_buffer.flushed", len(records) - len(failed))
+                metrics.observe("write_buffer.flush_seconds", time.monotonic() - started_at)
+
+            return len(records)
+
+    def _write(self, records: List[_Record]) -> List[_Record]:
+        """
+        Write records, component by component.
+        :return: The records to retry
+        """
+        # Group the results per component and options, in order, the last result of a date wins
+        groups: Dict[tuple, List[_Record]] = {}
+        for record in records:
+            metadata = record.metadata
+            key = (
+                metadata["name"], metadata["content_type"], metadata["deduplicate"], metadata["compression"],
+                metadata["storage_format"], metadata["delta_keyframe_interval"],
+            )
+            groups.setdefault(key, []).append(record)
+
+        failed = []
+        for key, group in groups.items():
+            try:
+                self._write_group(key, group)
+                self._failures.pop(key, None)
+                continue
+            except Exception as e:
+                metrics.increment("write_buffer.errors")
+                logger.exception(f"Failed to write the buffered results of {key[0]}: {e}")
+
+            attempts = self._failures[key] = self._failures.get(key, 0) + 1
+            if attempts < self.max_attempts:
+                failed.extend(group)
+                continue
+
+            # Kept failing, only the records failing on their own are set aside
+            del self._failures[key]
+            dead = []
+            for record in group:
+                try:
+                    self._write_group(key, [record])
+                except Exception:
+                    dead.append(record)
+            self._dead_letter(dead)
+
+        return failed
+
+    def _write_group(self, key: tuple, group: List[_Record]):
+        name, content_type, deduplicate, compression, storage_format, delta_keyframe_interval = key
+
+        results: Dict[datetime, Optional[bytes]] = {}
+        for record in group:
+            date = datetime.fromisoformat(record.metadata["date"])
+            if date in results:
+                metrics.increment("write_buffer.coalesced")
+            results[date] = record.data
+
+        table = get_or_create_standard_component_table(name)
+
+        # Written by a flush interrupted before its offsets were persisted, or by a flush retried after a failure
+        with connect() as connection:
+            written = set(connection.execute(
+                select(table.c.date).where(table.c.date.in_(list(results)))
+            ).scalars())
+
+        if written:
+            metrics.increment("write_buffer.replayed_skipped", len(written))
+
+        write_results(
+            name, content_type, table, [(data, date) for date, data in results.items() if date not in written],
+            deduplicate=deduplicate, compression=compression, storage_format=storage_format,
+            delta_keyframe_interval=delta_keyframe_interval,
+        )
+
+    def _dead_letter(self, records: List[_Record]):
+        if not records:
+            return
+
+        directory = os.path.join(self.directory, DEAD_LETTER)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}-{time.time_ns()}{_SEALED}")
+        with open(path, "wb") as file:
+            for record in records:
+                file.write(record.raw)
+            file.flush()
+            os.fsync(file.fileno())
+
+        metrics.increment("write_buffer.dead_lettered", len(records))
+        logger.error(f"Moved {len(records)} buffered results of {records[0].metadata['name']} that kept failing "
+                     f"to be written to {path}")
+
+    def _flush_periodically(self):
+        while True:
+            try:
+                # Drain the log batch by batch, then wait for new results, or before retrying failed writes
+                if self.flush() >= self.batch_size and not self._failures:
+                    continue
+            except Exception as e:
+                metrics.increment("write_buffer.errors")
+                logger.exception(f"Failed to flush the write buffer: {e}")
+            time.sleep(self.flush_interval)
+
+    def start(self):
+        """
+        Start the background flusher in this process, the results buffered before a restart are written first.
+        """
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        self._flusher = threading.Thread(target=self._flush_periodically, name="write-buffer", daemon=True)
+        self._flusher.start()
+
+
+def create_write_buffer() -> Optional[WriteBuffer]:
+    """
+    Create the write buffer configured by the environment: WRITE_BUFFER_DIRECTORY (the buffer is disabled if not
+    set), WRITE_BUFFER_BATCH_SIZE, WRITE_BUFFER_FLUSH_INTERVAL, WRITE_BUFFER_MAX_BACKLOG_BYTES,
+    WRITE_BUFFER_MAX_WAIT, WRITE_BUFFER_SEGMENT_BYTES, WRITE_BUFFER_FSYNC ("true" to sync each append) and
+    WRITE_BUFFER_MAX_ATTEMPTS.
+    """
+    directory = os.environ.get("WRITE_BUFFER_DIRECTORY")
+    if not directory:
+        return None
+
+    return WriteBuffer(
+        directory,
+        batch_size=int(os.environ.get("WRITE_BUFFER_BATCH_SIZE", 500)),
+        flush_interval=float(os.environ.get("WRITE_BUFFER_FLUSH_INTERVAL", 1.0)),
+        max_backlog_bytes=int(os.environ.get("WRITE_BUFFER_MAX_BACKLOG_BYTES", 256 * 1024 * 1024)),
+        max_wait=float(os.environ.get("WRITE_BUFFER_MAX_WAIT", 10.0)),
+        segment_bytes=int(os.environ.get("WRITE_BUFFER_SEGMENT_BYTES", 16 * 1024 * 1024)),
+        fsync=os.environ.get("WRITE_BUFFER_FSYNC", "false").lower() == "true",
+        max_attempts=int(os.environ.get("WRITE_BUFFER_MAX_ATTEMPTS", 5)),
+    )
+
+
+write_buffer = create_write_buffer()
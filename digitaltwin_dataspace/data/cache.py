@@ -0,0 +1,244 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from .. import metrics
+
+# Schedule of the sweeps of the spill directory of the blob cache, bounding the files spilled by all the processes
+BLOB_CACHE_SWEEP_SCHEDULE = os.environ.get("BLOB_CACHE_SWEEP_SCHEDULE", "1m")
+
+# Temporary files older than this are left behind by a crashed write, in seconds
+_STALE_TEMPORARY_SECONDS = 3600
+
+
+class BlobCache:
+    """
+    LRU cache for the payloads read from the storage, bounded by the total size of the cached payloads.
+
+    Payloads are immutable for a given url, so entries are keyed by url and hash and only expire after the
+    (optional) time to live. The entries are kept in the memory of the process, which only lasts a tick with the
+    "process" execution engine. When a spill directory is given, the payloads are written to it as well, where
+    they are shared by the processes: a payload missing from memory is looked up there before being read from the
+    storage. The spilled payloads expire with their modification time (the time they were cached) and are evicted
+    in the order of their access time (updated on each hit) once they exceed spill_max_bytes, whichever process
+    spilled them: each process measures the directory when its own writes may have filled it up, and sweep is run
+    on the BLOB_CACHE_SWEEP_SCHEDULE (default "1m") by the main process (see run_components).
+    """
+
+    def __init__(
+            self,
+            max_bytes: int,
+            ttl: Optional[float] = None,
+            spill_directory: Optional[str] = None,
+            spill_max_bytes: int = 0,
+    ):
+        """
+        :param max_bytes: Maximum total size of the payloads kept in memory, 0 disables the cache
+        :param ttl: Time to live of the entries in seconds, None for no expiration
+        :param spill_directory: Directory shared by the processes where payloads are spilled, None to disable it
+        :param spill_max_bytes: Maximum total size of the payloads spilled to disk
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.spill_directory = spill_directory
+        self.spill_max_bytes = spill_max_bytes
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Tuple[str, str], Tuple[bytes, float]] = OrderedDict()
+        self._size = 0
+        # Size of the spill directory when it was last measured, plus the payloads spilled by this process since
+        self._spilled_size = 0
+
+        os.register_at_fork(after_in_child=self._reset_lock)
+
+        if spill_directory:
+            os.makedirs(spill_directory, exist_ok=True)
+            self.sweep()
+
+    def _reset_lock(self):
+        # A thread of the parent may hold the lock when a process is forked, it would never be released in the child
+        self._lock = threading.Lock()
+
+    def _expires_at(self) -> float:
+        return time.monotonic() + self.ttl if self.ttl else float("inf")
+
+    def _spill_path(self, key: Tuple[str, str]) -> str:
+        return os.path.join(self.spill_directory, hashlib.sha1("|".join(key).encode("utf-8")).hexdigest())
+
+    def _is_expired(self, modified_at: float, now: float) -> bool:
+        return self.ttl is not None and modified_at + self.ttl <= now
+
+    def get(self, url: str, hash: str) -> Optional[bytes]:
+        """
+        Get a payload from the cache.
+        :param url: The url of the payload
+        :param hash: The hash of the payload
+        :return: The payload, None if it is not cached
+        """
+        key = (url, hash)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    metrics.increment("blob_cache.hits")
+                    return entry[0]
+                self._remove(key)
+
+        if self.spill_directory:
+            data = self._read_spilled(key)
+            if data is not None:
+                metrics.increment("blob_cache.spill_hits")
+                self._put_in_memory(key, data)
+                return data
+
+        metrics.increment("blob_cache.misses")
+        return None
+
+    def _read_spilled(self, key: Tuple[str, str]) -> Optional[bytes]:
+        path = self._spill_path(key)
+        try:
+            with open(path, "rb") as file:
+                modified_at = os.fstat(file.fileno()).st_mtime
+                if self._is_expired(modified_at, time.time()):
+                    os.remove(path)
+                    return None
+                data = file.read()
+            # The access time orders the evictions, the modification time is kept for the expiration
+            os.utime(path, (time.time(), modified_at))
+            return data
+        except OSError:
+            # Not spilled, or evicted by another process meanwhile
+            return None
+
+    def put(self, url: str, hash: str, data: bytes):
+        """
+        Add a payload to the cache, and to the spill directory if any, payloads larger than the cache itself
+        are ignored.
+        :param url: The url of the payload
+        :param hash: The hash of the payload
+        :param data: The payload
+        """
+        if data is None:
+            return
+
+        key = (url, hash)
+        self._put_in_memory(key, data)
+        if self.spill_directory:
+            self._spill(key, data)
+
+    def _put_in_memory(self, key: Tuple[str, str], data: bytes):
+        if len(data) > self.max_bytes:
+            return
+
+        evicted = 0
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (data, self._expires_at())
+            self._size += len(data)
+
+            while self._size > self.max_bytes:
+                _, (evicted_data, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted_data)
+                evicted += 1
+
+            metrics.set_gauge("blob_cache.bytes", self._size)
+
+        if evicted:
+            metrics.increment("blob_cache.evictions", evicted)
+
+    def _remove(self, key: Tuple[str, str]):
+        data, _ = self._entries.pop(key)
+        self._size -= len(data)
+
+    def _spill(self, key: Tuple[str, str], data: bytes):
+        if len(data) > self.spill_max_bytes:
+            return
+
+        path = self._spill_path(key)
+        if os.path.exists(path):
+            # Spilled by another process
+            return
+
+        temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporary_path, "wb") as file:
+                file.write(data)
+            os.replace(temporary_path, path)
+        except OSError:
+            return
+
+        with self._lock:
+            self._spilled_size += len(data)
+            full = self._spilled_size > self.spill_max_bytes
+        if full:
+            self.sweep()
+
+    def sweep(self):
+        """
+        Measure the spill directory, removing the expired payloads, then the least recently used ones until the
+        payloads spilled by every process fit in spill_max_bytes again.
+        """
+        now = time.time()
+        files = []
+        for file_name in os.listdir(self.spill_directory):
+            path = os.path.join(self.spill_directory, file_name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # Evicted by another process meanwhile
+                continue
+            if file_name.endswith(".tmp"):
+                if stat.st_mtime + _STALE_TEMPORARY_SECONDS < now:
+                    self._remove_spilled(path)
+                continue
+            if self._is_expired(stat.st_mtime, now):
+                self._remove_spilled(path)
+                continue
+            files.append((stat.st_atime, path, stat.st_size))
+
+        size = sum(file_size for _, _, file_size in files)
+        for _, path, file_size in sorted(files):
+            if size <= self.spill_max_bytes:
+                break
+            self._remove_spilled(path)
+            metrics.increment("blob_cache.spill_evictions")
+            size -= file_size
+
+        with self._lock:
+            self._spilled_size = size
+        metrics.set_gauge("blob_cache.spilled_bytes", size)
+
+    def _remove_spilled(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def clear(self):
+        """
+        Remove all the entries of the cache, including the payloads spilled by every process.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self._spilled_size = 0
+
+        if self.spill_directory:
+            for file_name in os.listdir(self.spill_directory):
+                if not file_name.endswith(".tmp"):
+                    self._remove_spilled(os.path.join(self.spill_directory, file_name))
+
+
+blob_cache = BlobCache(
+    max_bytes=int(os.environ.get("BLOB_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+    ttl=float(os.environ["BLOB_CACHE_TTL"]) if "BLOB_CACHE_TTL" in os.environ else None,
+    spill_directory=os.environ.get("BLOB_CACHE_SPILL_DIRECTORY"),
+    spill_max_bytes=int(os.environ.get("BLOB_CACHE_SPILL_MAX_BYTES", 1024 * 1024 * 1024)),
+)
@@ -0,0 +1,349 @@
+import io
+import os
+import struct
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Literal, Optional, Tuple
+
+from ..serialization import dumps, loads
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+StorageFormat = Literal["parquet"]
+
+# The type column is limited to 24 characters, which rules out application/vnd.apache.parquet
+PARQUET_CONTENT_TYPE = "application/x-parquet"
+PARQUET_CONTENT_TYPES = (PARQUET_CONTENT_TYPE, "application/vnd.apache.parquet")
+
+# Kinds of JSON documents that can be stored as Parquet, recorded in the metadata of the files
+FEATURE_COLLECTION = "feature_collection"
+RECORDS = "records"
+
+GEOMETRY_COLUMN = "geometry"
+FEATURE_ID_COLUMN = "feature_id"
+SNAPSHOT_DATE_COLUMN = "snapshot_date"
+
+_METADATA_KEY = b"digitaltwin_dataspace"
+
+# Deployments opt into storing the bundled position collectors as Parquet (and compacting them), pyarrow being an
+# optional dependency (pip install digitaltwin_dataspace[parquet])
+PARQUET_STORAGE = os.environ.get("PARQUET_STORAGE", "false").lower() == "true"
+
+# Number of snapshots held in memory at once while compacting
+COMPACTION_BATCH_SIZE = int(os.environ.get("COMPACTION_BATCH_SIZE", 100))
+
+# Marker of the columns stored as JSON strings
+_JSON = object()
+
+
+def _require_pyarrow():
+    if pyarrow is None:
+        raise RuntimeError("The pyarrow package is required to store results as Parquet")
+
+
+def _point_wkb(coordinates: List[float]) -> Optional[bytes]:
+    if not coordinates or len(coordinates) < 2 or coordinates[0] is None or coordinates[1] is None:
+        return None
+    if len(coordinates) > 2 and coordinates[2] is not None:
+        return struct.pack("<BIddd", 1, 1001, *map(float, coordinates[:3]))
+    return struct.pack("<BIdd", 1, 1, float(coordinates[0]), float(coordinates[1]))
+
+
+def _point_coordinates(wkb: Optional[bytes]) -> Optional[List[float]]:
+    if wkb is None:
+        return None
+    _, geometry_type = struct.unpack_from("<BI", wkb)
+    if geometry_type == 1001:
+        return list(struct.unpack_from("<ddd", wkb, 5))
+    return list(struct.unpack_from("<dd", wkb, 5))
+
+
+def _column(values: List[Any]) -> Tuple["pyarrow.Array", bool]:
+    """
+    Build a typed column, or a column of JSON strings if the values are nested or of mixed types.
+    :return: The column, and whether it holds JSON strings
+    """
+    try:
+        array = pyarrow.array(values)
+        if not (pyarrow.types.is_nested(array.type) or pyarrow.types.is_null(array.type)):
+            return array, False
+    except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+        pass
+
+    return pyarrow.array([None if value is None else dumps(value).decode("utf-8") for value in values],
+                         pyarrow.string()), True
+
+
+def _table(rows: List[Dict[str, Any]], fixed: Dict[str, "pyarrow.Array"], kind: str) -> "pyarrow.Table":
+    keys = {}
+    for row in rows:
+        for key in row:
+            keys.setdefault(key, None)
+
+    arrays = dict(fixed)
+    json_columns = []
+    for key in keys:
+        if key in arrays:
+            raise ValueError(f"The property {key} conflicts with a column of the Parquet format")
+        arrays[key], is_json = _column([row.get(key) for row in rows])
+        if is_json:
+            json_columns.append(key)
+
+    return pyarrow.table(arrays).replace_schema_metadata(_metadata(kind, json_columns))
+
+
+def _metadata(kind: str, json_columns: List[str]) -> Dict[bytes, bytes]:
+    metadata = {_METADATA_KEY: dumps({"kind": kind, "json_columns": json_columns})}
+    if kind == FEATURE_COLLECTION:
+        metadata[b"geo"] = dumps({
+            "version": "1.0.0",
+            "primary_column": GEOMETRY_COLUMN,
+            "columns": {GEOMETRY_COLUMN: {"encoding": "WKB", "geometry_types": ["Point", "Point Z"]}},
+        })
+    return metadata
+
+
+def _value_rows(value: Any) -> Tuple[str, List[dict], List[Any], List[Optional[bytes]]]:
+    """
+    Split a JSON value in rows.
+    :return: The kind of the value, the rows (properties of the features, or records), and the ids and
+        geometries of the features (empty for records)
+    """
+    if isinstance(value, dict) and value.get("type") == "FeatureCollection":
+        features = value.get("features") or []
+        for feature in features:
+            geometry = feature.get("geometry")
+            if geometry is not None and geometry.get("type") != "Point":
+                raise ValueError(f"Only Point geometries can be stored as Parquet, got {geometry.get('type')}")
+
+        return (
+            FEATURE_COLLECTION,
+            [feature.get("properties") or {} for feature in features],
+            [feature.get("id") for feature in features],
+            [_point_wkb((feature.get("geometry") or {}).get("coordinates")) for feature in features],
+        )
+
+    if isinstance(value, list) and all(isinstance(row, dict) for row in value):
+        return RECORDS, value, [], []
+
+    raise ValueError("Only GeoJSON FeatureCollections and lists of records can be stored as Parquet")
+
+
+def _rows_table(kind: str, rows: List[dict], ids: List[Any], geometries: List[Optional[bytes]]) -> "pyarrow.Table":
+    fixed = {}
+    if kind == FEATURE_COLLECTION:
+        fixed[FEATURE_ID_COLUMN] = _column(ids)[0]
+        fixed[GEOMETRY_COLUMN] = pyarrow.array(geometries, pyarrow.binary())
+    return _table(rows, fixed, kind)
+
+
+def to_arrow(payload: bytes) -> "pyarrow.Table":
+    """
+    Convert a JSON payload to an Arrow table: a GeoJSON FeatureCollection of points becomes a GeoParquet-compatible
+    table (WKB geometry column, one column per property), a list of records becomes one column per key.
+    Nested or mixed-type values are stored as JSON strings.
+    :param payload: The JSON payload
+    :return: The table
+    :raise ValueError: If the payload is not a FeatureCollection of points nor a list of records
+    """
+    _require_pyarrow()
+    return _rows_table(*_value_rows(loads(payload)))
+
+
+def _value_type(values: List[Any]) -> Any:
+    """
+    The Arrow type of the values of a column, None if they are all null, _JSON if they are stored as JSON strings.
+    """
+    try:
+        array = pyarrow.array(values)
+    except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+        return _JSON
+    if pyarrow.types.is_null(array.type):
+        return None
+    if pyarrow.types.is_nested(array.type):
+        return _JSON
+    return array.type
+
+
+def _unify_types(current: Any, new: Any) -> Any:
+    if current is None or current == new:
+        return new
+    if new is None:
+        return current
+    if current is not _JSON and new is not _JSON:
+        if pyarrow.types.is_integer(current) and pyarrow.types.is_floating(new):
+            return new
+        if pyarrow.types.is_floating(current) and pyarrow.types.is_integer(new):
+            return current
+    return _JSON
+
+
+def _snapshot_pages(
+        snapshots: Iterable[Tuple[datetime, Any]], batch_size: int
+) -> Iterator[Tuple[str, List[dict], List[Any], List[Optional[bytes]]]]:
+    """
+    Split snapshots in pages of rows, see _value_rows, each holding the rows of up to batch_size snapshots.
+    """
+    kind, rows, ids, geometries, count = None, [], [], [], 0
+
+    for date, value in snapshots:
+        snapshot_kind, snapshot_rows, snapshot_ids, snapshot_geometries = _value_rows(value)
+        if kind is not None and snapshot_kind != kind:
+            raise ValueError(f"Cannot compact {snapshot_kind} snapshots with {kind} snapshots")
+        kind = snapshot_kind
+
+        rows.extend({SNAPSHOT_DATE_COLUMN: date, **row} for row in snapshot_rows)
+        ids.extend(snapshot_ids)
+        geometries.extend(snapshot_geometries)
+        count += 1
+
+        if count >= batch_size:
+            yield kind, rows, ids, geometries
+            rows, ids, geometries, count = [], [], [], 0
+
+    if count or kind is None:
+        yield kind or RECORDS, rows, ids, geometries
+
+
+def compact(snapshots: Iterable[Tuple[datetime, Any]], batch_size: int = COMPACTION_BATCH_SIZE) -> bytes:
+    """
+    Roll snapshots into a single Parquet file, each row recording the date of its snapshot in a snapshot_date column.
+
+    The snapshots are iterated twice, batch_size snapshots at a time: once to find the columns and their types, then
+    to write the rows, one row group per batch, so that only a batch of snapshots is held in memory.
+    :param snapshots: The dates and JSON values (FeatureCollections or lists of records, all of the same kind)
+        of the snapshots, an iterable that can be iterated twice (e.g. paging through the database on each iteration)
+    :param batch_size: The number of snapshots held in memory at once
+    :return: The Parquet file
+    :raise ValueError: If the snapshots cannot be stored as Parquet
+    """
+    _require_pyarrow()
+
+    # First pass, the union of the columns of the pages and their types
+    kind = RECORDS
+    types: Dict[str, Any] = {}
+    for kind, rows, ids, _ in _snapshot_pages(snapshots, batch_size):
+        if kind == FEATURE_COLLECTION:
+            types[FEATURE_ID_COLUMN] = _unify_types(types.get(FEATURE_ID_COLUMN), _value_type(ids))
+        for key in {key: None for row in rows for key in row}:
+            if key in (FEATURE_ID_COLUMN, GEOMETRY_COLUMN) and kind == FEATURE_COLLECTION:
+                raise ValueError(f"The property {key} conflicts with a column of the Parquet format")
+            types[key] = _unify_types(types.get(key), _value_type([row.get(key) for row in rows]))
+
+    json_columns = [key for key, value_type in types.items() if value_type in (None, _JSON)]
+
+    # The feature id comes first, followed by the geometry, as in to_arrow
+    fields = []
+    for key, value_type in types.items():
+        fields.append(pyarrow.field(key, pyarrow.string() if key in json_columns else value_type))
+        if key == FEATURE_ID_COLUMN and kind == FEATURE_COLLECTION:
+            fields.append(pyarrow.field(GEOMETRY_COLUMN, pyarrow.binary()))
+    schema = pyarrow.schema(fields).with_metadata(_metadata(
+        kind, [key for key in json_columns if key != FEATURE_ID_COLUMN]
+    ))
+
+    # Second pass, one row group per page
+    buffer = io.BytesIO()
+    with pyarrow.parquet.ParquetWriter(buffer, schema, compression="zstd") as writer:
+        for _, rows, ids, geometries in _snapshot_pages(snapshots, batch_size):
+            arrays = []
+            for field in schema:
+                if field.name == GEOMETRY_COLUMN and kind == FEATURE_COLLECTION:
+                    values = geometries
+                elif field.name == FEATURE_ID_COLUMN and kind == FEATURE_COLLECTION:
+                    values = ids
+                else:
+                    values = [row.get(field.name) for row in rows]
+
+                if field.name in json_columns:
+                    values = [None if value is None else dumps(value).decode("utf-8") for value in values]
+                arrays.append(pyarrow.array(values, field.type))
+
+            writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+
+    return buffer.getvalue()
+
+
+def to_parquet(table: "pyarrow.Table") -> bytes:
+    """
+    Write an Arrow table as a Parquet file (compressed with zstd).
+    """
+    _require_pyarrow()
+    buffer = io.BytesIO()
+    pyarrow.parquet.write_table(table, buffer, compression="zstd")
+    return buffer.getvalue()
+
+
+def read_parquet(payload: bytes) -> "pyarrow.Table":
+    """
+    Read a Parquet file written by to_parquet.
+    """
+    _require_pyarrow()
+    return pyarrow.parquet.read_table(pyarrow.BufferReader(payload))
+
+
+def from_arrow(table: "pyarrow.Table") -> Any:
+    """
+    Convert a table built by to_arrow back to the JSON value it was built from.
+    Properties missing from some features or records are restored as null.
+    :param table: The table
+    :return: The FeatureCollection, or the list of records
+    """
+    metadata = loads((table.schema.metadata or {}).get(_METADATA_KEY, b'{"kind": "records"}'))
+    json_columns = set(metadata.get("json_columns", []))
+
+    rows = table.to_pylist()
+    for row in rows:
+        for column in json_columns:
+            if row.get(column) is not None:
+                row[column] = loads(row[column])
+
+    if metadata["kind"] != FEATURE_COLLECTION:
+        return rows
+
+    features = []
+    for row in rows:
+        feature = {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": _point_coordinates(row.pop(GEOMETRY_COLUMN))},
+        }
+        feature_id = row.pop(FEATURE_ID_COLUMN)
+        feature["properties"] = row
+        if feature_id is not None:
+            feature["id"] = feature_id
+        features.append(feature)
+
+    return {"type": "FeatureCollection", "features": features}
+
+
+def render_json(payload: bytes) -> bytes:
+    """
+    Render a Parquet payload back to the JSON it was stored from.
+    """
+    return dumps(from_arrow(read_parquet(payload)))
+
+
+def encode_result(
+        data: Optional[bytes], content_type: str, storage_format: Optional[StorageFormat]
+) -> Tuple[Optional[bytes], str]:
+    """
+    Convert a result to the given storage format.
+    :param data: The JSON result
+    :param content_type: Its content type
+    :param storage_format: The storage format, None to store the result as is
+    :return: The data to store, and its content type
+    """
+    if data is None or storage_format is None:
+        return data, content_type
+
+    if storage_format == "parquet":
+        return to_parquet(to_arrow(data)), PARQUET_CONTENT_TYPE
+
+    raise ValueError(f"Invalid storage format: {storage_format}")
+
+
+def is_parquet(content_type: Optional[str]) -> bool:
+    return content_type in PARQUET_CONTENT_TYPES
@@ -0,0 +1,131 @@
+import gzip
+import os
+from functools import lru_cache
+from typing import Optional, Dict, List, Literal
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+Compression = Literal["zstd", "gzip"]
+
+# Stored encodings, "zstd+dict" payloads were compressed with a trained dictionary and can only be
+# decompressed with it, the id of the dictionary is recorded in the zstd frame itself
+GZIP = "gzip"
+ZSTD = "zstd"
+ZSTD_DICT = "zstd+dict"
+
+DICTIONARY_DIRECTORY = os.environ.get("ZSTD_DICTIONARY_DIRECTORY")
+
+
+@lru_cache(maxsize=1)
+def _load_dictionaries() -> Dict[str, "zstandard.ZstdCompressionDict"]:
+    """
+    Load the trained dictionaries, stored as {component name}.dict files in ZSTD_DICTIONARY_DIRECTORY.
+    :return: The dictionaries by component name
+    """
+    dictionaries = {}
+
+    if zstandard is None or not DICTIONARY_DIRECTORY or not os.path.isdir(DICTIONARY_DIRECTORY):
+        return dictionaries
+
+    for file_name in os.listdir(DICTIONARY_DIRECTORY):
+        if file_name.endswith(".dict"):
+            with open(os.path.join(DICTIONARY_DIRECTORY, file_name), "rb") as file:
+                dictionaries[file_name[:-len(".dict")]] = zstandard.ZstdCompressionDict(file.read())
+
+    return dictionaries
+
+
+def _dictionary_by_id(dict_id: int) -> "zstandard.ZstdCompressionDict":
+    for dictionary in _load_dictionaries().values():
+        if dictionary.dict_id() == dict_id:
+            return dictionary
+
+    raise ValueError(f"No zstd dictionary found with id {dict_id} in {DICTIONARY_DIRECTORY}")
+
+
+def train_dictionary(name: str, samples: List[bytes], dict_size: int = 112640) -> str:
+    """
+    Train a zstd dictionary for a component from samples of its payloads, and save it in ZSTD_DICTIONARY_DIRECTORY.
+    Payloads already compressed with a previous dictionary of the component remain readable
+    as long as the previous dictionary file is kept (under any other name).
+    :param name: The name of the component
+    :param samples: Samples of the payloads of the component
+    :param dict_size: The maximum size of the dictionary, in bytes
+    :return: The path of the saved dictionary
+    """
+    if zstandard is None:
+        raise RuntimeError("The zstandard package is required to train dictionaries")
+    if not DICTIONARY_DIRECTORY:
+        raise RuntimeError("ZSTD_DICTIONARY_DIRECTORY must be set to train dictionaries")
+
+    dictionary = zstandard.train_dictionary(dict_size, samples)
+
+    os.makedirs(DICTIONARY_DIRECTORY, exist_ok=True)
+    path = os.path.join(DICTIONARY_DIRECTORY, f"{name}.dict")
+    with open(path, "wb") as file:
+        file.write(dictionary.as_bytes())
+
+    _load_dictionaries.cache_clear()
+
+    return path
+
+
+def compress(data: bytes, compression: Optional[Compression], name: str = None) -> (bytes, Optional[str]):
+    """
+    Compress a payload.
+    zstd falls back to gzip when the zstandard package is not installed, and uses the trained
+    dictionary of the component if there is one.
+    :param data: The payload
+    :param compression: The requested compression, None for no compression
+    :param name: The name of the component, used to find its trained dictionary
+    :return: The compressed payload, and the encoding to record along with it (None if not compressed)
+    """
+    if data is None or compression is None:
+        return data, None
+
+    if compression == ZSTD and zstandard is not None:
+        dictionary = _load_dictionaries().get(name)
+        if dictionary is not None:
+            return zstandard.ZstdCompressor(dict_data=dictionary).compress(data), ZSTD_DICT
+        return zstandard.ZstdCompressor().compress(data), ZSTD
+
+    if compression in (ZSTD, GZIP):
+        return gzip.compress(data, mtime=0), GZIP
+
+    raise ValueError(f"Invalid compression: {compression}")
+
+
+def decompress(data: bytes, encoding: Optional[str]) -> bytes:
+    """
+    Decompress a payload stored with the given encoding.
+    :param data: The stored payload
+    :param encoding: The encoding recorded along with the payload, None if not compressed
+    :return: The payload
+    """
+    if encoding is None:
+        return data
+
+    if encoding == GZIP:
+        return gzip.decompress(data)
+
+    if encoding in (ZSTD, ZSTD_DICT):
+        if zstandard is None:
+            raise RuntimeError(f"The zstandard package is required to read {encoding} payloads")
+
+        dict_id = zstandard.get_frame_parameters(data).dict_id
+        dictionary = _dictionary_by_id(dict_id) if dict_id else None
+        # The content size is not always recorded in the frame, so a decompression object is used
+        return zstandard.ZstdDecompressor(dict_data=dictionary).decompressobj().decompress(data)
+
+    raise ValueError(f"Invalid encoding: {encoding}")
+
+
+def is_http_encoding(encoding: Optional[str]) -> bool:
+    """
+    Whether payloads stored with the given encoding can be sent as is to HTTP clients accepting it,
+    payloads compressed with a trained dictionary cannot.
+    """
+    return encoding in (GZIP, ZSTD)
@@ -0,0 +1,187 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .. import metrics
+from ..serialization import dumps, loads
+
+# Encoding of the rows stored as a delta, followed by the compression of the delta if any (e.g. "delta+zstd")
+DELTA = "delta"
+
+DELTA_KEYFRAME_CACHE_SIZE = int(os.environ.get("DELTA_KEYFRAME_CACHE_SIZE", 16))
+
+
+def is_delta(encoding: Optional[str]) -> bool:
+    return encoding is not None and (encoding == DELTA or encoding.startswith(DELTA + "+"))
+
+
+def delta_encoding(compression_encoding: Optional[str]) -> str:
+    """
+    The encoding of a delta compressed with the given encoding.
+    """
+    return DELTA if compression_encoding is None else f"{DELTA}+{compression_encoding}"
+
+
+def compression_encoding(encoding: str) -> Optional[str]:
+    """
+    The encoding of the compression of a delta, None if it is not compressed.
+    """
+    return encoding[len(DELTA) + 1:] or None
+
+
+def canonical(data: bytes) -> Optional[bytes]:
+    """
+    Re-encode a JSON payload with the configured serializer, so that reconstructing it from a delta gives back the
+    same bytes (and hash). Payloads written and read with different serializers are reconstructed equal, but not
+    byte for byte.
+    :return: The canonical payload, None if the payload is not JSON
+    """
+    try:
+        return dumps(loads(data))
+    except ValueError:
+        return None
+
+
+def _split(document: Any) -> Tuple[Optional[str], Optional[list]]:
+    """
+    Find the list of items of a document, the features of a FeatureCollection or the records of a list.
+    :return: The key of the items in the document (None for a list), and the items (None if the document has none)
+    """
+    if isinstance(document, list):
+        return None, document
+    if isinstance(document, dict) and isinstance(document.get("features"), list):
+        return "features", document["features"]
+    return None, None
+
+
+class _Keyframe:
+    def __init__(self, payload: bytes):
+        self.document = loads(payload)
+        self.key, self.items = _split(self.document)
+        self._serialized: Optional[List[bytes]] = None
+        self._positions: Optional[Dict[bytes, int]] = None
+
+    def serialized(self) -> Tuple[List[bytes], Dict[bytes, int]]:
+        """
+        The items encoded to JSON, and the position of the first occurrence of each, only computed to write deltas.
+        """
+        if self._serialized is None:
+            self._serialized = [dumps(item) for item in self.items]
+            self._positions = {}
+            for position, item in enumerate(self._serialized):
+                self._positions.setdefault(item, position)
+        return self._serialized, self._positions
+
+
+_keyframes_lock = threading.Lock()
+_keyframes: OrderedDict[Tuple[str, str], _Keyframe] = OrderedDict()
+
+
+def _keyframe(url: str, hash: str, read: Callable[[], bytes]) -> _Keyframe:
+    """
+    Get a keyframe parsed, from the LRU cache of the last DELTA_KEYFRAME_CACHE_SIZE keyframes.
+    """
+    key = (url, hash)
+    with _keyframes_lock:
+        keyframe = _keyframes.get(key)
+        if keyframe is not None:
+            _keyframes.move_to_end(key)
+            metrics.increment("delta.keyframe_cache.hits")
+            return keyframe
+
+    metrics.increment("delta.keyframe_cache.misses")
+    keyframe = _Keyframe(read())
+
+    with _keyframes_lock:
+        _keyframes[key] = keyframe
+        while len(_keyframes) > DELTA_KEYFRAME_CACHE_SIZE:
+            _keyframes.popitem(last=False)
+
+    return keyframe
+
+
+def encode_delta(
+        data: bytes, keyframe_id: int, keyframe_url: str, keyframe_hash: str, keyframe_encoding: Optional[str],
+        read_keyframe: Callable[[], bytes],
+) -> Optional[bytes]:
+    """
+    Encode a JSON payload as its differences with a keyframe, feature by feature (or record by record): the runs of
+    items found unchanged in the keyframe are referenced by their positions in the keyframe, the changed and new
+    items are stored in full, along with the rest of the document.
+    :param data: The canonical payload (see canonical)
+    :param keyframe_id: The id of the row of the keyframe
+    :param keyframe_url: The url of the keyframe
+    :param keyframe_hash: The hash of the keyframe
+    :param keyframe_encoding: The encoding of the keyframe
+    :param read_keyframe: Reads the keyframe payload, if it is not in the cache
+    :return: The delta, None if the payload has no list of items, or if the delta is not smaller than the payload
+    """
+    document = loads(data)
+    key, items = _split(document)
+    if items is None:
+        return None
+
+    keyframe = _keyframe(keyframe_url, keyframe_hash, read_keyframe)
+    if keyframe.items is None:
+        return None
+    serialized, positions = keyframe.serialized()
+
+    runs = []
+    for item in items:
+        item_bytes = dumps(item)
+        last = runs[-1] if runs else None
+
+        if isinstance(last, list) and last[1] < len(serialized) and serialized[last[1]] == item_bytes:
+            last[1] += 1
+        elif item_bytes in positions:
+            runs.append([positions[item_bytes], positions[item_bytes] + 1])
+        elif isinstance(last, dict):
+            last["new"].append(item)
+        else:
+            runs.append({"new": [item]})
+
+    if key is None:
+        document = None
+    else:
+        document[key] = None
+
+    delta = dumps({
+        "keyframe": {"id": keyframe_id, "url": keyframe_url, "hash": keyframe_hash, "encoding": keyframe_encoding},
+        "key": key,
+        "document": document,
+        "items": runs,
+    })
+
+    return delta if len(delta) < len(data) else None
+
+
+def decode_delta(delta: bytes, read_payload: Callable[[str, str, Optional[str]], bytes]) -> bytes:
+    """
+    Reconstruct a payload from its delta.
+    :param delta: The delta
+    :param read_payload: Reads a payload from its url, hash and encoding, used to read the keyframe if it is not
+        in the cache
+    :return: The payload
+    """
+    delta = loads(delta)
+    reference = delta["keyframe"]
+    keyframe = _keyframe(
+        reference["url"], reference["hash"],
+        lambda: read_payload(reference["url"], reference["hash"], reference["encoding"])
+    )
+
+    items = []
+    for run in delta["items"]:
+        if isinstance(run, list):
+            items.extend(keyframe.items[run[0]:run[1]])
+        else:
+            items.extend(run["new"])
+
+    document = delta["document"]
+    if delta["key"] is None:
+        document = items
+    else:
+        document[delta["key"]] = items
+
+    return dumps(document)
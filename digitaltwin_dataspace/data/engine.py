@@ -1,8 +1,10 @@
 import os
+from contextlib import contextmanager
 from functools import lru_cache
+from typing import Any, Dict, Iterator, Optional
 
-from sqlalchemy import create_engine, NullPool
-from sqlalchemy.engine import Engine
+from sqlalchemy import create_engine, NullPool, QueuePool
+from sqlalchemy.engine import Engine, Connection
 
 
 class LazyEngine:
@@ -21,16 +23,76 @@ class LazyEngine:
     @lru_cache(maxsize=1)
     def _cached_engine(self) -> Engine:
         if self._engine is None:
-            args = {}
-            if "postgres" in os.environ.get("DATABASE_URL", ""):
-                args["pool_pre_ping"] = True
-                args["client_encoding"] = "utf8"
-                args["poolclass"] = NullPool
-                args["pool_recycle"] = 1800
+            database_url = os.environ.get("DATABASE_URL", "")
+            self._engine = create_engine(database_url, **engine_arguments(database_url))
 
-
-            self._engine = create_engine(os.environ.get("DATABASE_URL", ""), **args)
+            # Connections must never be shared between a parent and a child process, the child process
+            # forgets the pooled connections of the parent (without closing them) and opens its own.
+            os.register_at_fork(after_in_child=self._dispose_in_child)
         return self._engine
 
+    def _dispose_in_child(self):
+        if self._engine is not None:
+            self._engine.dispose(close=False)
+
+
+def engine_arguments(database_url: str) -> Dict[str, Any]:
+    """
+    Get the arguments of the engine of the given database, configured by the environment.
+    PostgreSQL connections are not pooled, unless DATABASE_POOL is "queue": a QueuePool of DATABASE_POOL_SIZE
+    connections (default 5) is then used, see the other DATABASE_POOL_ variables.
+    :param database_url: The url of the database
+    :return: The keyword arguments of create_engine
+    """
+    args = {}
+    if "postgres" in database_url:
+        args["pool_pre_ping"] = True
+        args["client_encoding"] = "utf8"
+        args["poolclass"] = NullPool
+        args["pool_recycle"] = 1800
+
+        if os.environ.get("DATABASE_POOL", "null") == "queue":
+            args["poolclass"] = QueuePool
+            args["pool_size"] = int(os.environ.get("DATABASE_POOL_SIZE", 5))
+            args["max_overflow"] = int(os.environ.get("DATABASE_POOL_MAX_OVERFLOW", 10))
+            args["pool_timeout"] = int(os.environ.get("DATABASE_POOL_TIMEOUT", 30))
+            args["pool_recycle"] = int(os.environ.get("DATABASE_POOL_RECYCLE", 1800))
+            args["pool_pre_ping"] = os.environ.get("DATABASE_POOL_PRE_PING", "true").lower() == "true"
+
+    return args
+
+
+def pool_statistics() -> Dict[str, int]:
+    """
+    Get the statistics of the connection pool of the engine.
+    :return: The size of the pool, the number of checked in, checked out and overflow connections,
+        empty if the pool does not keep connections (e.g. NullPool)
+    """
+    pool = engine.pool
+
+    if not isinstance(pool, QueuePool):
+        return {}
+
+    return {
+        "database.pool.size": pool.size(),
+        "database.pool.checked_in": pool.checkedin(),
+        "database.pool.checked_out": pool.checkedout(),
+        "database.pool.overflow": pool.overflow(),
+    }
+
+
+@contextmanager
+def connect(connection: Optional[Connection] = None) -> Iterator[Connection]:
+    """
+    Reuse the given connection, or open a new one from the engine if None is given.
+    :param connection: The connection to reuse, if any
+    :return: A context manager yielding the connection
+    """
+    if connection is not None:
+        yield connection
+    else:
+        with engine.connect() as connection:
+            yield connection
+
 
 engine = LazyEngine().engine
\ No newline at end of file
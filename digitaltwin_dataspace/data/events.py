@@ -0,0 +1,215 @@
+import abc
+import logging
+import os
+import select
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+
+from .engine import engine
+from .. import metrics
+
+logger = logging.getLogger(__name__)
+
+# Callback receiving the name of the component that wrote a new row
+Subscriber = Callable[[str], None]
+
+
+class EventBus(abc.ABC):
+    """
+    Publishes a "new row" event each time a component writes a result, and notifies the subscribers of the component.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, List[Subscriber]] = defaultdict(list)
+        self._thread: Optional[threading.Thread] = None
+
+        os.register_at_fork(after_in_child=self._reset_in_child)
+
+    def _reset_in_child(self):
+        # The listening thread does not survive a fork, and the subscribers of the parent (e.g. submitting harvesters
+        # to its execution engine) must not be notified in the child, which subscribes on its own (e.g. the API server)
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(list)
+        self._thread = None
+
+    @abc.abstractmethod
+    def publish(self, name: str):
+        """
+        Publish a "new row" event, must be called once the row is committed.
+        :param name: The name of the component that wrote the row
+        """
+        pass
+
+    def subscribe(self, names: Iterable[str], subscriber: Subscriber):
+        """
+        Subscribe to the "new row" events of the given components.
+        :param names: The names of the components
+        :param subscriber: The callback called with the name of the component each time it writes a row
+        """
+        with self._lock:
+            for name in names:
+                self._subscribers[name].append(subscriber)
+        self._start()
+
+    def _start(self):
+        """
+        Start listening for events, called on each subscription.
+        """
+        pass
+
+    def _dispatch(self, name: str):
+        metrics.increment("events.received")
+        with self._lock:
+            subscribers = list(self._subscribers.get(name, []))
+        for subscriber in subscribers:
+            try:
+                subscriber(name)
+            except Exception as e:
+                logger.exception(f"Error while notifying a subscriber of {name}: {e}")
+
+
+class InProcessEventBus(EventBus):
+    """
+    Notifies the subscribers of the current process, the components must run in the same process
+    as the subscribers (e.g. with the "thread" or "asyncio" execution engines).
+    """
+
+    def publish(self, name: str):
+        metrics.increment("events.published")
+        self._dispatch(name)
+
+
+class FileEventBus(EventBus):
+    """
+    Notifies the subscribers of any process on the same machine, events are published by appending a byte
+    to a file per component in a directory, whose size and modification time are polled by the subscribing process.
+    The files are truncated once they reach max_size bytes, which changes their size as well.
+    """
+
+    def __init__(self, directory: str, poll_interval: float = 0.1, max_size: int = 4096):
+        super().__init__()
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def publish(self, name: str):
+        metrics.increment("events.published")
+        with open(self._path(name), "ab") as file:
+            file.write(b".")
+            if file.tell() >= self.max_size:
+                file.truncate(0)
+
+    def _version(self, name: str) -> Optional[tuple]:
+        try:
+            stat = os.stat(self._path(name))
+            return stat.st_size, stat.st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._poll, name="file-event-bus", daemon=True)
+        self._thread.start()
+
+    def _poll(self):
+        seen = {}
+        while True:
+            with self._lock:
+                names = list(self._subscribers)
+            for name in names:
+                version = self._version(name)
+                if name in seen and version != seen[name]:
+                    self._dispatch(name)
+                seen[name] = version
+            time.sleep(self.poll_interval)
+
+
+class PostgresEventBus(EventBus):
+    """
+    Notifies the subscribers of any process connected to the same Postgres database, through LISTEN/NOTIFY.
+    Requires the psycopg2 driver.
+    """
+
+    def __init__(self, channel: str = "dataspace_new_row"):
+        super().__init__()
+        self.channel = channel
+
+    def publish(self, name: str):
+        metrics.increment("events.published")
+        with engine.connect() as connection:
+            connection.execute(text("SELECT pg_notify(:channel, :name)"), {"channel": self.channel, "name": name})
+            connection.commit()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._listen, name="postgres-event-bus", daemon=True)
+        self._thread.start()
+
+    def _listen(self):
+        while True:
+            try:
+                raw_connection = engine.raw_connection()
+                # The listening connection is kept open for the lifetime of the process, out of the pool
+                raw_connection.detach()
+                connection = raw_connection.driver_connection
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+
+                while True:
+                    if select.select([connection], [], [], 60) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        self._dispatch(connection.notifies.pop(0).payload)
+            except Exception as e:
+                logger.exception(f"Postgres event bus listener failed, reconnecting: {e}")
+                time.sleep(1)
+
+
+def create_event_bus() -> Optional[EventBus]:
+    """
+    Create the event bus configured by the EVENT_BUS environment variable: "memory", "file" (in the
+    EVENT_BUS_DIRECTORY directory) or "postgres". No event bus is used if it is not set.
+    :return: The event bus, None if events are disabled
+    """
+    name = os.environ.get("EVENT_BUS")
+
+    if not name:
+        return None
+    if name == "memory":
+        return InProcessEventBus()
+    if name == "file":
+        return FileEventBus(os.environ["EVENT_BUS_DIRECTORY"])
+    if name == "postgres":
+        return PostgresEventBus()
+
+    raise ValueError(f"Invalid event bus: {name}")
+
+
+event_bus = create_event_bus()
+
+
+def publish_new_row(name: str):
+    """
+    Publish a "new row" event for a component, if an event bus is configured.
+    :param name: The name of the component
+    """
+    if event_bus is not None:
+        try:
+            event_bus.publish(name)
+        except Exception as e:
+            logger.exception(f"Failed to publish the new row event of {name}: {e}")
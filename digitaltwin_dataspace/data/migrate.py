@@ -0,0 +1,111 @@
+import argparse
+import logging
+import re
+from typing import List, Optional
+
+from sqlalchemy import Table, inspect, select, update
+
+from .engine import engine
+from .storage import storage_manager
+from .sync_db import get_or_create_standard_component_table
+from .write import storage_key
+
+logger = logging.getLogger(__name__)
+
+# Keys of the flat layout, name/2025-01-31_12-30-15
+_FLAT_KEY = re.compile(r"/\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}$")
+
+STANDARD_COLUMNS = {"id", "date", "data", "hash", "copy_id"}
+
+
+def standard_table_names() -> List[str]:
+    """
+    The names of the tables of the database storing the results of components.
+    """
+    inspector = inspect(engine)
+    return [
+        name for name in inspector.get_table_names()
+        if STANDARD_COLUMNS <= {column["name"] for column in inspector.get_columns(name)}
+    ]
+
+
+def migrate_table(table: Table, batch_size: int = 1000, dry_run: bool = False) -> int:
+    """
+    Move the data of a table stored under the flat layout (name/2025-01-31_12-30-15) to the date-partitioned
+    layout (see storage_key). Each file is copied, the rows referencing it are updated, then the file is deleted,
+    so an interrupted migration can be resumed by running it again.
+
+    Rows used as keyframes by rows stored as a delta are left in place, the deltas reference their url.
+    :param table: The table
+    :param batch_size: The number of rows read at once
+    :param dry_run: If True, only count the files to move
+    :return: The number of moved files
+    """
+    keyframes = set()
+    if "keyframe_id" in table.c:
+        with engine.connect() as connection:
+            keyframes = set(connection.execute(
+                select(table.c.keyframe_id).where(table.c.keyframe_id.isnot(None)).distinct()
+            ).scalars())
+
+    moved = 0
+    moved_urls = set()
+    after_id = 0
+    while True:
+        with engine.connect() as connection:
+            rows = connection.execute(
+                select(table.c.id, table.c.date, table.c.data, table.c.hash)
+                .where(table.c.id > after_id)
+                .where(table.c.data.isnot(None))
+                .where(table.c.copy_id.is_(None))
+                .order_by(table.c.id.asc())
+                .limit(batch_size)
+            ).fetchall()
+
+            for row in rows:
+                if not _FLAT_KEY.search(row.data) or row.id in keyframes or row.data in moved_urls:
+                    # Rows written within the same second shared the same flat key, it is moved once
+                    continue
+
+                moved += 1
+                moved_urls.add(row.data)
+                if dry_run:
+                    continue
+
+                url = storage_manager.write(
+                    storage_key(table.name, row.date, row.hash), storage_manager.read(row.data)
+                )
+                # The copies of the row reference the same url
+                connection.execute(update(table).where(table.c.data == row.data).values(data=url))
+                connection.commit()
+                storage_manager.delete(row.data)
+
+        if len(rows) < batch_size:
+            return moved
+        after_id = rows[-1].id
+
+
+def migrate(table_names: Optional[List[str]] = None, batch_size: int = 1000, dry_run: bool = False) -> int:
+    """
+    Move the data of the given tables (all the tables of components by default) to the date-partitioned layout,
+    see migrate_table.
+    :return: The number of moved files
+    """
+    moved = 0
+    for name in table_names or standard_table_names():
+        table_moved = migrate_table(get_or_create_standard_component_table(name), batch_size, dry_run)
+        logger.info(f"{name}: {table_moved} files {'to move' if dry_run else 'moved'}")
+        moved += table_moved
+    return moved
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    parser = argparse.ArgumentParser(description="Move stored data to the date-partitioned layout")
+    parser.add_argument("tables", nargs="*", help="The tables to migrate, all the tables of components by default")
+    parser.add_argument("--batch-size", type=int, default=1000, help="The number of rows read at once")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the files to move")
+    arguments = parser.parse_args()
+
+    migrate(arguments.tables, arguments.batch_size, arguments.dry_run)
@@ -0,0 +1,228 @@
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional, Set, Tuple
+
+from sqlalchemy import Table, select, update, and_, or_
+from sqlalchemy.engine import Connection
+
+from .compression import GZIP, ZSTD, ZSTD_DICT, compress
+from .delta import compression_encoding
+from .engine import connect
+from .retrieve import read_payload
+from .storage import storage_manager
+from .sync_db import get_or_create_standard_component_table
+from .write import storage_key
+from .. import metrics
+from ..components.base import RetentionPolicy
+from ..utils import schedule_string_to_time_delta, round_datetime_to_previous_delta
+
+logger = logging.getLogger(__name__)
+
+RETENTION_BATCH_SIZE = int(os.environ.get("RETENTION_BATCH_SIZE", 1000))
+RETENTION_SCHEDULE = os.environ.get("RETENTION_SCHEDULE", "1h")
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+
+def _materialize(connection: Connection, table: Table, ids: List[int]) -> Set[str]:
+    """
+    Store in full the kept rows stored as a delta against one of the given rows, about to be deleted.
+    :return: The urls of the deltas, no longer referenced
+    """
+    rows = connection.execute(
+        select(table.c.date, table.c.data, table.c.hash, table.c.encoding)
+        .where(table.c.keyframe_id.in_(ids))
+        .where(table.c.id.notin_(ids))
+    ).fetchall()
+
+    urls = set()
+    for row in rows:
+        if row.data in urls:
+            # A copy of an already materialized delta
+            continue
+
+        data = read_payload(row.data, row.hash, row.encoding)
+        compression = {GZIP: "gzip", ZSTD: "zstd", ZSTD_DICT: "zstd"}.get(compression_encoding(row.encoding))
+        stored, encoding = compress(data, compression, table.name)
+        url = storage_manager.write(f"{storage_key(table.name, row.date, row.hash)}-full", stored)
+
+        connection.execute(
+            update(table).where(table.c.data == row.data).values(data=url, encoding=encoding, keyframe_id=None)
+        )
+        urls.add(row.data)
+
+    metrics.increment("retention.deltas_materialized", len(urls))
+    return urls
+
+
+def _delete_rows(connection: Connection, table: Table, rows: list) -> int:
+    """
+    Delete rows and the data only they reference, in a single transaction.
+    Copies (see deduplicate) of a deleted row that are kept are rewritten to reference the first kept copy,
+    which becomes the original row, so the data they share is kept. Kept rows stored as a delta against a deleted
+    row are rewritten to be stored in full.
+    :return: The number of deleted blobs
+    """
+    ids = [row.id for row in rows]
+    urls = _materialize(connection, table, ids)
+    # Read again, the rows may have been materialized while deleting a previous batch
+    urls |= {
+        row.data for row in connection.execute(
+            select(table.c.data).where(table.c.id.in_(ids)).where(table.c.data.isnot(None))
+        ).fetchall()
+    }
+
+    copies = connection.execute(
+        select(table.c.id, table.c.copy_id)
+        .where(table.c.copy_id.in_(ids))
+        .where(table.c.id.notin_(ids))
+        .order_by(table.c.id.asc())
+    ).fetchall()
+
+    promoted = {}
+    for copy in copies:
+        if copy.copy_id not in promoted:
+            promoted[copy.copy_id] = copy.id
+            connection.execute(update(table).where(table.c.id == copy.id).values(copy_id=None))
+        else:
+            connection.execute(update(table).where(table.c.id == copy.id).values(copy_id=promoted[copy.copy_id]))
+
+    connection.execute(table.delete().where(table.c.id.in_(ids)))
+
+    referenced: Set[str] = set()
+    if urls:
+        referenced = {
+            row.data for row in connection.execute(
+                select(table.c.data).where(table.c.data.in_(urls)).distinct()
+            ).fetchall()
+        }
+
+    connection.commit()
+
+    # Blobs are deleted once the rows are gone, a failure only leaves an orphan blob behind
+    deleted = 0
+    for url in urls - referenced:
+        try:
+            storage_manager.delete(url)
+            deleted += 1
+        except Exception as e:
+            logger.warning(f"Failed to delete blob {url}: {e}")
+
+    return deleted
+
+
+def _thin(
+        connection: Connection, table: Table, start: Optional[datetime], end: datetime, period: Optional[timedelta],
+        batch_size: int
+) -> int:
+    """
+    Delete the rows between two dates, except the first row (with data, if any) of each period.
+    :param start: The start date (inclusive), None for no lower bound
+    :param end: The end date (exclusive)
+    :param period: The period of which the first row is kept, None to delete every row
+    :return: The number of deleted rows
+    """
+    query = select(table.c.id, table.c.date, table.c.data, table.c.hash).where(table.c.date < end)
+    if start is not None:
+        query = query.where(table.c.date >= start)
+
+    deleted_rows = 0
+    pending = []
+    bucket, bucket_rows = None, []
+
+    def close_bucket():
+        kept = next((row for row in bucket_rows if row.hash is not None), bucket_rows[0])
+        pending.extend(row for row in bucket_rows if row is not kept)
+
+    after = None
+    while True:
+        page_query = query
+        if after is not None:
+            page_query = page_query.where(
+                or_(table.c.date > after.date, and_(table.c.date == after.date, table.c.id > after.id))
+            )
+        page = connection.execute(
+            page_query.order_by(table.c.date.asc(), table.c.id.asc()).limit(batch_size)
+        ).fetchall()
+        # Ends the transaction of the read, the deletions are committed batch by batch
+        connection.commit()
+
+        for row in page:
+            if period is None:
+                pending.append(row)
+                continue
+
+            row_bucket = round_datetime_to_previous_delta(row.date, period)
+            if row_bucket != bucket and bucket_rows:
+                close_bucket()
+                bucket_rows = []
+            bucket = row_bucket
+            bucket_rows.append(row)
+
+        if len(page) < batch_size and bucket_rows:
+            close_bucket()
+            bucket_rows = []
+
+        while len(pending) >= batch_size or (pending and len(page) < batch_size):
+            batch, pending = pending[:batch_size], pending[batch_size:]
+            metrics.increment("retention.blobs_deleted", _delete_rows(connection, table, batch))
+            metrics.increment("retention.rows_deleted", len(batch))
+            deleted_rows += len(batch)
+
+        if len(page) < batch_size:
+            return deleted_rows
+        after = page[-1]
+
+
+def apply_retention(
+        table: Table, policy: RetentionPolicy, now: datetime = None, batch_size: int = RETENTION_BATCH_SIZE,
+        connection: Connection = None,
+) -> int:
+    """
+    Apply a retention policy to a table: every row is kept for policy.raw, then the first row of each hour
+    for policy.hourly, then the first row of each day for policy.daily (forever if None), the others are deleted
+    with the data only they reference.
+
+    The kept rows are left untouched, so retrieving the latest row before a date returns the closest
+    kept row in the older tiers.
+    :param table: The table
+    :param policy: The retention policy
+    :param now: The current date, datetime.now() by default
+    :param batch_size: The number of rows read and deleted at once, each batch is deleted in its own transaction
+    :param connection: The connection to reuse, a new one is opened if None
+    :return: The number of deleted rows
+    """
+    end = (now or datetime.now()) - schedule_string_to_time_delta(policy.raw)
+
+    # The (start, end, period of which a row is kept) of the tiers older than the raw one
+    tiers: List[Tuple[Optional[datetime], datetime, Optional[timedelta]]] = []
+    if policy.hourly is not None:
+        start = end - schedule_string_to_time_delta(policy.hourly)
+        tiers.append((start, end, HOUR))
+        end = start
+    if policy.daily is not None:
+        start = end - schedule_string_to_time_delta(policy.daily)
+        tiers.append((start, end, DAY))
+        tiers.append((None, start, None))
+    else:
+        tiers.append((None, end, DAY))
+
+    deleted = 0
+    with connect(connection) as connection:
+        for start, end, period in tiers:
+            deleted += _thin(connection, table, start, end, period, batch_size)
+
+    return deleted
+
+
+def run_retention(name: str, policy: RetentionPolicy):
+    """
+    Apply the retention policy of a component to its table, scheduled by run_components.
+    :param name: The name of the component
+    :param policy: The retention policy of the component
+    """
+    deleted = apply_retention(get_or_create_standard_component_table(name), policy)
+    if deleted:
+        logger.info(f"Retention of {name}: deleted {deleted} rows")
@@ -1,14 +1,20 @@
-import json
-from dataclasses import dataclass
+import os
+import time
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Union, List, Optional
+from typing import Union, List, Optional, Dict, Set, Tuple, Any
 
-from sqlalchemy import Table, select
-from sqlalchemy.orm import aliased
-from sqlalchemy.sql.functions import coalesce
+from sqlalchemy import Table, select, or_, and_
+from sqlalchemy.engine import Connection
 
-from .engine import engine
+from .cache import blob_cache
+from .columnar import from_arrow, is_parquet, read_parquet
+from .compression import decompress
+from .delta import is_delta, compression_encoding, decode_delta
+from .engine import connect
+from .events import event_bus
 from .storage import storage_manager
+from ..serialization import loads
 
 
 @dataclass
@@ -17,10 +23,88 @@ class Data:
     hash: str
     _url: str
     content_type: str = None
+    id: Optional[int] = None
+    encoding: Optional[str] = None
+    _payload: Optional[bytes] = field(default=None, init=False, repr=False, compare=False)
 
     @property
     def data(self) -> bytes:
-        return storage_manager.read(self._url)
+        if self._payload is None:
+            self._payload = read_payload(self._url, self.hash, self.encoding)
+        return self._payload
+
+    @property
+    def url(self) -> str:
+        return self._url
+
+    def json(self) -> Any:
+        """
+        The payload decoded from JSON with the configured serializer (see serialization),
+        payloads stored as Parquet are converted back to the JSON they were stored from.
+        """
+        if is_parquet(self.content_type):
+            return from_arrow(read_parquet(self.data))
+        return loads(self.data)
+
+    @property
+    def cached_data(self) -> Optional[bytes]:
+        """
+        The payload if it is already in memory (read before or in the blob cache), None otherwise.
+        """
+        if self._payload is None:
+            self._payload = blob_cache.get(self._url, self.hash)
+        return self._payload
+
+
+def read_payload(url: str, hash: str, encoding: Optional[str] = None) -> bytes:
+    """
+    Read a payload from the storage, going through the blob cache.
+    :param url: The url of the payload
+    :param hash: The hash of the payload
+    :param encoding: The encoding of the stored payload, it is decompressed before being returned (and cached),
+        and reconstructed from its keyframe if it is stored as a delta
+    :return: The payload
+    """
+    data = blob_cache.get(url, hash)
+
+    if data is None:
+        compression = compression_encoding(encoding) if is_delta(encoding) else encoding
+        # Compressed payloads are decompressed straight from the (possibly memory-mapped) stored file
+        stored = storage_manager.read_view(url) if compression is not None else storage_manager.read(url)
+        data = _decode_payload(url, hash, encoding, stored)
+
+    return data
+
+
+def _decode_payload(url: str, hash: str, encoding: Optional[str], stored: bytes) -> bytes:
+    # Decompress (and reconstruct) a stored payload, and put it in the blob cache
+    if is_delta(encoding):
+        data = decode_delta(decompress(stored, compression_encoding(encoding)), read_payload)
+    else:
+        data = decompress(stored, encoding)
+    blob_cache.put(url, hash, data)
+    return data
+
+
+def prefetch(rows: List[Data]):
+    """
+    Read the payloads of the given rows concurrently (see StorageManager.read_many), so that accessing their data
+    does not read the storage one row after another. Payloads already in memory are not read again.
+    :param rows: The rows
+    """
+    missing = {}
+    for row in rows:
+        if row is not None and row.hash is not None and row.cached_data is None:
+            missing.setdefault(row.url, []).append(row)
+
+    if not missing:
+        return
+
+    for (url, url_rows), stored in zip(missing.items(), storage_manager.read_many(list(missing))):
+        first = url_rows[0]
+        payload = _decode_payload(url, first.hash, first.encoding, stored)
+        for row in url_rows:
+            row._payload = payload
 
 
 def data_result(func) -> Optional[Union[Data, List[Data]]]:
@@ -32,10 +116,11 @@ def data_result(func) -> Optional[Union[Data, List[Data]]]:
 
         # If the result is a single row, return a single Data object
         if not isinstance(result, list):
-            return Data(date=result.date, _url=result.data, content_type=result.type, hash=result.hash)
+            return Data(date=result.date, _url=result.data, content_type=result.type, hash=result.hash, id=result.id,
+                        encoding=result.encoding)
 
         return [
-            Data(date=row.date, _url=row.data, content_type=row.type, hash=row.hash)
+            Data(date=row.date, _url=row.data, content_type=row.type, hash=row.hash, id=row.id, encoding=row.encoding)
             for row in result
         ]
 
@@ -44,40 +129,88 @@ def data_result(func) -> Optional[Union[Data, List[Data]]]:
 
 def base_query(table: Table, with_null: bool = False):
     """
-    Returns a base query for a table. But replace the value of the date column
-    when it is None with the value of the row with the id matching the copy_id.
+    Returns a base query for a table. Rows referencing another row through the copy_id
+    column hold a copy of the data and hash of the referenced row, so no join is needed.
     :param table: The table
     :param with_null: Whether to include rows with null data
     :return: The base query to use for all subsequent queries
     """
 
-    t2 = aliased(table)
-
     query = select(
         table.c.id,
         table.c.date,
-        coalesce(t2.c.data, table.c.data).label("data"),
+        table.c.data,
         table.c.type,
-        coalesce(t2.c.hash, table.c.hash).label("hash"),
+        table.c.hash,
+        table.c.encoding,
     )
 
     if not with_null:
-        query = query.where((table.c.copy_id.isnot(None)) | (table.c.hash.isnot(None)))
-
-    query = query.select_from(table).outerjoin(t2, table.c.copy_id == t2.c.id)
+        query = query.where(table.c.hash.isnot(None))
 
     return query
 
 
+# Latest row of each table, with the time at which the entry expires
+_latest_rows: Dict[str, Tuple[float, Data]] = {}
+# Tables whose new row events invalidate the cached latest row, in this process
+_invalidated_on_event: Set[str] = set()
+
+
+def _reset_in_child():
+    # The subscriptions of the event bus are not inherited by a child process (see EventBus)
+    _invalidated_on_event.clear()
+
+
+os.register_at_fork(after_in_child=_reset_in_child)
+
+LATEST_ROW_CACHE_TTL = float(os.environ.get("LATEST_ROW_CACHE_TTL", 2))
+
+
+def retrieve_latest_row_cached(table: Table) -> Optional[Data]:
+    """
+    Get the latest row (with data) from a table, kept in memory for LATEST_ROW_CACHE_TTL seconds.
+    The entry is invalidated when a row is written to the table from the same process, and from any process when
+    an event bus is configured (see create_event_bus, e.g. for the API server, which runs in its own process).
+    The time to live bounds the staleness otherwise, as with the "memory" event bus, which only sees this process.
+    :param table: The table
+    :return: The latest row
+    """
+    if event_bus is not None and table.name not in _invalidated_on_event:
+        # Subscribed before the row is read, so that a row written meanwhile invalidates it
+        _invalidated_on_event.add(table.name)
+        event_bus.subscribe([table.name], invalidate_latest_row)
+
+    entry = _latest_rows.get(table.name)
+
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+
+    data = retrieve_latest_row(table)
+    if data is not None:
+        _latest_rows[table.name] = (time.monotonic() + LATEST_ROW_CACHE_TTL, data)
+
+    return data
+
+
+def invalidate_latest_row(table_name: str):
+    """
+    Invalidate the cached latest row of a table.
+    :param table_name: The name of the table
+    """
+    _latest_rows.pop(table_name, None)
+
+
 @data_result
-def retrieve_latest_row(table: Table, with_null: bool = False) -> Data:
+def retrieve_latest_row(table: Table, with_null: bool = False, connection: Connection = None) -> Data:
     """
     Get the latest row from a table.
     :param table: The table
     :param with_null: Whether to include rows with null data
+    :param connection: The connection to reuse, a new one is opened if None
     :return: The latest row
     """
-    with engine.connect() as connection:
+    with connect(connection) as connection:
         return connection.execute(
             base_query(table, with_null=with_null)
             .order_by(table.c.date.desc())
@@ -86,21 +219,22 @@ def retrieve_latest_row(table: Table, with_null: bool = False) -> Data:
 
 
 @data_result
-def retrieve_first_row(table: Table) -> Data:
+def retrieve_first_row(table: Table, connection: Connection = None) -> Data:
     """
     Get the first row from a table.
     :param table: The table
+    :param connection: The connection to reuse, a new one is opened if None
     :return: The first row
     """
-    with engine.connect() as connection:
+    with connect(connection) as connection:
         return connection.execute(
             base_query(table).order_by(table.c.date.asc()).limit(1)
         ).fetchone()
 
 
 @data_result
-def retrieve_after_datetime(table: Table, date: datetime, limit: int) -> List[Data]:
-    with engine.connect() as connection:
+def retrieve_after_datetime(table: Table, date: datetime, limit: int, connection: Connection = None) -> List[Data]:
+    with connect(connection) as connection:
         return connection.execute(
             base_query(table)
             .where(table.c.date > date)
@@ -110,8 +244,8 @@ def retrieve_after_datetime(table: Table, date: datetime, limit: int) -> List[Da
 
 
 @data_result
-def retrieve_before_datetime(table: Table, date: datetime, limit: int) -> List[Data]:
-    with engine.connect() as connection:
+def retrieve_before_datetime(table: Table, date: datetime, limit: int, connection: Connection = None) -> List[Data]:
+    with connect(connection) as connection:
         return connection.execute(
             base_query(table)
             .where(table.c.date < date)
@@ -122,9 +256,9 @@ def retrieve_before_datetime(table: Table, date: datetime, limit: int) -> List[D
 
 @data_result
 def retrieve_between_datetime(
-    table: Table, start_date: datetime, end_date: datetime, limit: int
+    table: Table, start_date: datetime, end_date: datetime, limit: int, connection: Connection = None
 ) -> List[Data]:
-    with engine.connect() as connection:
+    with connect(connection) as connection:
         if start_date is None:
             return connection.execute(
                 base_query(table)
@@ -149,11 +283,50 @@ def retrieve_between_datetime(
             ).fetchall()
 
 
+@data_result
+def retrieve_page(
+    table: Table,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    limit: int,
+    after: Optional[Tuple[datetime, int]] = None,
+    connection: Connection = None,
+) -> List[Data]:
+    """
+    Get a page of the rows between two dates, ordered by date and id.
+    Pages are chained through the (date, id) of the last row of the previous page, so rows sharing
+    the same date are neither skipped nor repeated.
+    :param table: The table
+    :param start_date: The start date (inclusive), None for no lower bound
+    :param end_date: The end date (exclusive), None for no upper bound
+    :param limit: The maximum number of rows of the page
+    :param after: The (date, id) of the last row of the previous page, None for the first page
+    :param connection: The connection to reuse, a new one is opened if None
+    :return: The rows of the page
+    """
+    query = base_query(table)
+
+    if start_date is not None:
+        query = query.where(table.c.date >= start_date)
+    if end_date is not None:
+        query = query.where(table.c.date < end_date)
+    if after is not None:
+        after_date, after_id = after
+        query = query.where(
+            or_(table.c.date > after_date, and_(table.c.date == after_date, table.c.id > after_id))
+        )
+
+    with connect(connection) as connection:
+        return connection.execute(
+            query.order_by(table.c.date.asc(), table.c.id.asc()).limit(limit)
+        ).fetchall()
+
+
 @data_result
 def retrieve_latest_rows_before_datetime(
-    table: Table, date: datetime, limit: int
+    table: Table, date: datetime, limit: int, connection: Connection = None
 ) -> List[Data]:
-    with engine.connect() as connection:
+    with connect(connection) as connection:
         return connection.execute(
             base_query(table)
             .where(table.c.date < date)
@@ -164,9 +337,9 @@ def retrieve_latest_rows_before_datetime(
 
 @data_result
 def retrieve_latest_row_before_datetime(
-    table: Table, date: datetime, with_null: bool = False
+    table: Table, date: datetime, with_null: bool = False, connection: Connection = None
 ) -> Optional[Data]:
-    with engine.connect() as connection:
+    with connect(connection) as connection:
         return connection.execute(
             base_query(table, with_null=with_null)
             .where(table.c.date < date)
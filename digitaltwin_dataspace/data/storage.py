@@ -1,7 +1,53 @@
 import abc
+import hashlib
+import logging
+import mmap
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional, List, Literal, Set, Tuple
 
+import requests
+from azure.core.pipeline.transport import RequestsTransport
 from azure.storage.blob import BlobServiceClient
+from requests.adapters import HTTPAdapter
+
+from .. import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+# Number of files read or written concurrently by read_many and write_many, shared by the whole process
+STORAGE_IO_WORKERS = int(os.environ.get("STORAGE_IO_WORKERS", 16))
+
+# Schedule of the sweeps of the storage cache, bounding the files cached by all the processes (see sweep)
+STORAGE_CACHE_SWEEP_SCHEDULE = os.environ.get("STORAGE_CACHE_SWEEP_SCHEDULE", "1m")
+
+_executor_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """
+    Get the thread pool running the concurrent reads and writes of the storage, shared by the process.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=STORAGE_IO_WORKERS, thread_name_prefix="storage")
+        return _executor
+
+
+def _reset_executor_in_child():
+    # The threads of the pool do not survive a fork
+    global _executor
+    _executor = None
+
+
+os.register_at_fork(after_in_child=_reset_executor_in_child)
 
 
 class StorageManager(abc.ABC):
@@ -14,11 +60,128 @@ class StorageManager(abc.ABC):
     @abc.abstractmethod
     def delete(self, file_name: str): ...
 
+    def flush(self):
+        """
+        Make the files written by this process durable, for the storages deferring it (see FileStorageManager).
+        """
+        pass
+
+    def read_many(self, file_names: List[str]) -> List[bytes]:
+        """
+        Read many files concurrently, on the thread pool shared by the process.
+
+        :param file_names: Names of the files to read from.
+        :return: Data read from the files, in the same order.
+        """
+        if len(file_names) <= 1:
+            return [self.read(file_name) for file_name in file_names]
+        return list(get_io_executor().map(self.read, file_names))
+
+    def write_many(self, files: List[Tuple[str, bytes]]) -> List[str]:
+        """
+        Write many files concurrently, on the thread pool shared by the process.
+        If any write fails, the files already written are deleted before the error is raised.
+
+        :param files: Names of the files to create or update, and the data to write to them.
+        :return: Names (urls or paths) of the written files, in the same order.
+        """
+        if len(files) <= 1:
+            return [self.write(file_name, data) for file_name, data in files]
+
+        futures = [get_io_executor().submit(self.write, file_name, data) for file_name, data in files]
+
+        written, errors = [], []
+        for future in futures:
+            try:
+                written.append(future.result())
+            except Exception as e:
+                errors.append(e)
+
+        if errors:
+            for file_name in written:
+                try:
+                    self.delete(file_name)
+                except Exception as e:
+                    logger.warning(f"Failed to delete orphan file {file_name}: {e}")
+            raise errors[0]
+
+        return written
+
+    def read_view(self, file_name: str) -> memoryview:
+        """
+        Read a stored file as a memory view, memory-mapped by the storages keeping the file on the local file system,
+        so that large files can be decompressed without being copied in memory first.
+
+        :param file_name: Name of the file to read from.
+        :return: View on the data of the file.
+        """
+        return memoryview(self.read(file_name))
+
+    def size(self, file_name: str) -> int:
+        """
+        Get the size of a stored file, in bytes.
+
+        :param file_name: Name of the file.
+        :return: Size of the file.
+        """
+        return len(self.read(file_name))
+
+    def stream(
+            self, file_name: str, start: int = 0, end: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[bytes]:
+        """
+        Read a stored file chunk by chunk, without loading it entirely in memory.
+
+        :param file_name: Name of the file to read from.
+        :param start: Offset of the first byte to read.
+        :param end: Offset of the last byte to read (inclusive), None to read until the end of the file.
+        :param chunk_size: Maximum size of the yielded chunks.
+        :return: Iterator over the chunks of the file.
+        """
+        data = self.read(file_name)
+        end = len(data) - 1 if end is None else end
+        for offset in range(start, end + 1, chunk_size):
+            yield data[offset:min(offset + chunk_size, end + 1)]
+
+    def local_path(self, file_name: str) -> Optional[str]:
+        """
+        Get the path of a stored file on the local file system, allowing it to be served without copy.
+
+        :param file_name: Name of the file.
+        :return: Path of the file, None if the file is not stored on the local file system.
+        """
+        return None
+
+
+def _stream_file(path: str, start: int, end: Optional[int], chunk_size: int) -> Iterator[bytes]:
+    with open(path, "rb") as file:
+        file.seek(start)
+        remaining = None if end is None else end - start + 1
+        while remaining is None or remaining > 0:
+            chunk = file.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def _map_file(path: str) -> memoryview:
+    with open(path, "rb") as file:
+        # The view keeps the mapping open, the file can be closed (and even deleted) meanwhile
+        return memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
 
 class AzureBlobManager(StorageManager):
     def __init__(self, connection_string, container_name):
+        # A single pipeline for all the blobs, with a connection pool large enough for the concurrent reads and writes
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=STORAGE_IO_WORKERS)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
         self.blob_service_client = BlobServiceClient.from_connection_string(
-            connection_string
+            connection_string, transport=RequestsTransport(session=session, session_owner=False)
         )
         self.container_client = self.blob_service_client.get_container_client(
             container_name
@@ -55,6 +218,37 @@ class AzureBlobManager(StorageManager):
         blob_data = blob_client.download_blob().readall()
         return blob_data
 
+    def size(self, file_name: str) -> int:
+        """
+        Get the size of a blob in Azure Blob Storage.
+
+        :param file_name: Name of the blob.
+        :return: Size of the blob, in bytes.
+        """
+        blob_client = self.container_client.get_blob_client(
+            file_name.split(self.container_client.container_name + "/")[1]
+        )
+        return blob_client.get_blob_properties().size
+
+    def stream(
+            self, file_name: str, start: int = 0, end: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[bytes]:
+        """
+        Read a blob from Azure Blob Storage chunk by chunk.
+
+        :param file_name: Name of the blob to read from.
+        :param start: Offset of the first byte to read.
+        :param end: Offset of the last byte to read (inclusive), None to read until the end of the blob.
+        :param chunk_size: Ignored, the chunk size is the one configured on the client.
+        :return: Iterator over the chunks of the blob.
+        """
+        blob_client = self.container_client.get_blob_client(
+            file_name.split(self.container_client.container_name + "/")[1]
+        )
+        length = None if end is None else end - start + 1
+        downloader = blob_client.download_blob(offset=start, length=length)
+        yield from downloader.chunks()
+
     def delete(self, file_name: str):
         """
         Delete a blob in Azure Blob Storage.
@@ -67,27 +261,141 @@ class AzureBlobManager(StorageManager):
         blob_client.delete_blob()
 
 
+FsyncPolicy = Literal["none", "always", "batch"]
+
+
+def _fsync_path(path: str):
+    # Directories can only be opened read-only, which is enough to fsync them on POSIX systems
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
 class FileStorageManager(StorageManager):
-    def __init__(self, directory):
+    """
+    Stores the files in a directory of the local file system, the name of a stored file is its path.
+
+    Files are written atomically: to a temporary file renamed once complete, so readers never see a partial file.
+    Their durability depends on the fsync policy: "none" leaves it to the operating system, "always" syncs each
+    file (and its directory) before the write returns, "batch" syncs the files written in the last fsync_interval
+    seconds at once, from a background thread, bounding the writes lost on a power failure to that interval.
+    Processes exiting without waiting for the thread, such as those of the process execution engine, call flush
+    before exiting.
+    """
+
+    def __init__(self, directory, fsync: FsyncPolicy = "none", fsync_interval: float = 1.0):
+        """
+        :param directory: The directory of the files
+        :param fsync: The fsync policy, "none", "always" or "batch"
+        :param fsync_interval: The interval between the syncs of the "batch" policy, in seconds
+        """
+        if fsync not in ("none", "always", "batch"):
+            raise ValueError(f"Invalid fsync policy: {fsync}")
+
         self.directory = directory
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+
+        # Directories known to exist, to avoid a makedirs call per write
+        self._directories: Set[str] = set()
+        self._pending_lock = threading.Lock()
+        self._pending: Set[str] = set()
+        self._flusher: Optional[threading.Thread] = None
+
+        os.register_at_fork(after_in_child=self._reset_in_child)
+
+    def _reset_in_child(self):
+        # The flusher does not survive a fork, and may have held the lock when the process was forked
+        self._pending_lock = threading.Lock()
+        self._flusher = None
+
+    def _write_file(self, file_path: str, data: bytes):
+        directory = os.path.dirname(file_path)
+        if os.path.abspath(directory) not in self._directories:
+            os.makedirs(directory, exist_ok=True)
+            self._directories.add(os.path.abspath(directory))
+
+        temporary_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporary_path, "wb") as file:
+                file.write(data)
+                if self.fsync == "always":
+                    file.flush()
+                    os.fsync(file.fileno())
+            os.replace(temporary_path, file_path)
+        except BaseException:
+            # The file is left as it was, without the partial temporary file
+            try:
+                os.remove(temporary_path)
+            except OSError:
+                pass
+            raise
+
+        if self.fsync == "always":
+            _fsync_path(directory)
+        elif self.fsync == "batch":
+            self._schedule_sync(file_path)
 
     def write(self, file_name: str, data: bytes) -> str:
         """
-        Write data to a file in the local file system.
+        Write data to a file in the local file system, atomically.
 
         :param file_name: Name of the file to create or update.
         :param data: Data to write to the file. Can be a string or bytes.
 
         :return: Path of the file.
         """
+        if data is None:
+            data = b""
+
         file_path = os.path.join(self.directory, file_name)
-        # create directory if it does not exist
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, "wb") as file:
-            file.write(data)
+        try:
+            self._write_file(file_path, data)
+        except FileNotFoundError:
+            # The directory was removed meanwhile (see delete), by this process or another one
+            self._directories.discard(os.path.abspath(os.path.dirname(file_path)))
+            self._write_file(file_path, data)
 
         return file_path
 
+    def _schedule_sync(self, file_path: str):
+        with self._pending_lock:
+            self._pending.add(file_path)
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._flush_periodically, name="fsync", daemon=True)
+                self._flusher.start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.fsync_interval)
+            self.flush()
+
+    def flush(self):
+        """
+        Sync the files written since the last sync, and their directories (with the "batch" fsync policy).
+        """
+        with self._pending_lock:
+            pending, self._pending = self._pending, set()
+
+        if not pending:
+            return
+
+        started_at = time.monotonic()
+        for path in pending | {os.path.dirname(path) for path in pending}:
+            try:
+                _fsync_path(path)
+            except FileNotFoundError:
+                # Deleted meanwhile
+                pass
+            except OSError as e:
+                logger.warning(f"Failed to sync {path}: {e}")
+
+        metrics.increment("file_storage.fsync_batches")
+        metrics.observe("file_storage.fsync_batch_files", len(pending))
+        metrics.observe("file_storage.fsync_batch_seconds", time.monotonic() - started_at)
+
     def read(self, file_name: str) -> bytes:
         """
         Read data from a file in the local file system.
@@ -98,14 +406,299 @@ class FileStorageManager(StorageManager):
         with open(file_name, "rb") as file:
             return file.read()
 
+    def read_view(self, file_name: str) -> memoryview:
+        """
+        Read a file from the local file system without copying it, as a view on the memory-mapped file.
+        The file is unmapped once the view (and every slice of it) is released.
+
+        :param file_name: Name of the file to read from.
+        :return: View on the data of the file.
+        """
+        if os.path.getsize(file_name) == 0:
+            # Empty files cannot be mapped
+            return memoryview(b"")
+        return _map_file(file_name)
+
+    def size(self, file_name: str) -> int:
+        """
+        Get the size of a file in the local file system.
+
+        :param file_name: Name of the file.
+        :return: Size of the file, in bytes.
+        """
+        return os.path.getsize(file_name)
+
+    def stream(
+            self, file_name: str, start: int = 0, end: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[bytes]:
+        """
+        Read a file from the local file system chunk by chunk.
+
+        :param file_name: Name of the file to read from.
+        :param start: Offset of the first byte to read.
+        :param end: Offset of the last byte to read (inclusive), None to read until the end of the file.
+        :param chunk_size: Maximum size of the yielded chunks.
+        :return: Iterator over the chunks of the file.
+        """
+        return _stream_file(file_name, start, end, chunk_size)
+
+    def local_path(self, file_name: str) -> Optional[str]:
+        """
+        Files are stored on the local file system, their name is their path.
+
+        :param file_name: Name of the file.
+        :return: Path of the file.
+        """
+        return file_name
+
     def delete(self, file_name: str):
         """
-        Delete a file in the local file system.
+        Delete a file in the local file system, and the date partitions it leaves empty.
 
         :param file_name: Name of the file to delete.
         """
         os.remove(file_name)
 
+        root = os.path.abspath(self.directory)
+        directory = os.path.dirname(os.path.abspath(file_name))
+        while directory.startswith(root + os.sep):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                # Not empty, or already removed
+                break
+            self._directories.discard(directory)
+            directory = os.path.dirname(directory)
+
+
+class CachingStorageManager(StorageManager):
+    """
+    Wraps a storage with a local, size-bounded, least recently used cache of the files read and written.
+
+    Files are never modified once written (their names embed their component, date and hash), so cached files
+    never go stale. The cache lives on disk and survives restarts: its index is rebuilt from the cached files,
+    ordered by their modification time, which is updated on every hit. Files are written to the cache atomically
+    (written to a temporary file, then renamed), and large files are memory-mapped by read_view.
+
+    Each process keeps its own index of the directory, a file evicted by another process is treated as a miss.
+    The processes do not see the files cached by the others, so the directory can grow past max_bytes: sweep
+    rebuilds the index from the directory, evicting the least recently used files of every process, and is run
+    on the STORAGE_CACHE_SWEEP_SCHEDULE (default "1m") by the main process (see run_components).
+    """
+
+    def __init__(self, storage: StorageManager, directory: str, max_bytes: int, mmap_threshold: int = 1024 * 1024):
+        """
+        :param storage: The storage to cache
+        :param directory: The directory of the cached files
+        :param max_bytes: Maximum total size of the cached files
+        :param mmap_threshold: Minimum size of the cached files memory-mapped by read_view
+        """
+        self.storage = storage
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.mmap_threshold = mmap_threshold
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._size = 0
+
+        self._load()
+
+    def _load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._scan(remove_temporary=True)
+
+    def _scan(self, remove_temporary: bool = False):
+        # Replaces the index by the files of the directory, ordered by their last use
+        entries = []
+        for directory, _, file_names in os.walk(self.directory):
+            for file_name in file_names:
+                path = os.path.join(directory, file_name)
+                if ".tmp" in file_name:
+                    if remove_temporary:
+                        # Left behind by a write interrupted by a crash
+                        os.remove(path)
+                    continue
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    # Evicted by another process meanwhile
+                    continue
+                entries.append((stat.st_mtime, file_name, stat.st_size))
+
+        with self._lock:
+            self._entries = OrderedDict((key, size) for _, key, size in sorted(entries))
+            self._size = sum(size for _, _, size in entries)
+
+        self._evict()
+
+    def sweep(self):
+        """
+        Measure the cached files of every process and evict the least recently used ones until they fit in
+        max_bytes again.
+        """
+        self._scan()
+        metrics.increment("storage_cache.sweeps")
+
+    def _key(self, file_name: str) -> str:
+        return hashlib.sha1(file_name.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _hit(self, file_name: str) -> Optional[str]:
+        """
+        Get the path of a cached file, marking it as the most recently used.
+        :return: The path, None if the file is not cached
+        """
+        key = self._key(file_name)
+        with self._lock:
+            if key not in self._entries:
+                metrics.increment("storage_cache.misses")
+                return None
+            self._entries.move_to_end(key)
+
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted by another process
+            self._forget(key)
+            metrics.increment("storage_cache.misses")
+            return None
+
+        metrics.increment("storage_cache.hits")
+        return path
+
+    def _forget(self, key: str):
+        with self._lock:
+            size = self._entries.pop(key, None)
+            if size is not None:
+                self._size -= size
+
+    def _put(self, file_name: str, data: bytes):
+        if data is None or len(data) > self.max_bytes:
+            return
+
+        key = self._key(file_name)
+        path = self._path(key)
+        temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temporary_path, "wb") as file:
+                file.write(data)
+            os.replace(temporary_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to cache {file_name}: {e}")
+            return
+
+        with self._lock:
+            self._size += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+
+        self._evict()
+
+    def _evict(self):
+        evicted = []
+        with self._lock:
+            while self._size > self.max_bytes:
+                key, size = self._entries.popitem(last=False)
+                self._size -= size
+                evicted.append((key, size))
+            metrics.set_gauge("storage_cache.bytes", self._size)
+
+        for key, size in evicted:
+            metrics.increment("storage_cache.evictions")
+            metrics.increment("storage_cache.evicted_bytes", size)
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def write(self, file_name: str, data: bytes) -> str:
+        """
+        Write a file to the storage, and to the cache.
+
+        :return: The name of the written file in the storage (url or path).
+        """
+        url = self.storage.write(file_name, data)
+        self._put(url, data if data is not None else b"")
+        return url
+
+    def read(self, file_name: str) -> bytes:
+        """
+        Read a file from the cache, or from the storage if it is not cached (it is then cached).
+        """
+        path = self._hit(file_name)
+        if path is not None:
+            try:
+                with open(path, "rb") as file:
+                    return file.read()
+            except FileNotFoundError:
+                self._forget(self._key(file_name))
+
+        data = self.storage.read(file_name)
+        self._put(file_name, data)
+        return data
+
+    def read_view(self, file_name: str) -> memoryview:
+        """
+        Read a file as a memory view, large cached files are memory-mapped.
+        """
+        key = self._key(file_name)
+        with self._lock:
+            size = self._entries.get(key)
+
+        if size is not None and size >= self.mmap_threshold:
+            path = self._hit(file_name)
+            if path is not None:
+                try:
+                    return _map_file(path)
+                except (FileNotFoundError, ValueError):
+                    self._forget(key)
+
+        return memoryview(self.read(file_name))
+
+    def size(self, file_name: str) -> int:
+        key = self._key(file_name)
+        with self._lock:
+            size = self._entries.get(key)
+        return size if size is not None else self.storage.size(file_name)
+
+    def stream(
+            self, file_name: str, start: int = 0, end: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[bytes]:
+        """
+        Stream a file from the cache, or from the storage if it is not cached (it is then not cached, only
+        complete reads are).
+        """
+        path = self._hit(file_name)
+        if path is not None:
+            return _stream_file(path, start, end, chunk_size)
+        return self.storage.stream(file_name, start, end, chunk_size)
+
+    def local_path(self, file_name: str) -> Optional[str]:
+        """
+        The path of the cached file, or the local path of the file in the storage if it is not cached.
+        """
+        return self._hit(file_name) or self.storage.local_path(file_name)
+
+    def flush(self):
+        self.storage.flush()
+
+    def delete(self, file_name: str):
+        """
+        Delete a file from the storage, and from the cache.
+        """
+        self.storage.delete(file_name)
+
+        key = self._key(file_name)
+        self._forget(key)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
 
 if "AZURE_STORAGE_CONNECTION_STRING" in os.environ:
     storage_manager = AzureBlobManager(
@@ -115,4 +708,16 @@ if "AZURE_STORAGE_CONNECTION_STRING" in os.environ:
 
 
 else:
-    storage_manager = FileStorageManager(os.environ["FILE_STORAGE_DIRECTORY"])
+    storage_manager = FileStorageManager(
+        os.environ["FILE_STORAGE_DIRECTORY"],
+        fsync=os.environ.get("FILE_STORAGE_FSYNC", "none"),
+        fsync_interval=float(os.environ.get("FILE_STORAGE_FSYNC_INTERVAL", 1.0)),
+    )
+
+if os.environ.get("STORAGE_CACHE_DIRECTORY"):
+    storage_manager = CachingStorageManager(
+        storage_manager,
+        os.environ["STORAGE_CACHE_DIRECTORY"],
+        max_bytes=int(os.environ.get("STORAGE_CACHE_MAX_BYTES", 1024 * 1024 * 1024)),
+        mmap_threshold=int(os.environ.get("STORAGE_CACHE_MMAP_THRESHOLD", 1024 * 1024)),
+    )
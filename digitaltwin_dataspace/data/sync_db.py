@@ -1,9 +1,9 @@
 from functools import lru_cache, partial
 from typing import Dict, List, Callable
 
-from sqlalchemy import Table, MetaData, inspect
-from sqlalchemy import text
-from sqlalchemy.exc import OperationalError
+from sqlalchemy import Table, MetaData, inspect, select, update, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.orm import aliased
 
 from .engine import engine
 from .table import load_simple_table_from_configuration
@@ -16,6 +16,8 @@ def get_or_create_table_with_provider(
 ) -> Table:
     """
     Low-level function to get or create a table using a column provider.
+    When an existing table is upgraded (missing columns or indexes created), the copies written before the
+    copies were denormalized are backfilled, see denormalize_copies.
 
     :param table_provider:
     :param table_name: Table name
@@ -32,11 +34,95 @@ def get_or_create_table_with_provider(
         except OperationalError:
             pass
     else:
+        expected_table = table_provider(MetaData())
+        upgraded = create_missing_columns(expected_table)
         table = Table(table_name, metadata, autoload_with=engine)
+        upgraded = create_missing_indexes(expected_table) or upgraded
+        if upgraded and "copy_id" in table.c:
+            denormalize_copies(table)
 
     return table
 
 
+def create_missing_columns(table: Table) -> bool:
+    """
+    Add the columns of the given table definition that do not exist in the database yet.
+    The added columns must be nullable, as existing rows have no value for them.
+
+    :param table: The table definition, holding the expected columns
+    :return: Whether columns were added
+    """
+    existing_columns = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    preparer = engine.dialect.identifier_preparer
+    created = False
+
+    with engine.connect() as connection:
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            try:
+                connection.execute(text(
+                    f"ALTER TABLE {preparer.format_table(table)} "
+                    f"ADD COLUMN {preparer.format_column(column)} {column.type.compile(dialect=engine.dialect)}"
+                ))
+                connection.commit()
+                created = True
+            except (OperationalError, ProgrammingError):
+                # Added concurrently by another process
+                connection.rollback()
+
+    return created
+
+
+def create_missing_indexes(table: Table) -> bool:
+    """
+    Create the indexes of the given table definition that do not exist in the database yet.
+    An index is considered to exist if an index on the same columns exists, whatever its name.
+
+    :param table: The table definition, holding the expected indexes
+    :return: Whether indexes were created
+    """
+    existing_columns = {
+        tuple(index["column_names"]) for index in inspect(engine).get_indexes(table.name)
+    }
+    created = False
+
+    for index in table.indexes:
+        if tuple(column.name for column in index.columns) in existing_columns:
+            continue
+        try:
+            index.create(engine, checkfirst=True)
+            created = True
+        except (OperationalError, ProgrammingError):
+            # Created concurrently by another process
+            pass
+
+    return created
+
+
+def denormalize_copies(table: Table):
+    """
+    Copy the data and hash of the referenced rows into the rows referencing them through their copy_id
+    but storing no data themselves (rows written before the copies were denormalized).
+
+    :param table: The table to update
+    """
+    original = aliased(table)
+
+    with engine.connect() as connection:
+        connection.execute(
+            update(table)
+            .where(table.c.copy_id.isnot(None))
+            .where(table.c.data.is_(None))
+            .values(
+                data=select(original.c.data).where(original.c.id == table.c.copy_id).scalar_subquery(),
+                hash=select(original.c.hash).where(original.c.id == table.c.copy_id).scalar_subquery(),
+                encoding=select(original.c.encoding).where(original.c.id == table.c.copy_id).scalar_subquery(),
+            )
+        )
+        connection.commit()
+
+
 @lru_cache
 def get_or_create_standard_component_table(table_name: str) -> Table:
     """
@@ -63,22 +149,17 @@ def sync_db_from_configuration(
     metadata_obj = MetaData()
 
     tables = {}
-    indexes = []
     for component in components:
         config = component.get_configuration()
         tables[config.name] = load_simple_table_from_configuration(
             config.name, metadata_obj
         )
-        # create index on
-        indexes.append(
-            f"CREATE INDEX IF NOT EXISTS {component.name}_date_index ON {name} (date)"
-        )
 
     metadata_obj.create_all(engine, checkfirst=True)
 
-    with engine.connect() as connection:
-        for index in indexes:
-            connection.execute(text(index))
-        connection.commit()
+    for table in tables.values():
+        create_missing_columns(table)
+        create_missing_indexes(table)
+        denormalize_copies(table)
 
     return tables
@@ -13,9 +13,12 @@ def load_simple_table_from_configuration(table_name: str, metadata_obj: MetaData
     """
     Load/Create a simple table from a component configuration.
 
-    A simple table is a table that contains an id, a date, a data column, a type column, a hash column, and a copy_id column.
+    A simple table is a table that contains an id, a date, a data column, a type column, a hash column, a copy_id column,
+    an encoding column recording the compression of the stored data (if any), and a keyframe_id column referencing
+    the row holding the full data of the rows stored as a delta.
     The copy_id column is used to prevent storing the same data multiple times, instead, it stores the id of the row that contains the same data,
-    leveraging the unique constraint on the hash column.
+    leveraging the index on the hash column. The data and hash of the original row are copied to the referencing row, so that reads do not
+    need to resolve the copy_id.
 
     @param table_name: The table name
     @param metadata_obj: The metadata object
@@ -30,5 +33,10 @@ def load_simple_table_from_configuration(table_name: str, metadata_obj: MetaData
         Column("type", VARCHAR(24), nullable=True),
         Column("hash", VARCHAR(32), nullable=True),
         Column("copy_id", INTEGER, nullable=True),
-        Index(f"${table_name}_date_index", "date"),
+        Column("encoding", VARCHAR(32), nullable=True),
+        Column("keyframe_id", INTEGER, nullable=True),
+        Index(f"{table_name}_date_index", "date"),
+        Index(f"{table_name}_hash_index", "hash"),
+        Index(f"{table_name}_copy_id_index", "copy_id"),
+        Index(f"{table_name}_keyframe_id_index", "keyframe_id"),
     )
@@ -1,15 +1,166 @@
 import hashlib
-import json
+import logging
 from datetime import datetime
+from functools import partial
+from typing import Optional, List, Tuple, Any
 
-from sqlalchemy import Table
+from sqlalchemy import Table, select
+from sqlalchemy.engine import Connection
 
-from .engine import engine
+from .columnar import StorageFormat, encode_result
+from .compression import Compression, compress
+from .delta import canonical, delta_encoding, encode_delta, is_delta
+from .engine import connect
+from .events import publish_new_row
+from .retrieve import invalidate_latest_row, read_payload
 from .storage import storage_manager
+from .. import metrics
+from ..serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+
+def find_original_row(connection, table: Table, md5_digest: str):
+    """
+    Find the row that originally stored the data with the given hash.
+    :param connection: The connection to use
+    :param table: The table to search in
+    :param md5_digest: The hash of the data
+    :return: The id, data (url), encoding and keyframe id of the original row, None if the data was never stored
+    """
+    return connection.execute(
+        select(table.c.id, table.c.data, table.c.encoding, table.c.keyframe_id)
+        .where(table.c.hash == md5_digest)
+        .where(table.c.copy_id.is_(None))
+        .order_by(table.c.id.desc())
+        .limit(1)
+    ).fetchone()
+
+
+def to_bytes(data) -> Optional[bytes]:
+    """
+    Convert a result to the bytes to store, strings are encoded in UTF-8 and dicts and lists serialized to JSON
+    with the configured serializer (see serialization). The bytes are hashed for the deduplication, see dumps.
+    :param data: The result
+    :return: The bytes to store
+    """
+    if isinstance(data, str):
+        return data.encode("utf-8")
+    elif isinstance(data, dict) or isinstance(data, list):
+        return dumps(data)
+    return data
+
+
+def storage_key(name: str, date: datetime, md5_digest: Optional[str] = None) -> str:
+    """
+    Get the key under which the data of a component at a given date is stored, partitioned by date
+    (e.g. name/2025/01/31/12/30-15-000000-1a2b3c4d) so that no directory holds more than an hour of results.
+    The key has a microsecond resolution and ends with the start of the hash of the data, so results written
+    within the same second do not overwrite each other. Rows store the url of their data, so the data written
+    under the previous flat layout (name/2025-01-31_12-30-15) stays readable.
+    :param name: The name of the component
+    :param date: The date of the data
+    :param md5_digest: The hash of the data
+    :return: The key
+    """
+    key = f"{name}/{date.strftime('%Y/%m/%d/%H/%M-%S-%f')}"
+    if md5_digest is not None:
+        key += f"-{md5_digest[:8]}"
+    return key
+
+
+def find_keyframe(connection, table: Table, interval: int):
+    """
+    Find the keyframe against which the next row of a table is stored as a delta.
+    :param connection: The connection to use
+    :param table: The table to search in
+    :param interval: The maximum number of rows between two keyframes
+    :return: The id, data (url), hash and encoding of the last row stored in full among the last interval - 1 rows,
+        None if a keyframe must be stored
+    """
+    rows = connection.execute(
+        select(table.c.id, table.c.data, table.c.hash, table.c.encoding)
+        .where(table.c.hash.isnot(None))
+        .order_by(table.c.date.desc(), table.c.id.desc())
+        .limit(interval - 1)
+    ).fetchall()
+
+    return next((row for row in rows if not is_delta(row.encoding)), None)
+
+
+def _encode_delta(
+        connection: Connection, table: Table, data_bytes: bytes, interval: int
+) -> Tuple[bytes, Optional[int]]:
+    """
+    Encode the data as a delta against the current keyframe of the table, if any.
+    :return: The delta (or the data if it must be stored in full), and the id of the keyframe (None if stored in full)
+    """
+    keyframe = find_keyframe(connection, table, interval) if interval > 1 else None
+    if keyframe is None:
+        return data_bytes, None
+
+    delta = encode_delta(
+        data_bytes, keyframe.id, keyframe.data, keyframe.hash, keyframe.encoding,
+        partial(read_payload, keyframe.data, keyframe.hash, keyframe.encoding),
+    )
+    if delta is None:
+        return data_bytes, None
+
+    metrics.increment("write.delta_bytes_saved", len(data_bytes) - len(delta))
+    return delta, keyframe.id
+
+
+def _prepare_row(
+        connection: Connection, name: str, content_type: str, table: Table, data_bytes: Optional[bytes],
+        date: datetime, deduplicate: bool, compression: Optional[Compression],
+        delta_keyframe_interval: Optional[int] = None,
+) -> Tuple[dict, Optional[bytes]]:
+    """
+    Prepare the row storing the given data.
+    :return: The values of the row, and the bytes to upload (None if nothing must be uploaded, the data
+        column of the row must then be set to the url of the uploaded bytes)
+    """
+    if delta_keyframe_interval and data_bytes is not None:
+        # Hashed once canonical, so that the payload reconstructed from a delta matches its hash
+        data_bytes = canonical(data_bytes) or data_bytes
+
+    md5_digest = None if data_bytes is None else hashlib.md5(data_bytes).hexdigest()
+
+    original = None
+    if deduplicate and md5_digest is not None:
+        original = find_original_row(connection, table, md5_digest)
+
+    if original is not None:
+        # Same data already stored, only reference it (the url and hash are copied to avoid a join when reading)
+        metrics.increment("write.uploads_skipped")
+        metrics.increment("write.bytes_saved", len(data_bytes))
+        return dict(
+            date=date, data=original.data, hash=md5_digest, type=content_type, copy_id=original.id,
+            encoding=original.encoding, keyframe_id=original.keyframe_id
+        ), None
+
+    keyframe_id = None
+    if delta_keyframe_interval and data_bytes is not None:
+        data_bytes, keyframe_id = _encode_delta(connection, table, data_bytes, delta_keyframe_interval)
+
+    stored_bytes, encoding = compress(data_bytes, compression, name)
+    metrics.increment("write.uploads")
+    if encoding is not None:
+        metrics.increment("write.bytes_compressed_saved", len(data_bytes) - len(stored_bytes))
+    if keyframe_id is not None:
+        encoding = delta_encoding(encoding)
+
+    # Same keys as a copy, the rows of write_results are inserted with a single executemany
+    return dict(
+        date=date, data=None, hash=md5_digest, type=content_type, copy_id=None, encoding=encoding,
+        keyframe_id=keyframe_id
+    ), stored_bytes
 
 
 def write_result(
-        name: str, content_type: str, table: Table, data, date: datetime
+        name: str, content_type: str, table: Table, data, date: datetime, deduplicate: bool = False,
+        compression: Optional[Compression] = None, connection: Connection = None,
+        storage_format: Optional[StorageFormat] = None, delta_keyframe_interval: Optional[int] = None,
 ):
     """
     Write the result of a harvester to the database.
@@ -19,34 +170,117 @@ def write_result(
     :param table:  The table to write to
     :param data:  The data to write
     :param date:  The date of the data
+    :param deduplicate:  If True and a row with the same hash already exists, the data is not uploaded
+        again, instead the new row references the original row through its copy_id
+    :param compression:  The compression of the stored data ("zstd" or "gzip"), None to store it as is.
+        The hash is always computed on the uncompressed data
+    :param connection:  The connection to reuse, the caller is then responsible for committing and for
+        publishing the new row event. If None, a new connection is opened and committed
+    :param storage_format:  The format of the stored data, "parquet" to store JSON data as a Parquet file
+        (the content type of the row is then application/x-parquet, and the compression is ignored),
+        None to store it as is
+    :param delta_keyframe_interval:  If set, JSON data (a FeatureCollection or a list of records) is stored as its
+        differences with the last row stored in full (the keyframe), a row being stored in full at least every
+        delta_keyframe_interval rows. The data is reconstructed when read, see Data.data. Ignored with a storage
+        format
     """
+    data_bytes, content_type = encode_result(to_bytes(data), content_type, storage_format)
+    if storage_format is not None:
+        compression = None
+        delta_keyframe_interval = None
 
+    owns_connection = connection is None
 
-    if isinstance(data, str):
-        data_bytes = data.encode("utf-8")
-    elif isinstance(data, dict) or isinstance(data, list):
-        data_bytes = json.dumps(data).encode("utf-8")
-    else:
-        data_bytes = data
-
-    if data_bytes is None:
-        md5_digest = None
-    else:
-        md5_digest = hashlib.md5(data_bytes).hexdigest()
+    with connect(connection) as connection:
+        row, upload = _prepare_row(
+            connection, name, content_type, table, data_bytes, date, deduplicate, compression,
+            delta_keyframe_interval
+        )
 
-    with engine.connect() as connection:
+        if row["data"] is None:
+            # Upload data to storage
+            row["data"] = storage_manager.write(storage_key(name, date, row["hash"]), upload)
 
-        # Upload data to storage
-        url = storage_manager.write(
-            f"{name}/{date.strftime('%Y-%m-%d_%H-%M-%S')}",
-            data_bytes,
-        )
         # Insert data to database
-        connection.execute(
-            table.insert().values(
-                date=date, data=url, hash=md5_digest, type=content_type
+        connection.execute(table.insert().values(**row))
+
+        if owns_connection:
+            connection.commit()
+
+    invalidate_latest_row(table.name)
+    if owns_connection:
+        publish_new_row(table.name)
+
+
+def _delete_uploaded(urls: List[str]):
+    for url in urls:
+        try:
+            storage_manager.delete(url)
+        except Exception as e:
+            logger.warning(f"Failed to delete orphan blob {url}: {e}")
+
+
+def write_results(
+        name: str, content_type: str, table: Table, results: List[Tuple[Any, datetime]], deduplicate: bool = False,
+        compression: Optional[Compression] = None, connection: Connection = None,
+        storage_format: Optional[StorageFormat] = None,
+        delta_keyframe_interval: Optional[int] = None,
+):
+    """
+    Write many results at once: the data is uploaded concurrently (see StorageManager.write_many), and all the rows are inserted in a single
+    statement, in a single transaction. If anything fails, the uploaded data is deleted before the error is raised.
+    :param name:  The name of the folder to write to in the storage
+    :param content_type:  The content type of the data
+    :param table:  The table to write to
+    :param results:  The data to write, with their date
+    :param deduplicate:  See write_result, results are only deduplicated against already stored rows
+    :param compression:  See write_result
+    :param connection:  The connection to reuse, the caller is then responsible for committing (and for rolling
+        back if an error is raised) and for publishing the new row event. If None, a new connection is opened
+        and committed
+    :param storage_format:  See write_result
+    :param delta_keyframe_interval:  See write_result, the results are all stored against the keyframe found before
+        the write
+    """
+    if not results:
+        return
+
+    if storage_format is not None:
+        compression = None
+        delta_keyframe_interval = None
+
+    owns_connection = connection is None
+
+    with connect(connection) as connection:
+        rows = []
+        uploads = []
+        for data, date in results:
+            data_bytes, stored_content_type = encode_result(to_bytes(data), content_type, storage_format)
+            row, upload = _prepare_row(
+                connection, name, stored_content_type, table, data_bytes, date, deduplicate, compression,
+                delta_keyframe_interval
             )
-        )
+            rows.append(row)
+            if row["data"] is None:
+                uploads.append((row, storage_key(name, date, row["hash"]), upload))
+
+        uploaded = []
+        try:
+            # Deletes the uploaded data itself if one of the uploads fails
+            uploaded = storage_manager.write_many([(key, upload) for _, key, upload in uploads])
+            for (row, _, _), url in zip(uploads, uploaded):
+                row["data"] = url
+
+            connection.execute(table.insert(), rows)
 
-        connection.commit()
+            if owns_connection:
+                connection.commit()
+        except Exception:
+            if owns_connection:
+                connection.rollback()
+            _delete_uploaded(uploaded)
+            raise
 
+    invalidate_latest_row(table.name)
+    if owns_connection:
+        publish_new_row(table.name)
@@ -0,0 +1,267 @@
+import abc
+import asyncio
+import inspect
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Connection
+from typing import Callable, Deque, Dict, Literal
+
+from . import metrics
+from .data.storage import storage_manager
+
+logger = logging.getLogger(__name__)
+
+OverrunPolicy = Literal["skip", "coalesce", "queue"]
+
+# Maximum number of overrunning ticks of a job queued with the "queue" policy, the next ones are skipped
+EXECUTION_MAX_QUEUED = int(os.environ.get("EXECUTION_MAX_QUEUED", 10))
+
+# Upper bounds of the buckets of the histograms of the durations and lags of the ticks, in seconds
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+
+
+@dataclass
+class _JobState:
+    running: int = 0
+    queued: int = 0
+    # The functions of the overrunning ticks, run as the running ticks finish
+    pending: Deque[Callable] = field(default_factory=deque)
+
+
+class ExecutionEngine(abc.ABC):
+    """
+    Runs the scheduled jobs of the components.
+
+    Each job has a concurrency limit: when a tick is submitted while the limit is reached, the tick is either
+    skipped ("skip"), remembered and run once as soon as a running tick finishes ("coalesce"), or queued and run
+    after the running ticks, one per finished tick ("queue", up to EXECUTION_MAX_QUEUED ticks). The ticks
+    submitted under the same name may run different functions, the overrunning ones run their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, _JobState] = {}
+
+    def submit(
+            self,
+            name: str,
+            func: Callable,
+            max_concurrency: int = 1,
+            overrun_policy: OverrunPolicy = "skip",
+    ) -> bool:
+        """
+        Submit a tick of a job.
+        :param name: The name of the job, used for the concurrency limit and the metrics
+        :param func: The function to run
+        :param max_concurrency: The maximum number of ticks of this job running at the same time
+        :param overrun_policy: What to do when the concurrency limit is reached, "skip", "coalesce" or "queue"
+        :return: True if the tick was started, False if it was skipped or coalesced
+        """
+        with self._lock:
+            state = self._jobs.setdefault(name, _JobState())
+            if state.running >= max_concurrency:
+                if overrun_policy == "coalesce" and not state.pending:
+                    state.pending.append(func)
+                    metrics.increment(f"execution.{name}.coalesced")
+                elif overrun_policy == "queue" and len(state.pending) < EXECUTION_MAX_QUEUED:
+                    state.pending.append(func)
+                    metrics.increment(f"execution.{name}.queued")
+                else:
+                    metrics.increment(f"execution.{name}.skipped")
+                return False
+            state.running += 1
+            state.queued += 1
+            self._update_queue_depth()
+
+        submitted_at = time.monotonic()
+        started_at = submitted_at
+
+        def on_start():
+            nonlocal started_at
+            started_at = time.monotonic()
+            with self._lock:
+                state.queued -= 1
+                self._update_queue_depth()
+            metrics.observe(f"execution.{name}.lag_seconds", started_at - submitted_at, DURATION_BUCKETS)
+
+        def on_finish():
+            metrics.observe(f"execution.{name}.duration_seconds", time.monotonic() - started_at, DURATION_BUCKETS)
+            with self._lock:
+                state.running -= 1
+                pending = state.pending.popleft() if state.pending else None
+                self._update_queue_depth()
+            if pending is not None:
+                self.submit(name, pending, max_concurrency, overrun_policy)
+
+        try:
+            self._start(name, func, on_start, on_finish)
+        except Exception as e:
+            logger.exception(f"Failed to start {name}: {e}")
+            with self._lock:
+                state.running -= 1
+                state.queued -= 1
+                self._update_queue_depth()
+            return False
+
+        return True
+
+    def _update_queue_depth(self):
+        metrics.set_gauge("execution.queue_depth", sum(state.queued for state in self._jobs.values()))
+        metrics.set_gauge("execution.running", sum(state.running for state in self._jobs.values()))
+
+    @abc.abstractmethod
+    def _start(self, name: str, func: Callable, on_start: Callable, on_finish: Callable):
+        """
+        Start the given function, on_start must be called when the function actually starts running,
+        and on_finish when it is done, whatever the outcome.
+        """
+        pass
+
+    def shutdown(self, wait: bool = True):
+        pass
+
+
+def _run_job(name: str, func: Callable):
+    try:
+        func()
+    except Exception as e:
+        logger.exception(f"Error while running {name}: {e}")
+
+
+def _run_process_job(name: str, func: Callable, sender: Connection):
+    # The metrics inherited from the parent were already counted there, only those of the tick are sent back
+    metrics.reset()
+    try:
+        _run_job(name, func)
+    finally:
+        # The process exits without waiting for the threads syncing the written files in the background
+        try:
+            storage_manager.flush()
+        except Exception as e:
+            logger.exception(f"Failed to flush the storage after {name}: {e}")
+        sender.send(metrics.export())
+        sender.close()
+
+
+class ProcessExecutionEngine(ExecutionEngine):
+    """
+    Runs every tick in a new process, the processes are joined as soon as they finish. The metrics recorded by
+    a tick are sent back to this process when it finishes, and merged into its own (see metrics.merge).
+    """
+
+    def _start(self, name: str, func: Callable, on_start: Callable, on_finish: Callable):
+        receiver, sender = Pipe(duplex=False)
+        process = Process(target=_run_process_job, args=(name, func, sender))
+        process.start()
+        # The receiver gets an EOF instead of blocking if the process dies before sending its metrics
+        sender.close()
+        on_start()
+        logger.debug(f"Started process for {name} with PID {process.pid}")
+
+        def reap():
+            try:
+                # Received before joining, the process cannot exit while its metrics fill the pipe
+                try:
+                    metrics.merge(receiver.recv())
+                except EOFError:
+                    logger.warning(f"The process of {name} exited without sending its metrics")
+                finally:
+                    receiver.close()
+                process.join()
+            finally:
+                on_finish()
+
+        threading.Thread(target=reap, name=f"reaper-{name}", daemon=True).start()
+
+
+class ThreadExecutionEngine(ExecutionEngine):
+    """
+    Runs the ticks in a bounded pool of long-lived worker threads.
+    """
+
+    def __init__(self, max_workers: int = None):
+        super().__init__()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dataspace-worker")
+
+    def _start(self, name: str, func: Callable, on_start: Callable, on_finish: Callable):
+        def job():
+            on_start()
+            try:
+                _run_job(name, func)
+            finally:
+                on_finish()
+
+        self._executor.submit(job)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+class AsyncioExecutionEngine(ExecutionEngine):
+    """
+    Runs the ticks on an event loop running in a background thread, suited for I/O-bound components.
+    Coroutine functions are awaited directly, regular functions are run in the default executor of the loop.
+    The number of ticks running at the same time is bounded by max_workers.
+    """
+
+    def __init__(self, max_workers: int = None):
+        super().__init__()
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = asyncio.Semaphore(max_workers or 32)
+        self._thread = threading.Thread(target=self._loop.run_forever, name="dataspace-event-loop", daemon=True)
+        self._thread.start()
+
+    async def _run(self, name: str, func: Callable, on_start: Callable, on_finish: Callable):
+        try:
+            async with self._semaphore:
+                on_start()
+                try:
+                    if inspect.iscoroutinefunction(func):
+                        await func()
+                    else:
+                        await self._loop.run_in_executor(None, func)
+                except Exception as e:
+                    logger.exception(f"Error while running {name}: {e}")
+        finally:
+            on_finish()
+
+    def _start(self, name: str, func: Callable, on_start: Callable, on_finish: Callable):
+        asyncio.run_coroutine_threadsafe(self._run(name, func, on_start, on_finish), self._loop)
+
+    def shutdown(self, wait: bool = True):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        if wait:
+            self._thread.join()
+
+
+EXECUTION_ENGINES = {
+    "process": ProcessExecutionEngine,
+    "thread": ThreadExecutionEngine,
+    "asyncio": AsyncioExecutionEngine,
+}
+
+
+def create_execution_engine(name: str = None) -> ExecutionEngine:
+    """
+    Create an execution engine from its name.
+    :param name: "process", "thread" or "asyncio", defaults to the EXECUTION_ENGINE environment variable,
+        or "process" if it is not set. The size of the worker pool of the "thread" and "asyncio" engines
+        is read from the EXECUTION_MAX_WORKERS environment variable.
+    :return: The execution engine
+    """
+    name = name or os.environ.get("EXECUTION_ENGINE", "process")
+
+    if name not in EXECUTION_ENGINES:
+        raise ValueError(f"Invalid execution engine: {name}")
+
+    if name == "process":
+        return ProcessExecutionEngine()
+
+    max_workers = os.environ.get("EXECUTION_MAX_WORKERS")
+    return EXECUTION_ENGINES[name](max_workers=int(max_workers) if max_workers else None)
@@ -0,0 +1,159 @@
+import math
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+from .serialization import dumps
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+
+def _is_missing(value: Any) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _nesting(columns: Sequence[str], separator: Optional[str]) -> List[List[str]]:
+    return [column.split(separator) if separator and isinstance(column, str) else [column] for column in columns]
+
+
+def _nest(values: Iterable[Any], paths: List[List[str]]) -> Dict[str, Any]:
+    nested = {}
+    for path, value in zip(paths, values):
+        current = nested
+        for key in path[:-1]:
+            current = current.setdefault(key, {})
+        current[path[-1]] = value
+    return nested
+
+
+def _feature(coordinates: list, properties: dict, id: Any) -> dict:
+    feature = {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": coordinates},
+        "properties": properties,
+    }
+    if id is not None:
+        feature["id"] = id
+    return feature
+
+
+def _dataframe_features(
+        df: "pd.DataFrame",
+        longitude: str,
+        latitude: str,
+        altitude: Optional[str],
+        default_altitude: Optional[float],
+        id: Optional[str],
+        id_from_index: bool,
+        exclude: Sequence[str],
+        nest_separator: Optional[str],
+) -> List[dict]:
+    df = df[df[longitude].notna() & df[latitude].notna()]
+
+    coordinate_columns = [longitude, latitude]
+    if altitude is not None:
+        coordinate_columns.append(altitude)
+    coordinates = df[coordinate_columns].astype(object)
+    if altitude is not None:
+        coordinates[altitude] = coordinates[altitude].where(coordinates[altitude].notna(), default_altitude)
+    coordinates = coordinates.values.tolist()
+
+    property_columns = [column for column in df.columns if column not in coordinate_columns and column not in exclude]
+    # NaN (and NaT) become None, column by column, before the rows are built
+    properties = df[property_columns].astype(object)
+    properties = properties.where(properties.notna(), None).values.tolist()
+
+    ids = [None] * len(df)
+    if id is not None:
+        ids = df[id].astype(object).where(df[id].notna(), None).tolist()
+    if id_from_index:
+        ids = [str(index) if value is None else value for value, index in zip(ids, df.index)]
+
+    if nest_separator:
+        paths = _nesting(property_columns, nest_separator)
+        properties = [_nest(values, paths) for values in properties]
+    else:
+        properties = [dict(zip(property_columns, values)) for values in properties]
+
+    return [_feature(*values) for values in zip(coordinates, properties, ids)]
+
+
+def _records_features(
+        records: Iterable[dict],
+        longitude: str,
+        latitude: str,
+        altitude: Optional[str],
+        default_altitude: Optional[float],
+        id: Optional[str],
+        id_from_index: bool,
+        exclude: Sequence[str],
+        nest_separator: Optional[str],
+) -> List[dict]:
+    skipped = {longitude, latitude, altitude, *exclude}
+    features = []
+
+    for index, record in enumerate(records):
+        lon, lat = record.get(longitude), record.get(latitude)
+        if _is_missing(lon) or _is_missing(lat):
+            continue
+
+        coordinates = [lon, lat]
+        if altitude is not None:
+            alt = record.get(altitude)
+            coordinates.append(default_altitude if _is_missing(alt) else alt)
+
+        properties = {key: None if _is_missing(value) else value
+                      for key, value in record.items() if key not in skipped}
+        if nest_separator:
+            properties = _nest(properties.values(), _nesting(list(properties), nest_separator))
+
+        feature_id = record.get(id) if id is not None else None
+        if _is_missing(feature_id):
+            feature_id = str(index) if id_from_index else None
+
+        features.append(_feature(coordinates, properties, feature_id))
+
+    return features
+
+
+def feature_collection(
+        data: Union["pd.DataFrame", Iterable[dict]],
+        longitude: str = "longitude",
+        latitude: str = "latitude",
+        altitude: Optional[str] = None,
+        default_altitude: Optional[float] = None,
+        id: Optional[str] = None,
+        id_from_index: bool = False,
+        exclude: Sequence[str] = (),
+        nest_separator: Optional[str] = None,
+) -> bytes:
+    """
+    Build a GeoJSON FeatureCollection of points from a DataFrame or a list of records, encoded to JSON bytes.
+
+    Rows without coordinates are skipped, the other columns become the properties of the features, with missing
+    values (None, NaN, NaT) encoded as null. DataFrames are converted column by column rather than row by row.
+    The JSON is encoded with the configured serializer (see serialization).
+
+    :param data: The DataFrame or the records
+    :param longitude: The column of the longitude
+    :param latitude: The column of the latitude
+    :param altitude: The column of the altitude, None for 2D points
+    :param default_altitude: The altitude of the rows without one
+    :param id: The column of the id of the features, None for no id
+    :param id_from_index: If True, features without id get the index of their row (as a string) as id
+    :param exclude: Columns not to include in the properties, the coordinates never are
+    :param nest_separator: If given, the properties are nested by splitting their name on this separator
+        (e.g. "location_country" becomes {"location": {"country": ...}} with "_")
+    :return: The FeatureCollection, as JSON bytes
+    """
+    if pd is not None and isinstance(data, pd.DataFrame):
+        build = _dataframe_features
+    else:
+        build = _records_features
+
+    features = build(
+        data, longitude, latitude, altitude, default_altitude, id, id_from_index, exclude, nest_separator
+    )
+
+    return dumps({"type": "FeatureCollection", "features": features})
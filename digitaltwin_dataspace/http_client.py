@@ -0,0 +1,261 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", 30))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 10))
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", 3))
+HTTP_BACKOFF = float(os.environ.get("HTTP_BACKOFF", 0.5))
+HTTP_BACKOFF_MAX = float(os.environ.get("HTTP_BACKOFF_MAX", 30))
+HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", 10))
+HTTP_VALIDATOR_DIRECTORY = os.environ.get(
+    "HTTP_VALIDATOR_DIRECTORY", os.path.join(tempfile.gettempdir(), "digitaltwin_dataspace_http")
+)
+
+# Responses worth retrying, the other errors are returned to the caller
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+_session_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+
+
+def _create_session() -> requests.Session:
+    session = requests.Session()
+    # One keep-alive pool per host, shared by all the collectors of the process
+    adapter = HTTPAdapter(pool_connections=32, pool_maxsize=HTTP_POOL_MAXSIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """
+    Get the HTTP session shared by the collectors of the process.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _create_session()
+        return _session
+
+
+def _reset_session_in_child():
+    # Pooled sockets must never be shared between a parent and a child process
+    global _session
+    _session = None
+
+
+os.register_at_fork(after_in_child=_reset_session_in_child)
+
+
+class ValidatorStore:
+    """
+    Stores the validators (ETag and Last-Modified) of the last responses of the conditional requests, one file per
+    request, so they survive the process running the collector (e.g. with the "process" execution engine).
+    """
+
+    def __init__(self, directory: Optional[str] = HTTP_VALIDATOR_DIRECTORY):
+        """
+        :param directory: The directory of the validators, None to keep them in memory only
+        """
+        self.directory = directory
+        self._validators: Dict[str, dict] = {}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, key: str) -> Optional[dict]:
+        if key in self._validators or self.directory is None:
+            return self._validators.get(key)
+
+        try:
+            with open(self._path(key), "r") as file:
+                self._validators[key] = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        return self._validators[key]
+
+    def put(self, key: str, validators: dict):
+        self._validators[key] = validators
+
+        if self.directory is None:
+            return
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(key)
+            with open(path + ".tmp", "w") as file:
+                json.dump(validators, file)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            logger.warning(f"Failed to store the HTTP validators of {key}: {e}")
+
+
+class HttpClient:
+    """
+    HTTP client of a collector, on top of the session shared by the process.
+
+    Requests get default timeouts, and are retried with exponential backoff and full jitter on connection errors,
+    timeouts and retryable statuses (honoring Retry-After). Latency, bytes, retries and errors are recorded
+    per endpoint in the metrics.
+
+    Conditional requests send the validators of the last response of the same request. The validators of a
+    response are only stored once the collector has written its result (see commit), so that a failed run
+    does not make the next one skip the result with a 304.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            timeout: Tuple[float, float] = (HTTP_CONNECT_TIMEOUT, HTTP_TIMEOUT),
+            retries: int = HTTP_RETRIES,
+            backoff: float = HTTP_BACKOFF,
+            backoff_max: float = HTTP_BACKOFF_MAX,
+            validators: ValidatorStore = None,
+    ):
+        """
+        :param name: The name of the component, used to namespace the validators
+        :param timeout: The default connect and read timeouts, in seconds
+        :param retries: The maximum number of retries of a request
+        :param backoff: The base delay between retries, in seconds, doubled at each retry
+        :param backoff_max: The maximum delay between retries, in seconds
+        :param validators: Where the validators of the conditional requests are stored
+        """
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.validators = validators if validators is not None else ValidatorStore()
+        self._pending: Dict[str, dict] = {}
+
+    def _delay(self, attempt: int, response: Optional[requests.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after is not None and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+
+    def request(
+            self,
+            method: str,
+            url: str,
+            endpoint: str = None,
+            conditional: bool = False,
+            **kwargs,
+    ) -> requests.Response:
+        """
+        Send a request, see requests.Session.request for the keyword arguments.
+        :param method: The HTTP method
+        :param url: The url
+        :param endpoint: The name of the endpoint in the metrics, the host and path of the url by default
+        :param conditional: If True, the validators of the last response are sent, and a 304 response is
+            returned if the resource has not changed
+        :return: The response, errors other than the retryable ones are not raised
+        """
+        method = method.upper()
+        if endpoint is None:
+            parts = urlsplit(url)
+            endpoint = f"{parts.netloc}{parts.path}"
+        kwargs.setdefault("timeout", self.timeout)
+
+        key = None
+        if conditional:
+            key = f"{self.name}|{method}|{url}|{urlencode(sorted((kwargs.get('params') or {}).items()))}"
+            headers = dict(kwargs.get("headers") or {})
+            validators = self.validators.get(key) or {}
+            if "etag" in validators:
+                headers["If-None-Match"] = validators["etag"]
+            if "last_modified" in validators:
+                headers["If-Modified-Since"] = validators["last_modified"]
+            kwargs["headers"] = headers
+
+        retries = self.retries if method in IDEMPOTENT_METHODS else 0
+        session = get_session()
+        started_at = time.monotonic()
+
+        for attempt in range(retries + 1):
+            response = None
+            try:
+                response = session.request(method, url, **kwargs)
+                if response.status_code not in RETRY_STATUSES or attempt == retries:
+                    break
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == retries:
+                    metrics.increment(f"http.{endpoint}.errors")
+                    raise
+                logger.warning(f"Request to {endpoint} failed, retrying: {e}")
+
+            metrics.increment(f"http.{endpoint}.retries")
+            delay = self._delay(attempt, response)
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+
+        metrics.increment(f"http.{endpoint}.requests")
+        metrics.observe(f"http.{endpoint}.latency_seconds", time.monotonic() - started_at)
+        if not kwargs.get("stream"):
+            metrics.observe(f"http.{endpoint}.bytes", len(response.content))
+        if response.status_code >= 400:
+            metrics.increment(f"http.{endpoint}.errors")
+
+        if response.status_code == 304:
+            metrics.increment(f"http.{endpoint}.not_modified")
+        elif conditional and response.ok:
+            validators = {}
+            if response.headers.get("ETag"):
+                validators["etag"] = response.headers["ETag"]
+            if response.headers.get("Last-Modified"):
+                validators["last_modified"] = response.headers["Last-Modified"]
+            if validators:
+                self._pending[key] = validators
+
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        Send a GET request, see request for the keyword arguments.
+        """
+        return self.request("GET", url, **kwargs)
+
+    def get_content(self, url: str, conditional: bool = False, **kwargs) -> Optional[bytes]:
+        """
+        Send a GET request and return the content of the response, see request for the keyword arguments.
+        :raise requests.HTTPError: If the response is an error
+        :return: The content, None if the request is conditional and the resource has not changed
+        """
+        response = self.get(url, conditional=conditional, **kwargs)
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        return response.content
+
+    def commit(self):
+        """
+        Store the validators of the conditional responses received since the last commit.
+        """
+        for key, validators in self._pending.items():
+            self.validators.put(key, validators)
+        self._pending.clear()
+
+    def rollback(self):
+        """
+        Forget the validators of the conditional responses received since the last commit.
+        """
+        self._pending.clear()
@@ -0,0 +1,120 @@
+import os
+import threading
+from collections import defaultdict
+from typing import Dict, Optional, Sequence, Tuple
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = defaultdict(float)
+_gauges: Dict[str, float] = {}
+_observations: Dict[str, Dict[str, float]] = {}
+
+
+def _reset_lock():
+    # A thread of the parent may hold the lock when a process is forked, it would never be released in the child
+    global _lock
+    _lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_lock)
+
+
+def increment(name: str, value: float = 1):
+    """
+    Increment a counter.
+    :param name: The name of the counter (e.g. "write.uploads_skipped")
+    :param value: The amount to add to the counter
+    """
+    with _lock:
+        _counters[name] += value
+
+
+def set_gauge(name: str, value: float):
+    """
+    Set the current value of a gauge.
+    :param name: The name of the gauge (e.g. "execution.queue_depth")
+    :param value: The value of the gauge
+    """
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name: str, value: float, buckets: Optional[Sequence[float]] = None):
+    """
+    Record an observation (e.g. a duration), the count, sum and max of the observations are kept.
+    :param name: The name of the observed metric (e.g. "execution.lag_seconds")
+    :param value: The observed value
+    :param buckets: The upper bounds of the buckets of a histogram of the observations, the number of observations
+        lower than or equal to each bound is then kept as "le_<bound>" (cumulative, like Prometheus histograms).
+        The buckets of a metric must be the same for every observation
+    """
+    with _lock:
+        summary = _observations.setdefault(name, {"count": 0, "sum": 0.0, "max": value})
+        summary["count"] += 1
+        summary["sum"] += value
+        summary["max"] = max(summary["max"], value)
+        for bound in buckets or ():
+            key = f"le_{bound:g}"
+            summary[key] = summary.get(key, 0) + (value <= bound)
+
+
+def get_counter(name: str) -> float:
+    """
+    Get the current value of a counter.
+    :param name: The name of the counter
+    :return: The value of the counter, 0 if it was never incremented
+    """
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def snapshot() -> Dict[str, float]:
+    """
+    Get a copy of all the metrics collected in the current process, including those of the ticks run in their
+    own process by the process execution engine, which are merged when they finish.
+    :return: A dictionary mapping metric names to their values
+    """
+    with _lock:
+        result = dict(_counters)
+        result.update(_gauges)
+        for name, summary in _observations.items():
+            for key, value in summary.items():
+                result[f"{name}.{key}"] = value
+        return result
+
+
+def export() -> Tuple[Dict[str, float], Dict[str, float], Dict[str, Dict[str, float]]]:
+    """
+    Get a copy of the counters, gauges and observations collected in the current process, to be merged into the
+    metrics of another process (see merge).
+    """
+    with _lock:
+        return dict(_counters), dict(_gauges), {name: dict(summary) for name, summary in _observations.items()}
+
+
+def merge(exported: Tuple[Dict[str, float], Dict[str, float], Dict[str, Dict[str, float]]]):
+    """
+    Add the metrics exported by another process (see export) to the metrics of the current process: counters and
+    observations are summed up, gauges are overwritten.
+    """
+    counters, gauges, observations = exported
+    with _lock:
+        for name, value in counters.items():
+            _counters[name] += value
+        _gauges.update(gauges)
+        for name, other in observations.items():
+            summary = _observations.setdefault(name, {"count": 0, "sum": 0.0, "max": other["max"]})
+            for key, value in other.items():
+                if key == "max":
+                    summary["max"] = max(summary["max"], value)
+                else:
+                    summary[key] = summary.get(key, 0) + value
+
+
+def reset():
+    """
+    Reset all the metrics collected in the current process.
+    """
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _observations.clear()
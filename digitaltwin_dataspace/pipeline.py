@@ -0,0 +1,282 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from . import metrics
+from .components.base import Component, ScheduleRunnable
+from .components.harvester import Harvester
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineCycleError(ValueError):
+    """
+    Raised when the sources and dependencies of the harvesters form a cycle.
+    """
+
+    def __init__(self, cycle: List[str]):
+        self.cycle = cycle
+        super().__init__(f"The pipeline contains a cycle: {' -> '.join(cycle)}")
+
+
+@dataclass
+class NodeRun:
+    """
+    The run of a component during a pipeline run, times are monotonic.
+    """
+    name: str
+    ready_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    produced: bool = False
+    # The upstream component whose completion made this one ready, None for the starting components
+    triggered_by: Optional[str] = None
+
+    @property
+    def wait_seconds(self) -> float:
+        return (self.started_at or self.ready_at) - self.ready_at
+
+    @property
+    def duration_seconds(self) -> float:
+        if self.started_at is None:
+            return 0
+        return self.finished_at - self.started_at
+
+
+@dataclass
+class PipelineRun:
+    """
+    The result of a pipeline run.
+    """
+    started_at: float
+    nodes: Dict[str, NodeRun]
+
+    @property
+    def latency_seconds(self) -> float:
+        """Time between the start of the run and the end of the last component."""
+        return max((node.finished_at for node in self.nodes.values()), default=self.started_at) - self.started_at
+
+    def critical_path(self) -> List[NodeRun]:
+        """
+        The chain of components that determined the latency of the run: starting from the last component
+        to finish, each component is preceded by the upstream one whose completion made it ready.
+        """
+        if not self.nodes:
+            return []
+
+        path = [max(self.nodes.values(), key=lambda node: node.finished_at)]
+        while path[-1].triggered_by is not None:
+            path.append(self.nodes[path[-1].triggered_by])
+
+        return list(reversed(path))
+
+    def describe_critical_path(self) -> str:
+        return " -> ".join(
+            f"{node.name} (waited {node.wait_seconds:.3f}s, ran {node.duration_seconds:.3f}s)"
+            for node in self.critical_path()
+        )
+
+
+def _run_component(component: ScheduleRunnable) -> bool:
+    """
+    Run a component once, harvesters are run until they have caught up with their source.
+    :return: True if the component produced at least one result
+    """
+    if isinstance(component, Harvester):
+        produced = False
+        while component.run():
+            produced = True
+        return produced
+
+    return component.run() is not None
+
+
+class Pipeline:
+    """
+    Runs the components following the graph described by the sources and dependencies of the harvesters.
+
+    A run starts from some components and runs every component downstream of them in topological order:
+    a harvester is started as soon as all its inputs that are part of the run have finished, and only if at
+    least one of them produced a result. Independent branches run in parallel.
+
+    Components whose inputs are not part of the pipeline (collectors, harvesters of external tables) are the
+    roots of the pipeline, they are the ones to schedule. The runs of roots sharing downstream components must
+    not overlap: they are submitted to the execution engine under the same job (see job_name), which runs them
+    one at a time whatever the engine, the locks of the pipeline only covering the runs of a single process.
+    """
+
+    def __init__(self, components: Iterable[Component], max_workers: int = None):
+        """
+        :param components: The components, only the runnable ones are part of the pipeline
+        :param max_workers: The maximum number of components running at the same time
+            (default PIPELINE_MAX_WORKERS, or 8)
+        :raise PipelineCycleError: If the graph contains a cycle
+        """
+        self.components: Dict[str, ScheduleRunnable] = {
+            component.get_configuration().name: component
+            for component in components
+            if isinstance(component, ScheduleRunnable)
+        }
+        self.max_workers = max_workers or int(os.environ.get("PIPELINE_MAX_WORKERS", 8))
+
+        self.upstream: Dict[str, List[str]] = {name: [] for name in self.components}
+        self.downstream: Dict[str, List[str]] = {name: [] for name in self.components}
+        for name, component in self.components.items():
+            if isinstance(component, Harvester):
+                for trigger in component.get_triggers():
+                    if trigger in self.components and trigger not in self.upstream[name]:
+                        self.upstream[name].append(trigger)
+                        self.downstream[trigger].append(name)
+
+        self.order = self._topological_order()
+
+        # Two runs starting from different roots may share downstream components, which must not run concurrently
+        self._locks = {name: threading.Lock() for name in self.components}
+        # The roots whose runs are submitted under each job name, see job_name
+        self.jobs = self._group_roots()
+
+    def _topological_order(self) -> List[str]:
+        remaining = {name: len(upstream) for name, upstream in self.upstream.items()}
+        ready = [name for name, count in remaining.items() if count == 0]
+        order = []
+
+        while ready:
+            name = ready.pop(0)
+            order.append(name)
+            for downstream in self.downstream[name]:
+                remaining[downstream] -= 1
+                if remaining[downstream] == 0:
+                    ready.append(downstream)
+
+        if len(order) < len(self.components):
+            raise PipelineCycleError(self._find_cycle({name for name, count in remaining.items() if count > 0}))
+
+        return order
+
+    def _find_cycle(self, names: Set[str]) -> List[str]:
+        # Every remaining component has an upstream component in the cycle or downstream of it,
+        # walking up from any of them eventually comes back to a visited component
+        path = [next(iter(sorted(names)))]
+        while True:
+            upstream = next(name for name in self.upstream[path[-1]] if name in names)
+            if upstream in path:
+                cycle = path[path.index(upstream):] + [upstream]
+                return list(reversed(cycle))
+            path.append(upstream)
+
+    def _group_roots(self) -> Dict[str, List[str]]:
+        # The roots sharing downstream components, directly or through other roots, end up in the same group
+        groups: List[Tuple[Set[str], List[str]]] = []
+        for root in self.roots():
+            reached = self.descendants([root]) - {root}
+            roots = [root]
+            for group in [group for group in groups if group[0] & reached]:
+                groups.remove(group)
+                reached |= group[0]
+                roots = group[1] + roots
+            groups.append((reached, roots))
+
+        jobs = {}
+        for _, roots in groups:
+            roots = sorted(roots, key=self.order.index)
+            jobs[roots[0] if len(roots) == 1 else f"pipeline_{roots[0]}"] = roots
+        return jobs
+
+    def job_name(self, root: str) -> str:
+        """
+        The name of the job under which the runs starting from a root are submitted to the execution engine, with
+        a concurrency of 1: the name of the root, or a name shared with the roots having downstream components in
+        common with it.
+        """
+        return next(name for name, roots in self.jobs.items() if root in roots)
+
+    def roots(self) -> List[str]:
+        """
+        The components that have no input in the pipeline, in topological order.
+        """
+        return [name for name in self.order if not self.upstream[name]]
+
+    def descendants(self, names: Iterable[str]) -> Set[str]:
+        """
+        The given components and all the components downstream of them.
+        """
+        result = set()
+        stack = list(names)
+        while stack:
+            name = stack.pop()
+            if name not in result:
+                result.add(name)
+                stack.extend(self.downstream[name])
+        return result
+
+    def run(self, start: Iterable[str] = None) -> PipelineRun:
+        """
+        Run the given components and every component downstream of them.
+        :param start: The names of the components to start from, all the roots if None
+        :return: The timings of the run
+        """
+        start = list(start) if start is not None else self.roots()
+        names = self.descendants(start)
+
+        started_at = time.monotonic()
+        nodes: Dict[str, NodeRun] = {}
+        # Number of inputs of each component still to finish in this run
+        remaining = {name: sum(1 for upstream in self.upstream[name] if upstream in names) for name in names}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pipeline") as executor:
+            futures = {}
+
+            def schedule(name: str, triggered_by: Optional[str]):
+                node = nodes[name] = NodeRun(name=name, ready_at=time.monotonic(), triggered_by=triggered_by)
+                futures[executor.submit(self._run_node, node)] = name
+
+            def skip(name: str, triggered_by: Optional[str]):
+                now = time.monotonic()
+                nodes[name] = NodeRun(name=name, ready_at=now, finished_at=now, triggered_by=triggered_by)
+                finish(name)
+
+            def finish(name: str):
+                for downstream in self.downstream[name]:
+                    if downstream not in names:
+                        continue
+                    remaining[downstream] -= 1
+                    if remaining[downstream] == 0:
+                        if any(nodes[upstream].produced for upstream in self.upstream[downstream] if upstream in names):
+                            schedule(downstream, name)
+                        else:
+                            skip(downstream, name)
+
+            for name in self.order:
+                if name in names and remaining[name] == 0:
+                    schedule(name, None)
+
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(futures.pop(future))
+
+        run = PipelineRun(started_at=started_at, nodes=nodes)
+
+        metrics.observe("pipeline.latency_seconds", run.latency_seconds)
+        logger.info(f"Pipeline run from {start} took {run.latency_seconds:.3f}s, "
+                    f"critical path: {run.describe_critical_path()}")
+
+        return run
+
+    def _run_node(self, node: NodeRun):
+        component = self.components[node.name]
+
+        with self._locks[node.name]:
+            node.started_at = time.monotonic()
+            try:
+                node.produced = _run_component(component)
+            except Exception as e:
+                logger.exception(f"Error while running {node.name} in the pipeline: {e}")
+            node.finished_at = time.monotonic()
+
+        metrics.observe(f"pipeline.{node.name}.wait_seconds", node.wait_seconds)
+        metrics.observe(f"pipeline.{node.name}.duration_seconds", node.duration_seconds)
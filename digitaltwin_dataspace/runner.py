@@ -1,14 +1,24 @@
 import logging
-import time
+import os
+from functools import partial
 from multiprocessing import Process
-from typing import List
+from typing import Callable, List, Union
 
 import fastapi
-import schedule
 import uvicorn
 
-from .components.base import Component, ScheduleRunnable, Servable
-from .utils import schedule_string_to_function
+from . import metrics
+from .components.base import Component, RetentionPolicy, ScheduleRunnable, Servable
+from .components.harvester import Harvester
+from .data.buffer import write_buffer
+from .data.cache import BLOB_CACHE_SWEEP_SCHEDULE, blob_cache
+from .data.engine import pool_statistics
+from .data.events import event_bus
+from .data.retention import RETENTION_SCHEDULE, run_retention
+from .data.storage import STORAGE_CACHE_SWEEP_SCHEDULE, CachingStorageManager, storage_manager
+from .execution import ExecutionEngine, OverrunPolicy, create_execution_engine
+from .pipeline import Pipeline
+from .scheduler import Scheduler
 
 # Setup logging
 logging.basicConfig(
@@ -18,19 +28,105 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def _in_process(func):
-    def wrapper(*args, **kwargs):
-        try:
-            process = Process(target=func, args=args, kwargs=kwargs)
-            process.start()
-            logger.debug(f"Started process for {func.__name__} with PID {process.pid}")
-        except Exception as e:
-            logger.exception(f"Failed to start process for {func.__name__}: {e}")
+def _submit_to(
+        execution_engine: ExecutionEngine,
+        name: str,
+        component: ScheduleRunnable,
+        func: Callable = None,
+        max_concurrency: int = None,
+        overrun_policy: OverrunPolicy = None,
+):
+    def wrapper():
+        execution_engine.submit(
+            name,
+            func or component.run,
+            max_concurrency=max_concurrency or component.get_max_concurrency(),
+            overrun_policy=overrun_policy or component.get_overrun_policy(),
+        )
 
     return wrapper
 
 
-def run_components(components: List[Component]):
+def _drain(harvester: Harvester):
+    # Harvest until the harvester has caught up with its source
+    while harvester.run():
+        pass
+
+
+def _submit_on_event(
+        execution_engine: ExecutionEngine, name: str, func: Callable, overrun_policy: OverrunPolicy = "coalesce"
+):
+    def subscriber(_):
+        # Events received while the harvester is running are coalesced into a single rerun
+        execution_engine.submit(
+            name,
+            func,
+            max_concurrency=1,
+            overrun_policy=overrun_policy,
+        )
+
+    return subscriber
+
+
+def _submit_retention(execution_engine: ExecutionEngine, name: str, policy: RetentionPolicy):
+    def wrapper():
+        execution_engine.submit(f"{name}_retention", partial(run_retention, name, policy))
+
+    return wrapper
+
+
+def _log_metrics():
+    logger.info(f"Metrics: {metrics.snapshot()}, database pool: {pool_statistics()}")
+
+
+def run_components(
+        components: List[Component],
+        execution_engine: Union[str, ExecutionEngine] = None,
+        pipeline: bool = None,
+):
+    """
+    Schedule the runnable components, serve the servable ones, and run forever.
+    :param components: The components to run
+    :param execution_engine: The engine running the scheduled components, either an ExecutionEngine or
+        its name ("process", "thread" or "asyncio"), see create_execution_engine for the default
+    :param pipeline: If True, only the roots of the pipeline (see Pipeline) are scheduled, and each of their
+        runs is followed by the runs of the harvesters downstream of them. The runs of the roots sharing
+        downstream harvesters are submitted under a common job and queued behind each other, whatever the
+        execution engine. Defaults to the PIPELINE environment variable ("true" to enable)
+
+    When an event bus is configured (see create_event_bus), harvesters are run as soon as their source or one
+    of their dependencies writes a row, and only polled on the EVENT_FALLBACK_SCHEDULE (default "5m") in case
+    an event is lost. The "memory" event bus only sees the rows written in this process, so it requires the
+    "thread" or "asyncio" execution engine.
+
+    The components are scheduled by a Scheduler: the ticks of the components sharing an interval are spread over
+    up to SCHEDULER_MAX_SPREAD seconds (default 60), and their schedules can be intervals (including sub-second
+    ones, e.g. "500ms"), times of the day or cron expressions, see parse_schedule.
+
+    The retention policies of the components (see RetentionPolicy) are applied on the RETENTION_SCHEDULE
+    (default "1h").
+
+    When a storage cache is configured (see CachingStorageManager), this process sweeps it on the
+    STORAGE_CACHE_SWEEP_SCHEDULE (default "1m"), evicting the files cached by every process past its maximum size.
+    Likewise, when the blob cache spills to a directory (see BlobCache), it is swept on the BLOB_CACHE_SWEEP_SCHEDULE
+    (default "1m").
+
+    When a write buffer is configured (see create_write_buffer), its flusher runs in this process, writing the
+    results appended by the buffered collectors of every execution engine, starting with those left by a
+    previous run.
+    """
+    if not isinstance(execution_engine, ExecutionEngine):
+        execution_engine = create_execution_engine(execution_engine)
+
+    if pipeline is None:
+        pipeline = os.environ.get("PIPELINE", "false").lower() == "true"
+    if pipeline:
+        # Fails on startup if the harvesters form a cycle
+        pipeline = Pipeline(components)
+        logger.info(f"Pipeline order: {pipeline.order}")
+
+    scheduler = Scheduler()
+
     app = fastapi.FastAPI(
         redoc_url="/docs",
         docs_url=None,
@@ -40,14 +136,50 @@ def run_components(components: List[Component]):
         configuration = component.get_configuration()
         logger.info(f"Registering component: {configuration.name}")
 
-        if isinstance(component, ScheduleRunnable):
+        if pipeline and pipeline.upstream.get(configuration.name):
+            logger.info(f"{configuration.name} is run by the pipeline after {pipeline.upstream[configuration.name]}")
+        elif isinstance(component, ScheduleRunnable):
             try:
-                job = schedule_string_to_function(component.get_schedule())
-                job.do(_in_process(component.run))
-                logger.info(f"Scheduled {configuration.name} with {component.get_schedule()}")
+                schedule_string = component.get_schedule()
+                job_name = configuration.name
+                func = None
+                event_func = partial(_drain, component)
+                max_concurrency = overrun_policy = None
+
+                if pipeline:
+                    func = event_func = partial(pipeline.run, [configuration.name])
+                    # Runs sharing downstream harvesters must not overlap, even in different processes
+                    job_name = pipeline.job_name(configuration.name)
+                    max_concurrency = 1
+                    if len(pipeline.jobs[job_name]) > 1:
+                        overrun_policy = "queue"
+
+                if event_bus is not None and isinstance(component, Harvester):
+                    event_bus.subscribe(
+                        component.get_triggers(),
+                        _submit_on_event(execution_engine, job_name, event_func, overrun_policy or "coalesce"),
+                    )
+                    schedule_string = os.environ.get("EVENT_FALLBACK_SCHEDULE", "5m")
+                    logger.info(f"Subscribed {configuration.name} to {component.get_triggers()}")
+
+                scheduler.add(
+                    configuration.name,
+                    schedule_string,
+                    _submit_to(execution_engine, job_name, component, func, max_concurrency, overrun_policy),
+                    jitter=component.get_jitter(),
+                )
+                logger.info(f"Scheduled {configuration.name} with {schedule_string}")
             except Exception as e:
                 logger.exception(f"Failed to schedule {configuration.name}: {e}")
 
+        if configuration.retention is not None:
+            scheduler.add(
+                f"{configuration.name}_retention",
+                RETENTION_SCHEDULE,
+                _submit_retention(execution_engine, configuration.name, configuration.retention),
+            )
+            logger.info(f"Scheduled the retention of {configuration.name} with {RETENTION_SCHEDULE}")
+
         if isinstance(component, Servable):
             try:
                 endpoints = component.get_endpoints()
@@ -76,11 +208,17 @@ def run_components(components: List[Component]):
 
     Process(target=run_app).start()
 
+    if write_buffer is not None:
+        write_buffer.start()
+        logger.info(f"Started the write buffer flusher on {write_buffer.directory}")
+
+    if isinstance(storage_manager, CachingStorageManager):
+        scheduler.add("storage_cache_sweep", STORAGE_CACHE_SWEEP_SCHEDULE, storage_manager.sweep)
+    if blob_cache.spill_directory:
+        scheduler.add("blob_cache_sweep", BLOB_CACHE_SWEEP_SCHEDULE, blob_cache.sweep)
+
+    scheduler.add("log_metrics", "1m", _log_metrics)
+
     logger.info("Scheduler started")
-    while True:
-        try:
-            schedule.run_pending()
-            time.sleep(1)
-        except Exception as e:
-            logger.exception("Error during scheduler run", exc_info=e)
+    scheduler.run_forever()
 
@@ -0,0 +1,314 @@
+import abc
+import heapq
+import itertools
+import logging
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Set
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Maximum phase offset of the interval schedules, spreading the jobs sharing a schedule, in seconds
+SCHEDULER_MAX_SPREAD = float(os.environ.get("SCHEDULER_MAX_SPREAD", 60))
+
+# Upper bounds of the buckets of the histograms of the lateness of the ticks, in seconds
+LATENESS_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+
+_INTERVAL = re.compile(r"^(\d+(?:\.\d+)?)(ms|s|m|h|d|w)$")
+_TIME = re.compile(r"^(\d{1,2}):(\d{2})(?::(\d{2}))?$")
+
+_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+_CRON_ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+}
+
+
+class Trigger(abc.ABC):
+    """
+    When the ticks of a job are due.
+    """
+
+    @abc.abstractmethod
+    def next_after(self, now: float) -> float:
+        """
+        The wall-clock timestamp of the first tick after a timestamp.
+        """
+        pass
+
+
+class IntervalTrigger(Trigger):
+    """
+    Ticks every interval seconds, aligned on the multiples of the interval since the epoch shifted by a phase,
+    so that the ticks do not depend on when the scheduler was started.
+    """
+
+    def __init__(self, interval: float, phase: float = 0.0):
+        if interval <= 0:
+            raise ValueError(f"Invalid interval: {interval}")
+        self.interval = interval
+        self.phase = phase % interval
+
+    def next_after(self, now: float) -> float:
+        return (((now - self.phase) // self.interval) + 1) * self.interval + self.phase
+
+
+class CronTrigger(Trigger):
+    """
+    Ticks on the minutes matching a cron expression ("minute hour day-of-month month day-of-week", local time),
+    supporting "*", lists ("1,15"), ranges ("1-5") and steps ("*/10", "0-30/5"), and the @hourly, @daily, @weekly,
+    @monthly and @yearly aliases. Days of week go from 0 (Sunday) to 6, 7 being Sunday too. As in cron, when both
+    the day of month and the day of week are restricted, a day matching either is due.
+    """
+
+    def __init__(self, expression: str, offset: float = 0.0):
+        """
+        :param expression: The cron expression
+        :param offset: Seconds added to each tick, e.g. to run "every minute" jobs at a given second
+        """
+        self.expression = expression
+        fields = _CRON_ALIASES.get(expression.strip(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Invalid cron expression: {expression}")
+
+        self.minutes = self._parse(fields[0], 0, 59)
+        self.hours = self._parse(fields[1], 0, 23)
+        self.days = self._parse(fields[2], 1, 31)
+        self.months = self._parse(fields[3], 1, 12)
+        self.weekdays = {weekday % 7 for weekday in self._parse(fields[4], 0, 7)}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+        self.offset = offset
+
+    def _parse(self, field: str, low: int, high: int) -> Set[int]:
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step = part.split("/")
+                step = int(step)
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start, end = (int(value) for value in part.split("-"))
+            else:
+                start = end = int(part)
+                if step != 1:
+                    end = high
+
+            if step < 1 or not low <= start <= end <= high:
+                raise ValueError(f"Invalid cron expression: {self.expression}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, date: datetime) -> bool:
+        if date.month not in self.months:
+            return False
+        day = date.day in self.days
+        # datetime.weekday() starts the week on Monday
+        weekday = (date.weekday() + 1) % 7 in self.weekdays
+        if self.any_day:
+            return weekday
+        if self.any_weekday:
+            return day
+        return day or weekday
+
+    def next_after(self, now: float) -> float:
+        after = datetime.fromtimestamp(now - self.offset)
+        day = after.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        # Leap days and rare weekdays make a match up to a few years away
+        for _ in range(366 * 5):
+            if self._day_matches(day):
+                for hour in sorted(self.hours):
+                    for minute in sorted(self.minutes):
+                        tick = day.replace(hour=hour, minute=minute)
+                        if tick > after:
+                            return tick.timestamp() + self.offset
+            day += timedelta(days=1)
+
+        raise ValueError(f"Cron expression never matches: {self.expression}")
+
+
+def parse_schedule(schedule_string: str, phase: float = 0.0) -> Trigger:
+    """
+    Parse a schedule string.
+    :param schedule_string: An interval ("500ms", "10s", "1.5m", "2h", "1d", "1w"), a time of the day ("08:30" or
+        "08:30:15", local time) or a cron expression ("*/5 * * * *", see CronTrigger)
+    :param phase: The offset of the ticks of an interval, in seconds
+    :return: The trigger of the schedule
+    """
+    schedule_string = schedule_string.strip()
+
+    match = _INTERVAL.match(schedule_string)
+    if match:
+        return IntervalTrigger(float(match.group(1)) * _UNITS[match.group(2)], phase)
+
+    match = _TIME.match(schedule_string)
+    if match:
+        hour, minute, second = int(match.group(1)), int(match.group(2)), int(match.group(3) or 0)
+        return CronTrigger(f"{minute} {hour} * * *", offset=second)
+
+    if schedule_string.startswith("@") or len(schedule_string.split()) == 5:
+        return CronTrigger(schedule_string)
+
+    raise ValueError(f"Invalid schedule string: {schedule_string}")
+
+
+def spread_phase(name: str, interval: float, max_spread: float = SCHEDULER_MAX_SPREAD) -> float:
+    """
+    A phase offset derived from the name of a job, the same on every start, spreading the jobs sharing an interval
+    over the interval (at most max_spread seconds) instead of running them all at the same time.
+    """
+    spread = min(interval, max_spread)
+    return (zlib.crc32(name.encode()) % 1_000_000) / 1_000_000 * spread
+
+
+class Job:
+    """
+    A job of the scheduler, see Scheduler.add.
+    """
+
+    def __init__(self, name: str, trigger: Trigger, func: Callable, jitter: float):
+        self.name = name
+        self.trigger = trigger
+        self.func = func
+        self.jitter = jitter
+        self.deadline = 0.0
+        self.due_at = 0.0
+        self.cancelled = False
+
+    def schedule_next(self, wall_now: float, monotonic_now: float):
+        """
+        Compute the next deadline, on the monotonic clock.
+        """
+        if isinstance(self.trigger, IntervalTrigger) and self.deadline:
+            # Interval ticks follow each other on the monotonic clock, without drifting
+            due = self.due_at + self.trigger.interval
+            if due <= monotonic_now:
+                # Missed ticks (the scheduler was blocked or the host suspended) are skipped
+                missed = int((monotonic_now - due) // self.trigger.interval) + 1
+                metrics.increment(f"scheduler.{self.name}.missed", missed)
+                due += missed * self.trigger.interval
+        else:
+            # Wall-clock schedules are converted again on each tick, following clock changes
+            due = monotonic_now + self.trigger.next_after(wall_now) - wall_now
+
+        self.due_at = due
+        self.deadline = due + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+
+class Scheduler:
+    """
+    Runs jobs on their schedules, replacing the polling of the schedule library: the deadlines are kept on the
+    monotonic clock, so the ticks neither drift nor depend on the wall clock being adjusted, and the scheduler
+    sleeps until the next deadline instead of polling, supporting sub-second schedules.
+
+    Interval schedules are aligned on the multiples of the interval shifted by a phase derived from the name of
+    the job (see spread_phase), so that the jobs sharing a schedule do not all tick at the same time. A random
+    jitter can be added on top of it. The jobs are expected to return quickly (e.g. by submitting the tick to an
+    ExecutionEngine, which applies the overrun policies), the lateness of each tick is recorded in the
+    scheduler.<name>.lateness_seconds histogram.
+    """
+
+    def __init__(self, max_spread: float = SCHEDULER_MAX_SPREAD):
+        """
+        :param max_spread: The maximum phase offset of the interval schedules, 0 to align them all on the multiples
+            of their interval
+        """
+        self.max_spread = max_spread
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._heap: List[tuple] = []
+        self._counter = itertools.count()
+
+    def add(
+            self, name: str, schedule_string: str, func: Callable, phase: Optional[float] = None, jitter: float = 0.0
+    ) -> Job:
+        """
+        Schedule a job.
+        :param name: The name of the job, used for the phase and the metrics
+        :param schedule_string: The schedule, see parse_schedule
+        :param func: The function run on each tick
+        :param phase: The phase of an interval schedule in seconds, derived from the name by default
+        :param jitter: The maximum random delay added to each tick, in seconds
+        :return: The job, see cancel
+        """
+        trigger = parse_schedule(schedule_string)
+        if isinstance(trigger, IntervalTrigger):
+            trigger.phase = (spread_phase(name, trigger.interval, self.max_spread) if phase is None else phase) % (
+                trigger.interval
+            )
+
+        job = Job(name, trigger, func, jitter)
+        job.schedule_next(time.time(), time.monotonic())
+        self._push(job)
+        return job
+
+    def cancel(self, job: Job):
+        job.cancelled = True
+
+    def _push(self, job: Job):
+        with self._lock:
+            heapq.heappush(self._heap, (job.deadline, next(self._counter), job))
+        self._wakeup.set()
+
+    def run_pending(self) -> Optional[float]:
+        """
+        Run the jobs whose deadline has passed.
+        :return: The time until the next deadline in seconds, None if there is no job
+        """
+        while True:
+            with self._lock:
+                if not self._heap:
+                    return None
+                deadline, _, job = self._heap[0]
+                now = time.monotonic()
+                if deadline > now:
+                    return deadline - now
+                heapq.heappop(self._heap)
+
+            if job.cancelled:
+                continue
+
+            metrics.observe(f"scheduler.{job.name}.lateness_seconds", now - deadline, LATENESS_BUCKETS)
+            try:
+                job.func()
+            except Exception as e:
+                logger.exception(f"Error while running the scheduled job {job.name}: {e}")
+
+            job.schedule_next(time.time(), time.monotonic())
+            self._push(job)
+
+    def run_forever(self):
+        """
+        Run the jobs until stop is called.
+        """
+        while not self._stopped:
+            # Woken up early when a job is added
+            self._wakeup.clear()
+            try:
+                timeout = self.run_pending()
+            except Exception as e:
+                logger.exception(f"Error during scheduler run: {e}")
+                timeout = 1
+
+            self._wakeup.wait(timeout)
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
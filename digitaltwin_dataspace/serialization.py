@@ -0,0 +1,130 @@
+import json
+import math
+import os
+from typing import Any, Callable, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def _default(value: Any) -> Any:
+    # numpy scalars and arrays, without importing numpy
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class JsonSerializer:
+    """
+    Encodes values to JSON bytes and decodes them back.
+    """
+
+    def __init__(self, name: str, dumps: Callable[[Any], bytes], loads: Callable[[Union[bytes, str]], Any]):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+
+def _orjson_serializer() -> JsonSerializer:
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    return JsonSerializer(
+        "orjson",
+        lambda value: orjson.dumps(value, default=_default, option=option),
+        orjson.loads,
+    )
+
+
+def _msgspec_serializer() -> JsonSerializer:
+    encoder = msgspec.json.Encoder(enc_hook=_default)
+    decoder = msgspec.json.Decoder()
+    return JsonSerializer("msgspec", encoder.encode, decoder.decode)
+
+
+def _finite(value: Any) -> Any:
+    # NaN and infinite values replaced by None, as orjson and msgspec encode them
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    if hasattr(value, "tolist") or hasattr(value, "isoformat"):
+        return _finite(_default(value))
+    return value
+
+
+def _json_dumps(value: Any) -> bytes:
+    try:
+        text = json.dumps(value, ensure_ascii=False, separators=(",", ":"), allow_nan=False, default=_default)
+    except ValueError:
+        # Out of range float values, only walked through when there are some
+        text = json.dumps(_finite(value), ensure_ascii=False, separators=(",", ":"), allow_nan=False)
+    return text.encode("utf-8")
+
+
+def _json_serializer() -> JsonSerializer:
+    return JsonSerializer("json", _json_dumps, json.loads)
+
+
+def create_serializer(name: Optional[str] = None) -> JsonSerializer:
+    """
+    Create the serializer of the given backend: "orjson", "msgspec" or "json" (the standard library).
+    :param name: The backend, defaults to the JSON_SERIALIZER environment variable, or to the fastest
+        installed backend if it is not set
+    :return: The serializer
+    """
+    name = name or os.environ.get("JSON_SERIALIZER")
+
+    if name is None:
+        if orjson is not None:
+            return _orjson_serializer()
+        if msgspec is not None:
+            return _msgspec_serializer()
+        return _json_serializer()
+
+    if name == "orjson":
+        if orjson is None:
+            raise RuntimeError("The orjson package is required by the orjson serializer")
+        return _orjson_serializer()
+    if name == "msgspec":
+        if msgspec is None:
+            raise RuntimeError("The msgspec package is required by the msgspec serializer")
+        return _msgspec_serializer()
+    if name == "json":
+        return _json_serializer()
+
+    raise ValueError(f"Invalid JSON serializer: {name}")
+
+
+serializer = create_serializer()
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Encode a value to JSON bytes (UTF-8) with the configured serializer.
+    numpy values and dates are supported, NaN and infinite values are encoded as null. Every backend
+    encodes compactly (no whitespace), giving the same bytes except for the floats written with an exponent
+    (1e16 by orjson and msgspec, 1e+16 by the standard library).
+
+    The encoding is hashed for the deduplication (see write_result), so it must not change between versions.
+    Results serialized before the serializers were introduced (json.dumps with its default ", " and ": "
+    separators and ASCII escapes) have other hashes: the first result identical to one of them is stored again
+    once, the following ones are deduplicated against it.
+    """
+    return serializer.dumps(value)
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """
+    Decode JSON bytes or text with the configured serializer.
+    """
+    return serializer.loads(data)
@@ -1,13 +1,12 @@
-import json
 import geopandas as gpd
 import pandas as pd
 import shapely
-import requests
 import dotenv
 
 dotenv.load_dotenv()
 
 from digitaltwin_dataspace import Collector, ComponentConfiguration, run_components
+from digitaltwin_dataspace.geojson import feature_collection
 
 class BoltGeofenceCollector(Collector):
     def get_schedule(self) -> str:
@@ -18,13 +17,13 @@ class BoltGeofenceCollector(Collector):
             name="bolt_geofence_collector",
             tags=["Bolt", "Geofence"],
             description="Collecte les zones de géorepérage Bolt à Bruxelles",
-            content_type="application/json"
+            content_type="application/json",
+            deduplicate=True
         )
 
     def collect(self) -> bytes:
         endpoint = "https://mds.bolt.eu/gbfs/2/336/geofencing_zones"
-        response = requests.get(endpoint)
-        return response.content
+        return self.http.get_content(endpoint, conditional=True)
 
 class BoltVehiclePositionCollector(Collector):
     def get_schedule(self) -> str:
@@ -35,41 +34,16 @@ class BoltVehiclePositionCollector(Collector):
             name="bolt_vehicle_position_collector",
             tags=["Bolt", "Vehicle", "Position"],
             description="Collecte les positions des véhicules Bolt à Bruxelles",
-            content_type="application/geo+json"
+            content_type="application/geo+json",
+            compression="zstd"
         )
 
     def collect(self) -> bytes:
         endpoint = "https://mds.bolt.eu/gbfs/2/336/free_bike_status"
-        response_json = requests.get(endpoint).json()
+        response_json = self.http.get(endpoint).json()
         bikes = response_json["data"]["bikes"]
 
-        features = []
-        for bike in bikes:
-            # Construire le GeoJSON manuellement
-            feature = {
-                "type": "Feature",
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [bike["lon"], bike["lat"]]
-                },
-                "properties": {
-                    k: v for k, v in bike.items()
-                    if k not in ["lat", "lon", "rental_uris"]
-                }
-            }
-
-            # Ajouter rental_uris proprement
-            if "rental_uris" in bike:
-                feature["properties"]["rental_uris"] = bike["rental_uris"]
-
-            features.append(feature)
-
-        geojson = {
-            "type": "FeatureCollection",
-            "features": features
-        }
-
-        return json.dumps(geojson).encode("utf-8")
+        return feature_collection(bikes, longitude="lon", latitude="lat")
 
 
 
@@ -87,7 +61,7 @@ class BoltVehicleTypeCollector(Collector):
 
     def collect(self) -> bytes:
         endpoint = "https://mds.bolt.eu/gbfs/2/336/vehicle_types"
-        response = requests.get(endpoint)
+        response = self.http.get(endpoint)
         return response.content
 
 run_components([
@@ -1,4 +1,3 @@
-import requests
 import dotenv
 
 dotenv.load_dotenv()
@@ -19,7 +18,7 @@ class BrusselsMobilityBikeCountersCollector(Collector):
 
     def collect(self) -> bytes:
         endpoint = "https://data.mobility.brussels/bike/api/counts/?request=devices"
-        response = requests.get(endpoint)
+        response = self.http.get(endpoint)
         response.raise_for_status()
         return response.content
 
@@ -37,7 +36,7 @@ class BrusselsMobilityBikeCountsCollector(Collector):
 
     def collect(self) -> bytes:
         endpoint = "https://data.mobility.brussels/bike/api/counts/?request=live"
-        response = requests.get(endpoint)
+        response = self.http.get(endpoint)
         response.raise_for_status()
         return response.content
 
@@ -50,12 +49,13 @@ class BrusselsMobilityTrafficDevicesCollector(Collector):
             name="brussels_mobility_traffic_devices_collector",
             tags=["Brussels", "Mobility", "Traffic", "Devices"],
             description="Collecte les métadonnées des compteurs trafic de Brussels Mobility",
-            content_type="application/json"
+            content_type="application/json",
+            delta_keyframe_interval=60
         )
 
     def collect(self) -> bytes:
         endpoint = "https://data.mobility.brussels/traffic/api/counts/?request=devices"
-        response = requests.get(endpoint)
+        response = self.http.get(endpoint)
         response.raise_for_status()
         return response.content
 
@@ -73,7 +73,7 @@ class BrusselsMobilityTrafficCountsCollector(Collector):
 
     def collect(self) -> bytes:
         endpoint = "https://data.mobility.brussels/traffic/api/counts/?request=live"
-        response = requests.get(endpoint)
+        response = self.http.get(endpoint)
         response.raise_for_status()
         return response.content
 
@@ -1,5 +1,4 @@
 import os
-import requests
 import dotenv
 
 dotenv.load_dotenv()
@@ -20,9 +19,7 @@ class DeLijnGTFSStaticCollector(Collector):
 
     def collect(self) -> bytes:
         url = "https://gtfs.irail.be/de-lijn/de_lijn-gtfs.zip"
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.content
+        return self.http.get_content(url, conditional=True)
 
 class DeLijnGTFSRealtimeCollector(Collector):
     def get_schedule(self) -> str:
@@ -38,7 +35,7 @@ class DeLijnGTFSRealtimeCollector(Collector):
 
     def collect(self) -> bytes:
         endpoint = "https://api.delijn.be/gtfs/v3/realtime?json=false&delay=true&canceled=true"
-        response = requests.get(
+        response = self.http.get(
             endpoint, headers={"Ocp-Apim-Subscription-Key": os.environ["DE_LIJN_API_KEY"]}
         )
         response.raise_for_status()
@@ -1,13 +1,12 @@
-import json
 import geopandas as gpd
 import pandas as pd
 import shapely
-import requests
 import dotenv
 
 dotenv.load_dotenv()
 
 from digitaltwin_dataspace import Collector, ComponentConfiguration, run_components
+from digitaltwin_dataspace.geojson import feature_collection
 
 class DottGeofenceCollector(Collector):
     def get_schedule(self) -> str:
@@ -23,8 +22,7 @@ class DottGeofenceCollector(Collector):
 
     def collect(self) -> bytes:
         endpoint = "https://gbfs.api.ridedott.com/public/v2/brussels/geofencing_zones.json"
-        response = requests.get(endpoint)
-        return response.content
+        return self.http.get_content(endpoint, conditional=True)
 
 class DottVehiclePositionCollector(Collector):
     def get_schedule(self) -> str:
@@ -35,36 +33,17 @@ class DottVehiclePositionCollector(Collector):
             name="dott_vehicle_position_collector",
             tags=["Dott", "Vehicle", "Position"],
             description="Collecte les positions des véhicules Dott à Bruxelles",
-            content_type="application/geo+json"
+            content_type="application/geo+json",
+            compression="zstd"
         )
 
     def collect(self) -> bytes:
         endpoint = "https://gbfs.api.ridedott.com/public/v2/brussels/free_bike_status.json"
-        response = requests.get(endpoint)
+        response = self.http.get(endpoint)
         response.raise_for_status()
         bikes = response.json()["data"]["bikes"]
 
-        features = []
-        for bike in bikes:
-            feature = {
-                "type": "Feature",
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [bike["lon"], bike["lat"]],
-                },
-                "properties": {
-                    k: v for k, v in bike.items()
-                    if k not in ["lat", "lon"]
-                }
-            }
-            features.append(feature)
-
-        geojson = {
-            "type": "FeatureCollection",
-            "features": features
-        }
-
-        return json.dumps(geojson).encode("utf-8")
+        return feature_collection(bikes, longitude="lon", latitude="lat")
 
 class DottVehicleTypeCollector(Collector):
     def get_schedule(self) -> str:
@@ -80,7 +59,7 @@ class DottVehicleTypeCollector(Collector):
 
     def collect(self) -> bytes:
         endpoint = "https://gbfs.api.ridedott.com/public/v2/brussels/vehicle_types.json"
-        response = requests.get(endpoint)
+        response = self.http.get(endpoint)
         return response.content
 
 run_components([
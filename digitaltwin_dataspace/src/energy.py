@@ -1,7 +1,5 @@
-import json
 
 import dotenv
-import requests
 
 dotenv.load_dotenv()
 
@@ -19,12 +17,13 @@ class EnergyCollection(Collector):
             tags=["Energy"],
             description="Collects data from Energy API",
             content_type="application/json",
+            buffered=True,
         )
 
     def collect(self) -> bytes:
-        response = requests.get("http://api.el.sc.ulb.be/energy")
+        response = self.http.get("http://api.el.sc.ulb.be/energy")
         response.raise_for_status()
-        return json.dumps(response.json()).encode("utf-8")
+        return self.to_json(response.json())
 
 if __name__ == "__main__":
     run_components([
@@ -1,5 +1,4 @@
 import dotenv
-import requests
 
 dotenv.load_dotenv()
 
@@ -19,7 +18,7 @@ class InfrabelLineSectionCollector(Collector):
 
     def collect(self) -> bytes:
         endpoint = "https://opendata.infrabel.be/api/explore/v2.1/catalog/datasets/geosporen/exports/geojson?lang=fr&timezone=Europe%2FBerlin"
-        return requests.get(endpoint).content
+        return self.http.get(endpoint).content
 
 class InfrabelOperationalPointsCollector(Collector):
     def get_schedule(self) -> str:
@@ -30,12 +29,13 @@ class InfrabelOperationalPointsCollector(Collector):
             name="infrabel_operational_points_collector",
             tags=["Infrabel", "GeoJSON", "Points opérationnels"],
             description="Collecte les points opérationnels du réseau Infrabel (GeoJSON)",
-            content_type="application/geo+json"
+            content_type="application/geo+json",
+            delta_keyframe_interval=36
         )
 
     def collect(self) -> bytes:
         endpoint = "https://opendata.infrabel.be/api/explore/v2.1/catalog/datasets/operationele-punten-van-het-netwerk/exports/geojson?lang=fr&timezone=Europe%2FBerlin"
-        return requests.get(endpoint).content
+        return self.http.get(endpoint).content
 
 class InfrabelPunctualityCollector(Collector):
     def get_schedule(self) -> str:
@@ -51,7 +51,7 @@ class InfrabelPunctualityCollector(Collector):
 
     def collect(self) -> bytes:
         endpoint = "https://opendata.infrabel.be/api/explore/v2.1/catalog/datasets/ruwe-gegevens-van-stiptheid-d-1/exports/json?lang=fr&timezone=Europe%2FBerlin"
-        return requests.get(endpoint).content
+        return self.http.get(endpoint).content
 
 class InfrabelSegmentsCollector(Collector):
     def get_schedule(self) -> str:
@@ -67,7 +67,7 @@ class InfrabelSegmentsCollector(Collector):
 
     def collect(self) -> bytes:
         endpoint = "https://infrabel.opendatasoft.com/api/explore/v2.1/catalog/datasets/station_to_station/exports/geojson?lang=fr&timezone=Europe%2FBerlin"
-        return requests.get(endpoint).content
+        return self.http.get(endpoint).content
 
 run_components([
     InfrabelLineSectionCollector(),
@@ -1,7 +1,6 @@
 import json
 import geopandas as gpd
 import pandas as pd
-import requests
 import dotenv
 
 dotenv.load_dotenv()
@@ -22,7 +21,7 @@ class IrcelineSOSCollector(Collector):
 
     def collect(self) -> bytes:
         endpoint = "https://geo.irceline.be/sos/api/v1/timeseries/?expanded=true"
-        response = requests.get(endpoint)
+        response = self.http.get(endpoint)
         response.raise_for_status()
 
         response_json = response.json()
@@ -2,12 +2,12 @@ import json
 import geopandas as gpd
 import pandas as pd
 import shapely
-import requests
 import dotenv
 
 dotenv.load_dotenv()
 
-from digitaltwin_dataspace import Collector, ComponentConfiguration, run_components
+from digitaltwin_dataspace import Collector, Compactor, ComponentConfiguration, run_components
+from digitaltwin_dataspace.data.columnar import PARQUET_STORAGE
 
 class LimeVehiclePositionCollector(Collector):
     def get_schedule(self) -> str:
@@ -18,12 +18,14 @@ class LimeVehiclePositionCollector(Collector):
             name="lime_vehicle_position_collector",
             tags=["Lime", "Vehicle", "Position"],
             description="Collecte les positions des véhicules Lime à Bruxelles",
-            content_type="application/geo+json"
+            content_type="application/geo+json",
+            compression="zstd",
+            storage_format="parquet" if PARQUET_STORAGE else None,
         )
 
     def collect(self) -> bytes:
         endpoint = "https://data.lime.bike/api/partners/v2/gbfs/brussels/free_bike_status"
-        response_json = requests.get(endpoint).json()
+        response_json = self.http.get(endpoint).json()
         response_df = pd.json_normalize(response_json["data"]["bikes"])
         response_gdf = gpd.GeoDataFrame(
             response_df,
@@ -50,10 +52,11 @@ class LimeVehicleTypeCollector(Collector):
 
     def collect(self) -> bytes:
         endpoint = "https://data.lime.bike/api/partners/v2/gbfs/brussels/vehicle_types"
-        response = requests.get(endpoint)
+        response = self.http.get(endpoint)
         return response.content
 
 run_components([
     LimeVehiclePositionCollector(),
-    LimeVehicleTypeCollector()
+    LimeVehicleTypeCollector(),
+    *([Compactor("lime_vehicle_position_collector")] if PARQUET_STORAGE else []),
 ])
@@ -1,11 +1,11 @@
 import dotenv
-import requests
 
 dotenv.load_dotenv()
 
-from digitaltwin_dataspace import run_components, Collector, ComponentConfiguration
+from digitaltwin_dataspace import run_components, Collector, Compactor, ComponentConfiguration
+from digitaltwin_dataspace.data.columnar import PARQUET_STORAGE
+from digitaltwin_dataspace.geojson import feature_collection
 import pandas as pd
-import json
 
 
 class OpenSkyCollector(Collector):
@@ -19,26 +19,24 @@ class OpenSkyCollector(Collector):
             tags=["OpenSky+"],
             description="Collects data from OpenSky APIs",
             content_type="application/json",
+            compression="zstd",
+            storage_format="parquet" if PARQUET_STORAGE else None,
         )
 
     def collect(self) -> bytes:
-        import math  # nécessaire pour vérifier NaN dans alt
         api_url = (
             "https://opensky-network.org/api/states/all"
             "?lamin=50.775029&lomin=4.193481&lamax=50.962233&lomax=4.578003"
         )
 
-        response = requests.get(api_url)
+        response = self.http.get(api_url)
         response.raise_for_status()
 
         data = response.json()
         states = data.get("states", [])
 
         if not states:
-            return json.dumps({
-                "type": "FeatureCollection",
-                "features": []
-            }).encode("utf-8")
+            return feature_collection([])
 
         columns = [
             "icao24", "callsign", "origin_country", "time_position", "last_contact",
@@ -47,40 +45,10 @@ class OpenSkyCollector(Collector):
         ]
 
         df = pd.DataFrame(states, columns=columns)
-        df = df.dropna(subset=["latitude", "longitude"])
 
-        features = []
-        for i, row in df.iterrows():
-            lon = row["longitude"]
-            lat = row["latitude"]
-            alt = row["geo_altitude"]
-
-            if alt is None or (isinstance(alt, float) and math.isnan(alt)):
-                alt = 0
-
-            props = {}
-            for k, v in row.items():
-                if k in ["longitude", "latitude", "geo_altitude"]:
-                    continue
-                if isinstance(v, float) and math.isnan(v):
-                    v = None
-                props[k] = v
-
-            features.append({
-                "type": "Feature",
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [lon, lat, alt]
-                },
-                "properties": props,
-                "id": row["icao24"] or str(i)
-            })
-
-        return json.dumps({
-            "type": "FeatureCollection",
-            "features": features
-        }, ensure_ascii=False, allow_nan=False).encode("utf-8")
+        return feature_collection(df, altitude="geo_altitude", default_altitude=0, id="icao24", id_from_index=True)
 
 run_components([
-    OpenSkyCollector()
+    OpenSkyCollector(),
+    *([Compactor("opensky_collector")] if PARQUET_STORAGE else []),
 ])
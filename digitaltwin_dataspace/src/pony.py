@@ -1,14 +1,13 @@
-import json
 import geopandas as gpd
 import pandas as pd
 import shapely
-import requests
 from requests import JSONDecodeError
 import dotenv
 
 dotenv.load_dotenv()
 
 from digitaltwin_dataspace import Collector, ComponentConfiguration, run_components
+from digitaltwin_dataspace.geojson import feature_collection
 
 class PonyGeofenceCollector(Collector):
     def get_schedule(self) -> str:
@@ -24,8 +23,7 @@ class PonyGeofenceCollector(Collector):
 
     def collect(self) -> bytes:
         endpoint = "https://gbfs.getapony.com/v1/Brussels/en/geofencing_zones.json"
-        response = requests.get(endpoint)
-        return response.content
+        return self.http.get_content(endpoint, conditional=True)
 
 class PonyVehiclePositionCollector(Collector):
     def get_schedule(self) -> str:
@@ -36,44 +34,19 @@ class PonyVehiclePositionCollector(Collector):
             name="pony_vehicle_position_collector",
             tags=["Pony", "Vehicle", "Position"],
             description="Collecte les positions des véhicules Pony à Bruxelles",
-            content_type="application/geo+json"
+            content_type="application/geo+json",
+            compression="zstd"
         )
 
     def collect(self) -> bytes:
         endpoint = "https://gbfs.getapony.com/v1/Brussels/en/free_bike_status.json"
-        response = requests.get(endpoint)
+        response = self.http.get(endpoint)
 
         try:
             response_json = response.json()
             bikes = response_json["data"]["bikes"]
 
-            features = []
-            for bike in bikes:
-                # Construire manuellement le GeoJSON
-                feature = {
-                    "type": "Feature",
-                    "geometry": {
-                        "type": "Point",
-                        "coordinates": [bike["lon"], bike["lat"]]
-                    },
-                    "properties": {
-                        k: v for k, v in bike.items()
-                        if k not in ["lat", "lon", "rental_uris"]
-                    }
-                }
-
-                # Ajouter rental_uris s’il existe
-                if "rental_uris" in bike:
-                    feature["properties"]["rental_uris"] = bike["rental_uris"]
-
-                features.append(feature)
-
-            geojson = {
-                "type": "FeatureCollection",
-                "features": features
-            }
-
-            return json.dumps(geojson).encode("utf-8")
+            return feature_collection(bikes, longitude="lon", latitude="lat")
 
         except JSONDecodeError:
             raise Exception("Pony API is not available, returned: " + response.text)
@@ -92,7 +65,7 @@ class PonyVehicleTypeCollector(Collector):
 
     def collect(self) -> bytes:
         endpoint = "https://gbfs.getapony.com/v1/Brussels/en/vehicle_types.json"
-        response = requests.get(endpoint)
+        response = self.http.get(endpoint)
         return response.content
 
 run_components([
@@ -1,11 +1,9 @@
-import json
-
 import dotenv
-import requests
 
 dotenv.load_dotenv()
 
 from digitaltwin_dataspace import run_components, Collector, ComponentConfiguration
+from digitaltwin_dataspace.geojson import feature_collection
 
 
 class SibelgaCollector(Collector):
@@ -23,33 +21,13 @@ class SibelgaCollector(Collector):
 
     def collect(self) -> bytes:
         api_url = "https://www.sibelga.be/fr/chantiers-data/data"
-        response = requests.get(api_url)
+        response = self.http.get(api_url)
         response.raise_for_status()
 
         data = response.json()
         items = data.get("items", [])
 
-        features = []
-        for item in items:
-            lat = item.get("latitude")
-            lon = item.get("longitude")
-            if lat is not None and lon is not None:
-                item_copy = {k: v for k, v in item.items() if k not in ["latitude", "longitude"]}
-                features.append({
-                    "type": "Feature",
-                    "geometry": {
-                        "type": "Point",
-                        "coordinates": [lon, lat]
-                    },
-                    "properties": item_copy
-                })
-
-        geojson = {
-            "type": "FeatureCollection",
-            "features": features
-        }
-
-        return json.dumps(geojson).encode("utf-8")
+        return feature_collection(items)
 
 
 if __name__ == "__main__":
@@ -1,5 +1,4 @@
 import dotenv
-import requests
 
 dotenv.load_dotenv()
 
@@ -14,12 +13,13 @@ class SNCBGTFSStaticCollector(Collector):
             name="sncb_gtfs_static_collector",
             tags=["SNCB", "GTFS"],
             description="Collecte les données GTFS statiques de la SNCB",
-            content_type="application/zip"
+            content_type="application/zip",
+            deduplicate=True
         )
     
     def collect(self) -> bytes:
         endpoint = "https://sncb-opendata.hafas.de/gtfs/static/c21ac6758dd25af84cca5b707f3cb3de"
-        return requests.get(endpoint).content
+        return self.http.get_content(endpoint, conditional=True)
 
 class SNCBGTFSRealtimeCollector(Collector):
     def get_schedule(self) -> str:
@@ -35,7 +35,7 @@ class SNCBGTFSRealtimeCollector(Collector):
     
     def collect(self) -> bytes:
         endpoint = "https://sncb-opendata.hafas.de/gtfs/realtime/c21ac6758dd25af84cca5b707f3cb3de"
-        response = requests.get(endpoint)
+        response = self.http.get(endpoint)
         if response.status_code >= 500:
             raise ValueError("SNCB gtfs realtime is down.")
         return response.content
@@ -1,18 +1,84 @@
+import hashlib
 import json
+import os
+import tempfile
 import dotenv
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from itertools import chain, product
-from typing import Dict, List
+from typing import Dict, List, Tuple, Iterator
 
 import geopandas as gpd
 import pandas as pd
 import requests
 import shapely
-from bs4 import BeautifulSoup
+from lxml import etree, html
 
 dotenv.load_dotenv()
 
-from digitaltwin_dataspace import run_components, Collector, ComponentConfiguration
+from digitaltwin_dataspace import run_components, Collector, Compactor, ComponentConfiguration
+from digitaltwin_dataspace.data.columnar import PARQUET_STORAGE
+
+SCRAPING_WORKERS = int(os.environ.get("STIB_SCRAPING_WORKERS", 16))
+# Where the stops of the line pages are kept between the runs, which are separate processes with the "process"
+# execution engine
+LINE_CACHE_DIRECTORY = os.environ.get(
+    "STIB_LINE_CACHE_DIRECTORY", os.path.join(tempfile.gettempdir(), "digitaltwin_dataspace_stib")
+)
+
+# Stops of each (line, direction) page, along with the hash of the page they were parsed from
+_line_cache: Dict[tuple, Tuple[str, List[dict]]] = {}
+
+
+def _line_cache_path(line, direction: str) -> str:
+    return os.path.join(LINE_CACHE_DIRECTORY, f"{line}_{direction}.json")
+
+
+def _get_cached_line_stops(line, direction: str, digest: str):
+    """
+    Get the stops parsed from the same page by this process, or by a previous run from the line cache directory.
+    :return: The stops, None if the page changed or was never parsed
+    """
+    cached = _line_cache.get((line, direction))
+    if cached is None:
+        try:
+            with open(_line_cache_path(line, direction), "r") as file:
+                cached = tuple(json.load(file))
+        except (OSError, ValueError):
+            return None
+        _line_cache[(line, direction)] = cached
+
+    return cached[1] if cached[0] == digest else None
+
+
+def _cache_line_stops(line, direction: str, digest: str, stops: List[dict]):
+    _line_cache[(line, direction)] = (digest, stops)
+    try:
+        os.makedirs(LINE_CACHE_DIRECTORY, exist_ok=True)
+        path = _line_cache_path(line, direction)
+        with open(path + ".tmp", "w") as file:
+            json.dump([digest, stops], file)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        print(f"Erreur d'écriture du cache de la ligne {line} direction {direction}: {e}")
+
+# The list items having the thermometer__stop class, among others (as BeautifulSoup's class_ matches)
+_STOP_ELEMENTS = etree.XPath('//li[contains(concat(" ", normalize-space(@class), " "), " thermometer__stop ")]')
+
+
+def _parse_thermometer_stops(page: bytes) -> Iterator[Tuple[str, str]]:
+    """
+    Extract the id and name of the stops (the "thermometer__stop" list items) of a line page with lxml,
+    as the BeautifulSoup parsing it replaces did.
+    """
+    if not page.strip():
+        return
+    for element in _STOP_ELEMENTS(html.fromstring(page)):
+        # BeautifulSoup collapses the whitespace-only strings to a newline (dropped below) or a space
+        text = "".join(
+            ("\n" if "\n" in string else " ") if string.isspace() else string for string in element.itertext()
+        )
+        yield element.get("id"), text.replace("\n", "").strip()
 
 
 class STIBGTFSCollector(Collector):
@@ -29,9 +95,7 @@ class STIBGTFSCollector(Collector):
 
     def collect(self) -> bytes:
         endpoint = "https://stibmivb.opendatasoft.com/api/explore/v2.1/catalog/datasets/gtfs-files-production/alternative_exports/gtfszip/"
-        response = requests.get(endpoint, timeout=10)
-        response.raise_for_status()
-        return response.content
+        return self.http.get_content(endpoint, conditional=True, timeout=10)
 
 
 class STIBShapeFilesCollector(Collector):
@@ -43,14 +107,13 @@ class STIBShapeFilesCollector(Collector):
             name="stib_shapefiles_collector",
             tags=["STIB", "GeoJSON", "Shapefiles"],
             description="Collecte les shapefiles du réseau STIB en format GeoJSON",
-            content_type="application/geo+json"
+            content_type="application/geo+json",
+            deduplicate=True
         )
 
     def collect(self) -> bytes:
         endpoint = "https://stibmivb.opendatasoft.com/api/explore/v2.1/catalog/datasets/shapefiles-production/exports/geojson"
-        response = requests.get(endpoint, timeout=10)
-        response.raise_for_status()
-        return response.content
+        return self.http.get_content(endpoint, conditional=True, timeout=10)
 
 
 class STIBVehiclePositionsCollector(Collector):
@@ -62,19 +125,21 @@ class STIBVehiclePositionsCollector(Collector):
             name="stib_vehicle_positions_collector",
             tags=["STIB", "Vehicle", "Positions", "Real-time"],
             description="Collecte les positions des véhicules STIB en temps réel",
-            content_type="application/json"
+            content_type="application/json",
+            storage_format="parquet" if PARQUET_STORAGE else None,
+            buffered=True,
         )
 
     def collect(self) -> bytes:
         endpoint = "https://stibmivb.opendatasoft.com/api/explore/v2.1/catalog/datasets/vehicle-position-rt-production/records"
 
         try:
-            response = requests.get(endpoint, params={"limit": 100}, timeout=10)
+            response = self.http.get(endpoint, params={"limit": 100}, timeout=10)
             response.raise_for_status()
             data = response.json()
         except (requests.RequestException, json.JSONDecodeError) as e:
             print(f"Erreur lors de la récupération des positions de véhicules : {e}")
-            return json.dumps([]).encode('utf-8')
+            return self.to_json([])
 
         raw_results = data.get("results", [])
         results = []
@@ -88,7 +153,7 @@ class STIBVehiclePositionsCollector(Collector):
             except json.JSONDecodeError:
                 continue
 
-        return json.dumps(results).encode('utf-8')
+        return self.to_json(results)
 
 
 class STIBStopsCollector(Collector):
@@ -123,10 +188,10 @@ class STIBStopsCollector(Collector):
         with_coords = merged[merged["stop_lat"].notnull() & merged["stop_lon"].notnull()]
 
         if with_coords.empty:
-            return json.dumps({
+            return self.to_json({
                 "type": "FeatureCollection",
                 "features": []
-            }).encode('utf-8')
+            })
 
         gdf = gpd.GeoDataFrame(
             with_coords,
@@ -137,43 +202,14 @@ class STIBStopsCollector(Collector):
         return gdf.to_json().encode('utf-8')
 
     def _fetch_stops_by_scraping(self) -> pd.DataFrame:
-        stops_data = []
         direction_choice = ("V", "F")
         noctis = ["N04", "N05", "N06", "N08", "N09", "N10", "N11", "N12", "N13", "N16", "N18"]
+        lines = list(product(chain(range(1, 100), noctis), direction_choice))
 
-        for line, direction in product(chain(range(1, 100), noctis), direction_choice):
-            try:
-                url = (
-                    f"https://www.stib-mivb.be/irj/servlet/prt/portal/prtroot/"
-                    f"pcd!3aportal_content!2fSTIBMIVB!2fWebsite!2fFrontend!2fPublic!2f"
-                    f"iViews!2fcom.stib.HorairesServletService"
-                    f"?l=fr&_line={line}&_directioncode={direction}&_mode=rt"
-                )
-
-                response = requests.get(url, timeout=10)
-                if response.status_code != 200:
-                    continue
-
-                soup = BeautifulSoup(response.content, "html.parser")
-                li_elements = soup.find_all("li", class_="thermometer__stop")
-
-                for sequence, li in enumerate(li_elements):
-                    stop_id = li.get("id")
-                    stop_name = li.text.replace("\n", "").strip()
-
-                    if stop_id and stop_name:
-                        stops_data.append({
-                            "route_short_name": str(line).replace("T", ""),
-                            "direction_id": direction,
-                            "direction": 0 if direction == "V" else 1,
-                            "stop_id": stop_id,
-                            "stop_name": stop_name,
-                            "stop_sequence": sequence,
-                        })
-
-            except Exception as e:
-                print(f"Erreur scraping ligne {line} direction {direction}: {e}")
-                continue
+        # The pages are fetched concurrently, the order of the lines is kept
+        with ThreadPoolExecutor(max_workers=SCRAPING_WORKERS) as executor:
+            results = executor.map(lambda args: self._fetch_line_stops(*args), lines)
+            stops_data = list(chain.from_iterable(results))
 
         df = pd.DataFrame(stops_data)
         if not df.empty:
@@ -181,13 +217,53 @@ class STIBStopsCollector(Collector):
 
         return df
 
+    def _fetch_line_stops(self, line, direction: str) -> List[dict]:
+        try:
+            url = (
+                f"https://www.stib-mivb.be/irj/servlet/prt/portal/prtroot/"
+                f"pcd!3aportal_content!2fSTIBMIVB!2fWebsite!2fFrontend!2fPublic!2f"
+                f"iViews!2fcom.stib.HorairesServletService"
+                f"?l=fr&_line={line}&_directioncode={direction}&_mode=rt"
+            )
+
+            response = self.http.get(url, timeout=10, endpoint="www.stib-mivb.be/horaires")
+            if response.status_code != 200:
+                return []
+
+            # Unchanged pages are not parsed again
+            digest = hashlib.md5(response.content).hexdigest()
+            cached = _get_cached_line_stops(line, direction, digest)
+            if cached is not None:
+                return cached
+
+            stops = [
+                {
+                    "route_short_name": str(line).replace("T", ""),
+                    "direction_id": direction,
+                    "direction": 0 if direction == "V" else 1,
+                    "stop_id": stop_id,
+                    "stop_name": stop_name,
+                    "stop_sequence": sequence,
+                }
+                for sequence, (stop_id, stop_name) in enumerate(_parse_thermometer_stops(response.content))
+                if stop_id and stop_name
+            ]
+            _cache_line_stops(line, direction, digest, stops)
+            return stops
+
+        except Exception as e:
+            print(f"Erreur scraping ligne {line} direction {direction}: {e}")
+            return []
+
     def _convert_stop_ids_to_generic(self, stop_ids):
         return stop_ids.astype(str).str.replace(r'[^0-9]', '', regex=True)
 
 
-run_components([
-    STIBGTFSCollector(),
-    STIBShapeFilesCollector(),
-    STIBVehiclePositionsCollector(),
-    STIBStopsCollector(),
-])
+if __name__ == "__main__":
+    run_components([
+        STIBGTFSCollector(),
+        STIBShapeFilesCollector(),
+        STIBVehiclePositionsCollector(),
+        STIBStopsCollector(),
+        *([Compactor("stib_vehicle_positions_collector")] if PARQUET_STORAGE else []),
+    ])
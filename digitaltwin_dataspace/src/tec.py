@@ -1,5 +1,4 @@
 import dotenv
-import requests
 
 dotenv.load_dotenv()
 
@@ -19,7 +18,7 @@ class TECGTFSStaticCollector(Collector):
 
     def collect(self) -> bytes:
         endpoint = "https://opendata.tec-wl.be/Current%20GTFS/TEC-GTFS.zip"
-        return requests.get(endpoint).content
+        return self.http.get_content(endpoint, conditional=True)
 
 class TECGTFSRealtimeCollector(Collector):
     def get_schedule(self) -> str:
@@ -35,7 +34,7 @@ class TECGTFSRealtimeCollector(Collector):
 
     def collect(self) -> bytes:
         endpoint = "https://gtfsrt.tectime.be/proto/RealTime/trips?key=DDEBFA42173D45C08E710C7E9DDE8BDE"
-        return requests.get(endpoint).content
+        return self.http.get(endpoint).content
 
 run_components([
     TECGTFSStaticCollector(),
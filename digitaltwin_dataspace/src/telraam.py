@@ -1,6 +1,5 @@
 import os
 import dotenv
-import requests
 
 dotenv.load_dotenv()
 
@@ -19,7 +18,7 @@ class TelraamTrafficCollector(Collector):
         )
 
     def collect(self) -> bytes:
-        response = requests.get(
+        response = self.http.get(
             "https://telraam-api.net/v1/reports/traffic_snapshot_live",
             headers={"X-Api-Key": os.environ["TELRAAM_API_KEY"]},
         )
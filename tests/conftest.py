@@ -0,0 +1,74 @@
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+import pytest
+
+# The storage and database are configured by the environment when the package is imported
+_directory = tempfile.mkdtemp(prefix="dataspace-tests-")
+os.environ.setdefault("FILE_STORAGE_DIRECTORY", os.path.join(_directory, "storage"))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_directory, 'database.db')}")
+
+from digitaltwin_dataspace.data.storage import StorageManager  # noqa: E402
+from digitaltwin_dataspace.data.sync_db import get_or_create_standard_component_table  # noqa: E402
+
+
+@pytest.fixture
+def table_name() -> str:
+    return f"test_{uuid.uuid4().hex[:12]}"
+
+
+@pytest.fixture
+def table(table_name):
+    return get_or_create_standard_component_table(table_name)
+
+
+class MemoryStorage(StorageManager):
+    """
+    A storage keeping the files in memory, failing the writes of the names in fail_on and recording how many
+    reads and writes ran at the same time, standing for a remote storage.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.files = {}
+        self.fail_on = set()
+        self.delay = delay
+        self.max_concurrency = 0
+        self._running = 0
+        self._lock = threading.Lock()
+
+    def _call(self, func):
+        with self._lock:
+            self._running += 1
+            self.max_concurrency = max(self.max_concurrency, self._running)
+        try:
+            time.sleep(self.delay)
+            return func()
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def write(self, file_name: str, data: bytes) -> str:
+        def write():
+            if file_name in self.fail_on:
+                raise OSError(f"Failed to write {file_name}")
+            self.files[f"memory://{file_name}"] = data
+            return f"memory://{file_name}"
+
+        return self._call(write)
+
+    def read(self, file_name: str) -> bytes:
+        return self._call(lambda: self.files[file_name])
+
+    def delete(self, file_name: str):
+        del self.files[file_name]
+
+
+@pytest.fixture
+def memory_storage(monkeypatch) -> MemoryStorage:
+    storage = MemoryStorage(delay=0.01)
+    for module in ("write", "retrieve", "retention", "migrate"):
+        monkeypatch.setattr(f"digitaltwin_dataspace.data.{module}.storage_manager", storage)
+    return storage
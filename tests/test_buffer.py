@@ -0,0 +1,112 @@
+import os
+from datetime import datetime, timedelta
+from multiprocessing import Process
+
+from sqlalchemy import select
+
+from digitaltwin_dataspace.data.buffer import WriteBuffer
+from digitaltwin_dataspace.data.engine import engine
+from digitaltwin_dataspace.data.sync_db import get_or_create_standard_component_table
+
+
+def _dates(table):
+    with engine.connect() as connection:
+        return list(connection.execute(select(table.c.date).order_by(table.c.date.asc())).scalars())
+
+
+def _append(buffer: WriteBuffer, name: str, start: datetime, count: int):
+    for index in range(count):
+        buffer.append(name, "application/json", b'{"index": %d}' % index, start + timedelta(seconds=index))
+
+
+def test_flush_writes_and_coalesces(tmp_path, table_name, table):
+    buffer = WriteBuffer(str(tmp_path), batch_size=100)
+    start = datetime(2025, 1, 1)
+    _append(buffer, table_name, start, 3)
+    buffer.append(table_name, "application/json", b'{"index": "last"}', start + timedelta(seconds=2))
+
+    assert buffer.flush() == 4
+    assert _dates(table) == [start + timedelta(seconds=index) for index in range(3)]
+    assert buffer.backlog() == 0
+
+
+def test_sealed_segment_keeps_its_offset(tmp_path, table_name, table):
+    buffer = WriteBuffer(str(tmp_path), batch_size=100, segment_bytes=1024 * 1024)
+    start = datetime(2025, 1, 1)
+    _append(buffer, table_name, start, 3)
+    buffer.flush()
+
+    # Sealed once flushed, by the process still appending to it
+    buffer._seal_segment()
+
+    assert buffer.backlog() == 0
+    assert buffer.flush() == 0
+    assert len(_dates(table)) == 3
+    assert not any(name.endswith(".offset") for name in os.listdir(tmp_path))
+
+
+def test_replay_after_crash_writes_once(tmp_path, table_name, table):
+    buffer = WriteBuffer(str(tmp_path), batch_size=100)
+    start = datetime(2025, 1, 1)
+    _append(buffer, table_name, start, 3)
+    buffer.flush()
+
+    # A crash after the write, before the offsets were persisted
+    for name in os.listdir(tmp_path):
+        if name.endswith(".offset"):
+            os.remove(tmp_path / name)
+    _append(buffer, table_name, start + timedelta(minutes=1), 2)
+
+    restarted = WriteBuffer(str(tmp_path), batch_size=100)
+    assert restarted.flush() == 5
+    assert len(_dates(table)) == 5
+
+
+def _append_torn(directory: str, name: str, start: datetime):
+    buffer = WriteBuffer(directory)
+    _append(buffer, name, start, 2)
+    # Killed while appending a record
+    os.write(buffer._fd, b"\x05\x00\x00\x00\x10\x00")
+
+
+def test_torn_tail_of_a_dead_process_is_dropped(tmp_path, table_name, table):
+    process = Process(target=_append_torn, args=(str(tmp_path), table_name, datetime(2025, 1, 1)))
+    process.start()
+    process.join()
+
+    buffer = WriteBuffer(str(tmp_path))
+    assert buffer.flush() == 2
+    assert len(_dates(table)) == 2
+    assert os.listdir(tmp_path) == []
+
+
+def test_failing_results_do_not_stall_other_components(tmp_path, table_name, table):
+    failing_name = f"{table_name}_failing"
+    failing_table = get_or_create_standard_component_table(failing_name)
+
+    buffer = WriteBuffer(str(tmp_path), batch_size=100, max_attempts=2)
+    start = datetime(2025, 1, 1)
+    # Strings cannot be stored as Parquet, lists of records can
+    buffer.append(failing_name, "application/json", b'[{"a": 1}]', start, storage_format="parquet")
+    buffer.append(failing_name, "application/json", b'"not records"', start + timedelta(seconds=1),
+                  storage_format="parquet")
+    _append(buffer, table_name, start, 2)
+
+    buffer.flush()
+    assert len(_dates(table)) == 2
+    assert _dates(failing_table) == []
+    assert buffer.backlog() > 0
+
+    # Second failure, the failing result is set aside and the others are written
+    _append(buffer, table_name, start + timedelta(minutes=1), 1)
+    buffer.flush()
+    assert len(_dates(table)) == 3
+    assert _dates(failing_table) == [start]
+    assert buffer.backlog() == 0
+
+    dead_letter = tmp_path / "dead-letter"
+    assert len(os.listdir(dead_letter)) == 1
+
+    # The dead-letter segments can be replayed
+    replay = WriteBuffer(str(dead_letter))
+    assert replay.flush() == 1
@@ -0,0 +1,74 @@
+import os
+import time
+
+from digitaltwin_dataspace import metrics
+from digitaltwin_dataspace.data.cache import BlobCache
+
+
+def test_get_returns_the_cached_payload_and_misses_unknown_ones():
+    cache = BlobCache(max_bytes=100)
+    cache.put("a", "hash", b"a" * 10)
+
+    assert cache.get("a", "hash") == b"a" * 10
+    assert cache.get("a", "other") is None
+    assert cache.get("b", "hash") is None
+
+
+def test_put_evicts_the_least_recently_used_payloads_by_size():
+    cache = BlobCache(max_bytes=100)
+    cache.put("a", "h", b"a" * 40)
+    cache.put("b", "h", b"b" * 40)
+    # Used last, "a" outlives "b"
+    cache.get("a", "h")
+    cache.put("c", "h", b"c" * 40)
+
+    assert cache.get("a", "h") == b"a" * 40
+    assert cache.get("b", "h") is None
+    assert cache.get("c", "h") == b"c" * 40
+    # Larger than the cache itself
+    cache.put("d", "h", b"d" * 101)
+    assert cache.get("d", "h") is None
+
+
+def test_payloads_expire_after_the_ttl(tmp_path, monkeypatch):
+    cache = BlobCache(max_bytes=100, ttl=10, spill_directory=str(tmp_path), spill_max_bytes=100)
+    cache.put("a", "h", b"a" * 10)
+    monotonic, now = time.monotonic(), time.time()
+    monkeypatch.setattr(time, "monotonic", lambda: monotonic + 11)
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+
+    assert cache.get("a", "h") is None
+    # The expired spilled payload was removed as well
+    assert os.listdir(tmp_path) == []
+
+
+def test_spilled_payloads_are_shared_with_other_processes(tmp_path):
+    metrics.reset()
+    # Two processes sharing the spill directory, e.g. the ticks of the "process" execution engine
+    first = BlobCache(max_bytes=100, spill_directory=str(tmp_path), spill_max_bytes=1000)
+    first.put("a", "h", b"a" * 40)
+    second = BlobCache(max_bytes=100, spill_directory=str(tmp_path), spill_max_bytes=1000)
+
+    assert second.get("a", "h") == b"a" * 40
+    assert metrics.get_counter("blob_cache.spill_hits") == 1
+    # Reloaded in memory
+    assert second.get("a", "h") == b"a" * 40
+    assert metrics.get_counter("blob_cache.hits") == 1
+
+
+def test_sweep_evicts_the_payloads_spilled_by_other_processes(tmp_path):
+    first = BlobCache(max_bytes=1000, spill_directory=str(tmp_path), spill_max_bytes=250)
+    second = BlobCache(max_bytes=1000, spill_directory=str(tmp_path), spill_max_bytes=250)
+    first.put("a", "h", b"a" * 100)
+    second.put("b", "h", b"b" * 100)
+    first.put("c", "h", b"c" * 100)
+    for used_at, key in enumerate([("a", "h"), ("b", "h"), ("c", "h")]):
+        os.utime(first._spill_path(key), (1000 + used_at, time.time()))
+    assert sum(os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path)) == 300
+
+    # Started by a later tick, the cache measures what the previous ones left behind
+    BlobCache(max_bytes=1000, spill_directory=str(tmp_path), spill_max_bytes=250)
+
+    assert sum(os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path)) == 200
+    # The least recently used payload, spilled by the first process, was evicted
+    assert not os.path.exists(first._spill_path(("a", "h")))
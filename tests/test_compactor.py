@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from digitaltwin_dataspace.components.compactor import Compactor
+from digitaltwin_dataspace.data.columnar import compact, from_arrow, read_parquet
+from digitaltwin_dataspace.data.retrieve import retrieve_latest_row
+from digitaltwin_dataspace.data.write import write_result
+from digitaltwin_dataspace.serialization import dumps
+
+
+def _collection(index: int) -> dict:
+    properties = {"speed": index if index % 2 else index + 0.5, "name": f"vehicle {index}"}
+    if index == 3:
+        # Appears in a single batch, and is nested
+        properties["extra"] = {"nested": [index]}
+    return {"type": "FeatureCollection", "features": [
+        {"type": "Feature", "id": f"v{index}", "geometry": {"type": "Point", "coordinates": [4.3, 50.8 + index]},
+         "properties": properties},
+    ]}
+
+
+def test_compact_unifies_columns_across_batches():
+    start = datetime(2025, 1, 1)
+    snapshots = [(start + timedelta(seconds=index), _collection(index)) for index in range(5)]
+
+    table = read_parquet(compact(snapshots, batch_size=2))
+
+    assert table.num_rows == 5
+    assert table.schema.field("speed").type == "double"
+    features = from_arrow(table)["features"]
+    assert [feature["id"] for feature in features] == [f"v{index}" for index in range(5)]
+    assert features[3]["properties"]["extra"] == {"nested": [3]}
+    assert features[0]["properties"]["extra"] is None
+    assert features[4]["properties"]["snapshot_date"] == start + timedelta(seconds=4)
+    assert features[2]["geometry"]["coordinates"] == [4.3, 52.8]
+
+
+def test_compactor_pages_through_the_source(table_name, table, monkeypatch):
+    monkeypatch.setattr("digitaltwin_dataspace.components.compactor.COMPACTION_BATCH_SIZE", 2)
+    start = datetime(2025, 1, 1)
+    for index in range(5):
+        write_result(table_name, "application/json", table, dumps(_collection(index)),
+                     start + timedelta(minutes=index))
+    # The hour is complete once the source has a row after it
+    write_result(table_name, "application/json", table, dumps(_collection(0)), start + timedelta(hours=1))
+
+    compactor = Compactor(table_name)
+    assert compactor.run()
+
+    row = retrieve_latest_row(compactor.get_table())
+    assert row.date == start
+    assert len(row.json()["features"]) == 5
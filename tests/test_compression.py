@@ -0,0 +1,71 @@
+import pytest
+
+from digitaltwin_dataspace.data import compression
+from digitaltwin_dataspace.data.compression import (
+    GZIP, ZSTD, ZSTD_DICT, compress, decompress, is_http_encoding, train_dictionary
+)
+from digitaltwin_dataspace.serialization import dumps
+
+PAYLOAD = dumps([{"id": index, "line": index % 7, "stop": f"stop {index}"} for index in range(200)])
+
+
+def test_gzip_round_trip():
+    stored, encoding = compress(PAYLOAD, "gzip")
+
+    assert encoding == GZIP
+    assert len(stored) < len(PAYLOAD)
+    assert decompress(stored, encoding) == PAYLOAD
+
+
+def test_zstd_round_trip():
+    pytest.importorskip("zstandard")
+    stored, encoding = compress(PAYLOAD, "zstd")
+
+    assert encoding == ZSTD
+    assert decompress(stored, encoding) == PAYLOAD
+
+
+def test_payloads_are_stored_as_is_without_compression():
+    assert compress(PAYLOAD, None) == (PAYLOAD, None)
+    assert decompress(PAYLOAD, None) == PAYLOAD
+
+
+def test_zstd_falls_back_to_gzip_without_zstandard(monkeypatch):
+    monkeypatch.setattr(compression, "zstandard", None)
+
+    stored, encoding = compress(PAYLOAD, "zstd")
+
+    assert encoding == GZIP
+    assert decompress(stored, encoding) == PAYLOAD
+    with pytest.raises(RuntimeError):
+        decompress(b"", ZSTD)
+
+
+def test_dictionaries_are_loaded_from_the_dictionary_directory(tmp_path, monkeypatch):
+    pytest.importorskip("zstandard")
+    monkeypatch.setattr(compression, "DICTIONARY_DIRECTORY", str(tmp_path))
+    compression._load_dictionaries.cache_clear()
+    samples = [
+        dumps([{"id": index, "line": (index + sample) % 7, "stop": f"stop {index}"} for index in range(20)])
+        for sample in range(200)
+    ]
+
+    try:
+        assert train_dictionary("stops", samples, dict_size=4096) == str(tmp_path / "stops.dict")
+        stored, encoding = compress(PAYLOAD, "zstd", "stops")
+        # Other components have no dictionary
+        assert compress(PAYLOAD, "zstd", "other")[1] == ZSTD
+
+        # Read by another process, which loads the dictionaries from the directory
+        compression._load_dictionaries.cache_clear()
+        assert encoding == ZSTD_DICT
+        assert decompress(stored, encoding) == PAYLOAD
+    finally:
+        compression._load_dictionaries.cache_clear()
+
+
+def test_only_standard_encodings_are_sent_to_http_clients():
+    assert is_http_encoding(GZIP)
+    assert is_http_encoding(ZSTD)
+    assert not is_http_encoding(ZSTD_DICT)
+    assert not is_http_encoding(None)
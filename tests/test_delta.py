@@ -0,0 +1,83 @@
+import hashlib
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from digitaltwin_dataspace.components.base import RetentionPolicy
+from digitaltwin_dataspace.data import delta
+from digitaltwin_dataspace.data.cache import blob_cache
+from digitaltwin_dataspace.data.delta import canonical, is_delta
+from digitaltwin_dataspace.data.engine import engine
+from digitaltwin_dataspace.data.retention import apply_retention
+from digitaltwin_dataspace.data.retrieve import read_payload
+from digitaltwin_dataspace.data.write import write_result, write_results
+from digitaltwin_dataspace.serialization import dumps
+
+
+def _positions(tick: int, size: int = 50) -> bytes:
+    # A few vehicles move on each tick, the others are unchanged
+    return dumps({
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [4.35 + (tick if index % 10 == 0 else 0) / 1000, 50.85]},
+                "properties": {"id": f"vehicle-{index}", "line": index % 7},
+            }
+            for index in range(size)
+        ],
+    })
+
+
+def _rows(table):
+    with engine.connect() as connection:
+        return connection.execute(select(table).order_by(table.c.date.asc())).fetchall()
+
+
+def _read(row) -> bytes:
+    # Reconstructed from the storage, not from the payloads cached when writing
+    blob_cache.clear()
+    delta._keyframes.clear()
+    return read_payload(row.data, row.hash, row.encoding)
+
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_deltas_are_reconstructed_byte_for_byte(table_name, table, compression):
+    start = datetime(2025, 1, 1)
+    payloads = [_positions(tick) for tick in range(7)]
+    for tick, payload in enumerate(payloads[:4]):
+        write_result(table_name, "application/json", table, payload, start + timedelta(minutes=tick),
+                     compression=compression, delta_keyframe_interval=3)
+    write_results(table_name, "application/json", table, [
+        (payload, start + timedelta(minutes=tick)) for tick, payload in enumerate(payloads[4:], 4)
+    ], compression=compression, delta_keyframe_interval=3)
+
+    rows = _rows(table)
+    # A keyframe every 3 rows at most, the rows of write_results are stored against the keyframe found before them
+    assert [is_delta(row.encoding) for row in rows] == [False, True, True, False, True, True, True]
+    for row, payload in zip(rows, payloads):
+        data = _read(row)
+        assert data == canonical(payload)
+        assert hashlib.md5(data).hexdigest() == row.hash
+
+
+def test_retention_materializes_the_deltas_of_a_deleted_keyframe(table_name, table):
+    now = datetime(2025, 6, 1, 12)
+    # The keyframe is older than the retention, the deltas against it are kept
+    dates = [now - timedelta(days=3)] + [now - timedelta(minutes=10 - tick) for tick in range(1, 4)]
+    payloads = [_positions(tick) for tick in range(4)]
+    for date, payload in zip(dates, payloads):
+        write_result(table_name, "application/json", table, payload, date, delta_keyframe_interval=10)
+    keyframe, *deltas = _rows(table)
+    assert [row.keyframe_id for row in deltas] == [keyframe.id] * 3
+
+    assert apply_retention(table, RetentionPolicy(raw="1d", daily="1d"), now=now) == 1
+
+    rows = _rows(table)
+    assert [row.id for row in rows] == [row.id for row in deltas]
+    assert not os.path.exists(keyframe.data)
+    assert all(row.keyframe_id is None and not is_delta(row.encoding) for row in rows)
+    for row, payload in zip(rows, payloads[1:]):
+        assert _read(row) == canonical(payload)
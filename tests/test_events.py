@@ -0,0 +1,20 @@
+import os
+import time
+
+from digitaltwin_dataspace.data.events import FileEventBus
+
+
+def test_file_event_bus_stays_bounded_and_notifies_after_truncating(tmp_path):
+    event_bus = FileEventBus(str(tmp_path), poll_interval=0.01, max_size=8)
+    received = []
+    event_bus.subscribe(["positions"], received.append)
+    time.sleep(0.05)
+
+    for count in range(1, 21):
+        event_bus.publish("positions")
+        deadline = time.monotonic() + 5
+        # Each event is seen, including those truncating the file
+        while len(received) < count and time.monotonic() < deadline:
+            time.sleep(0.005)
+        assert len(received) == count
+        assert os.path.getsize(tmp_path / "positions") < 8
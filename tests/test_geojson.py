@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from digitaltwin_dataspace.geojson import feature_collection
+
+pd = pytest.importorskip("pandas")
+
+_RECORDS = [
+    {"icao24": "a1", "longitude": 4.35, "latitude": 50.85, "altitude": 1200.0, "origin_country": "Belgium",
+     "origin_city": "Brussels", "velocity": 210.5},
+    # Without coordinates, skipped
+    {"icao24": "a2", "longitude": None, "latitude": 50.9, "altitude": 800.0, "origin_country": "France",
+     "origin_city": "Paris", "velocity": 180.0},
+    {"icao24": None, "longitude": 4.4, "latitude": 50.8, "altitude": float("nan"), "origin_country": "Germany",
+     "origin_city": None, "velocity": float("nan")},
+]
+
+
+def _features(encoded: bytes) -> list:
+    return json.loads(encoded)["features"]
+
+
+@pytest.mark.parametrize("as_dataframe", [False, True])
+def test_feature_collection(as_dataframe):
+    data = pd.DataFrame(_RECORDS) if as_dataframe else _RECORDS
+
+    features = _features(feature_collection(
+        data, altitude="altitude", default_altitude=0, id="icao24", id_from_index=True, nest_separator="_",
+    ))
+
+    assert features == [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [4.35, 50.85, 1200.0]},
+            "properties": {"icao24": "a1", "origin": {"country": "Belgium", "city": "Brussels"}, "velocity": 210.5},
+            "id": "a1",
+        },
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [4.4, 50.8, 0]},
+            "properties": {"icao24": None, "origin": {"country": "Germany", "city": None}, "velocity": None},
+            "id": "2",
+        },
+    ]
+
+
+def test_dataframes_and_records_give_the_same_bytes():
+    df = pd.DataFrame(_RECORDS)
+    df["seen_at"] = pd.to_datetime(["2025-01-01 12:00:00", None, "2025-01-01 12:00:05"])
+    records = df.astype(object).where(df.notna(), None).to_dict("records")
+    # Timestamps are encoded from their isoformat by every serializer
+    for record in records:
+        record["seen_at"] = record["seen_at"] and record["seen_at"].to_pydatetime()
+
+    assert feature_collection(df, id="icao24", exclude=["altitude"]) == feature_collection(
+        records, id="icao24", exclude=["altitude"]
+    )
+    assert [feature["properties"]["seen_at"] for feature in _features(feature_collection(df))] == [
+        "2025-01-01T12:00:00", "2025-01-01T12:00:05"
+    ]
+
+
+@pytest.mark.parametrize("as_dataframe", [False, True])
+def test_falsy_ids_are_kept(as_dataframe):
+    records = [
+        {"id": 0, "longitude": 4.35, "latitude": 50.85},
+        {"id": None, "longitude": 4.36, "latitude": 50.86},
+        {"id": 2, "longitude": 4.37, "latitude": 50.87},
+    ]
+    data = pd.DataFrame(records).astype({"id": "Int64"}) if as_dataframe else records
+
+    features = _features(feature_collection(data, id="id", id_from_index=True))
+
+    # Only the missing id is replaced by the index of the row
+    assert [feature["id"] for feature in features] == [0, "1", 2]
+    empty = [{"id": "", "longitude": 4.35, "latitude": 50.85}]
+    data = pd.DataFrame(empty) if as_dataframe else empty
+    assert _features(feature_collection(data, id="id", id_from_index=True))[0]["id"] == ""
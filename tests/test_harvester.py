@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from digitaltwin_dataspace import metrics
+from digitaltwin_dataspace.components.harvester import Harvester, HarvesterConfiguration
+from digitaltwin_dataspace.data.retrieve import retrieve_between_datetime
+from digitaltwin_dataspace.data.sync_db import get_or_create_standard_component_table
+from digitaltwin_dataspace.data.write import write_result
+
+START = datetime(2025, 1, 1)
+
+
+class _Harvester(Harvester):
+    def __init__(self, name: str, source: str, **configuration):
+        self.configuration = HarvesterConfiguration(
+            name=name, description="", content_type="application/json", source=source, **configuration
+        )
+
+    def get_configuration(self) -> HarvesterConfiguration:
+        return self.configuration
+
+    def harvest(self, source_data, **dependencies_data):
+        return [row.json()["second"] for row in source_data]
+
+
+def _write_source(name: str, seconds) -> None:
+    table = get_or_create_standard_component_table(name)
+    for second in seconds:
+        write_result(name, "application/json", table, {"second": second}, START + timedelta(seconds=second))
+
+
+def _run(harvester: Harvester, max_runs: int = 10) -> int:
+    runs = 0
+    while runs < max_runs and harvester.run():
+        runs += 1
+    return runs
+
+
+def _results(name: str) -> list:
+    rows = retrieve_between_datetime(get_or_create_standard_component_table(name), START, None, 100)
+    return [((row.date - START).total_seconds(), row.json()) for row in rows]
+
+
+def test_catch_up_harvests_the_windows_of_a_row_count(table_name, memory_storage):
+    _write_source(f"{table_name}_source", [1, 2, 3, 4, 5])
+    harvester = _Harvester(table_name, f"{table_name}_source", source_range=2, catch_up=True)
+
+    assert _run(harvester) == 1
+
+    # The last window is still building its two rows
+    assert _results(table_name) == [(2, [1, 2]), (4, [3, 4])]
+
+
+def test_catch_up_harvests_at_most_max_batch_windows_per_run(table_name, memory_storage):
+    _write_source(f"{table_name}_source", [1, 2, 3, 4, 5, 6, 7])
+    harvester = _Harvester(table_name, f"{table_name}_source", source_range=2, catch_up=True, catch_up_max_batch=2)
+
+    assert harvester.run()
+    assert _results(table_name) == [(2, [1, 2]), (4, [3, 4])]
+
+    assert _run(harvester) == 1
+    assert _results(table_name)[-1] == (6, [5, 6])
+
+
+def test_catch_up_harvests_the_windows_of_a_period(table_name, memory_storage):
+    _write_source(f"{table_name}_source", [1, 5, 12, 35, 41])
+    harvester = _Harvester(table_name, f"{table_name}_source", source_range="10s", catch_up=True)
+
+    assert _run(harvester) == 1
+
+    # The empty period is skipped, and the last one is still building as the source has no row after it
+    assert _results(table_name) == [(10, [1, 5]), (20, [12]), (40, [35])]
+
+
+@pytest.mark.parametrize("catch_up", [False, True], ids=["window", "catch_up"])
+def test_empty_periods_do_not_block_the_harvester(table_name, memory_storage, catch_up):
+    _write_source(f"{table_name}_source", [1, 5, 12, 35, 41])
+    harvester = _Harvester(
+        table_name, f"{table_name}_source", source_range="10s", catch_up=catch_up, catch_up_max_batch=1
+    )
+
+    assert _run(harvester) == 3
+
+    assert _results(table_name) == [(10, [1, 5]), (20, [12]), (40, [35])]
+
+
+def test_lag_is_measured_against_the_latest_source_row(table_name, memory_storage):
+    _write_source(f"{table_name}_source", [1, 5, 12, 35, 41])
+    harvester = _Harvester(table_name, f"{table_name}_source", source_range="10s")
+
+    _run(harvester)
+
+    assert metrics.snapshot()[f"harvester.{table_name}.lag_seconds"] == 1
+
+
+def test_a_run_failing_after_its_writes_writes_nothing(table_name, memory_storage, monkeypatch):
+    _write_source(f"{table_name}_source", [1, 2, 3, 4, 5])
+    harvester = _Harvester(table_name, f"{table_name}_source", source_range=2, catch_up=True)
+
+    def fail(name, value):
+        raise RuntimeError("Failed after the writes")
+
+    # Measuring the lag is the last step of the transaction of the run
+    with monkeypatch.context() as patch, pytest.raises(RuntimeError):
+        patch.setattr(metrics, "set_gauge", fail)
+        harvester.run()
+
+    assert _results(table_name) == []
+    assert harvester.run()
+    assert _results(table_name) == [(2, [1, 2]), (4, [3, 4])]
@@ -0,0 +1,143 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from digitaltwin_dataspace import http_client
+from digitaltwin_dataspace.components.base import ComponentConfiguration
+from digitaltwin_dataspace.components.collector import Collector
+from digitaltwin_dataspace.http_client import HttpClient, ValidatorStore
+
+URL = "https://example.org/data"
+
+
+class _Transport(BaseAdapter):
+    """
+    Answers the requests with the given responses, as (status, headers, content), recording the requests.
+    """
+
+    def __init__(self, responses):
+        super().__init__()
+        self.responses = list(responses)
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        status, headers, content = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers)
+        response._content = content
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def transport(monkeypatch):
+    def mount(*responses):
+        adapter = _Transport(responses)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        monkeypatch.setattr(http_client, "_session", session)
+        return adapter
+
+    return mount
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    # Only the delays of the client, other threads of the process (e.g. event bus pollers) sleep as usual
+    monkeypatch.setattr(http_client, "time", SimpleNamespace(monotonic=time.monotonic, sleep=delays.append))
+    return delays
+
+
+def test_retry_after_is_honored(transport, sleeps):
+    adapter = transport((503, {"Retry-After": "2"}, b""), (200, {}, b"ok"))
+
+    assert HttpClient("test").get_content(URL) == b"ok"
+    assert len(adapter.requests) == 2
+    assert sleeps == [2.0]
+
+
+def test_retries_give_up_after_the_maximum_attempts(transport, sleeps):
+    adapter = transport((503, {"Retry-After": "1"}, b""))
+
+    response = HttpClient("test", retries=2).get(URL)
+
+    assert response.status_code == 503
+    assert len(adapter.requests) == 3
+    assert sleeps == [1.0, 1.0]
+
+
+def test_unchanged_resources_are_not_fetched_again(transport, tmp_path):
+    adapter = transport((200, {"ETag": '"v1"'}, b"data"), (304, {}, b""))
+    client = HttpClient("test", validators=ValidatorStore(str(tmp_path)))
+
+    assert client.get_content(URL, conditional=True) == b"data"
+    client.commit()
+
+    assert client.get_content(URL, conditional=True) is None
+    assert adapter.requests[1].headers["If-None-Match"] == '"v1"'
+
+
+def test_validators_are_only_stored_once_committed(transport, tmp_path):
+    adapter = transport((200, {"ETag": '"v1"', "Last-Modified": "Wed, 01 Jan 2025 00:00:00 GMT"}, b"data"))
+    client = HttpClient("test", validators=ValidatorStore(str(tmp_path)))
+
+    client.get_content(URL, conditional=True)
+    client.get_content(URL, conditional=True)
+    assert "If-None-Match" not in adapter.requests[1].headers
+    assert list(tmp_path.iterdir()) == []
+
+    client.rollback()
+    client.commit()
+    client.get_content(URL, conditional=True)
+    assert "If-None-Match" not in adapter.requests[2].headers
+
+    client.commit()
+    # A later run, in another process, reads them from the directory
+    client = HttpClient("test", validators=ValidatorStore(str(tmp_path)))
+    client.get_content(URL, conditional=True)
+    assert adapter.requests[3].headers["If-None-Match"] == '"v1"'
+    assert adapter.requests[3].headers["If-Modified-Since"] == "Wed, 01 Jan 2025 00:00:00 GMT"
+
+
+class _Collector(Collector):
+    def get_schedule(self) -> str:
+        return "1m"
+
+    def get_configuration(self) -> ComponentConfiguration:
+        return ComponentConfiguration(name="http_test_collector", description="", content_type="text/plain")
+
+    def collect(self) -> bytes:
+        return self.http.get_content(URL, conditional=True)
+
+
+def test_validators_are_dropped_when_the_collector_write_fails(transport, tmp_path, monkeypatch):
+    adapter = transport((200, {"ETag": '"v1"'}, b"data"))
+    collector = _Collector()
+    collector._http = HttpClient("http_test_collector", validators=ValidatorStore(str(tmp_path)))
+
+    def fail(*args, **kwargs):
+        raise OSError("Failed to write")
+
+    with monkeypatch.context() as patch, pytest.raises(OSError):
+        patch.setattr("digitaltwin_dataspace.components.collector.write_result", fail)
+        collector.run()
+
+    written = []
+    monkeypatch.setattr(
+        "digitaltwin_dataspace.components.collector.write_result", lambda *args, **kwargs: written.append(args[3])
+    )
+    # Without the validators, the resource is fetched again rather than skipped with a 304
+    assert collector.run() == b"data"
+    assert "If-None-Match" not in adapter.requests[1].headers
+    assert written == [b"data"]
@@ -0,0 +1,31 @@
+import time
+
+from digitaltwin_dataspace import metrics
+from digitaltwin_dataspace.execution import ProcessExecutionEngine
+
+
+def _record():
+    metrics.increment("test.child.rows", 2)
+    metrics.observe("test.child.seconds", 0.5, (0.1, 1))
+
+
+def test_metrics_of_process_ticks_are_merged_into_the_parent():
+    metrics.reset()
+    metrics.increment("test.child.rows")
+
+    engine = ProcessExecutionEngine()
+    # Two jobs, the metrics of a tick are merged before it is marked finished
+    assert engine.submit("metrics_1", _record)
+    deadline = time.monotonic() + 10
+    while metrics.get_counter("test.child.rows") < 3 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert engine.submit("metrics_2", _record)
+    while metrics.get_counter("test.child.rows") < 5 and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    snapshot = metrics.snapshot()
+    # The counter of the parent is neither lost nor counted again by the children
+    assert snapshot["test.child.rows"] == 5
+    assert snapshot["test.child.seconds.count"] == 2
+    assert snapshot["test.child.seconds.le_0.1"] == 0
+    assert snapshot["test.child.seconds.le_1"] == 2
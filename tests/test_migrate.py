@@ -0,0 +1,42 @@
+from datetime import datetime
+
+from sqlalchemy import select
+
+from digitaltwin_dataspace.data.engine import engine
+from digitaltwin_dataspace.data.migrate import migrate_table
+from digitaltwin_dataspace.data.write import storage_key
+
+
+def _insert(table, **values) -> int:
+    with engine.begin() as connection:
+        return connection.execute(table.insert().values(type="application/json", **values)).inserted_primary_key[0]
+
+
+def _urls(table) -> dict:
+    with engine.connect() as connection:
+        return dict(connection.execute(select(table.c.id, table.c.data)).fetchall())
+
+
+def test_flat_keys_are_moved_to_partitioned_keys(table_name, table, memory_storage):
+    date = datetime(2025, 1, 31, 12, 30, 15)
+    flat = f"memory://{table_name}/2025-01-31_12-30-15"
+    keyframe = f"memory://{table_name}/2025-01-31_12-30-16"
+    partitioned = f"memory://{storage_key(table_name, datetime(2025, 1, 31, 12, 30, 17), 'c' * 32)}"
+    memory_storage.files.update({flat: b"flat", keyframe: b"keyframe", partitioned: b"partitioned"})
+
+    original_id = _insert(table, date=date, data=flat, hash="a" * 32)
+    # A copy written within the same second shares the url of its original row
+    copy_id = _insert(table, date=date, data=flat, hash="a" * 32, copy_id=original_id)
+    keyframe_id = _insert(table, date=datetime(2025, 1, 31, 12, 30, 16), data=keyframe, hash="b" * 32)
+    delta_id = _insert(table, date=datetime(2025, 1, 31, 12, 30, 17), data=partitioned, hash="c" * 32,
+                       encoding="delta", keyframe_id=keyframe_id)
+
+    assert migrate_table(table, dry_run=True) == 1
+    assert flat in memory_storage.files
+    assert migrate_table(table, batch_size=1) == 1
+
+    moved = f"memory://{storage_key(table_name, date, 'a' * 32)}"
+    assert _urls(table) == {original_id: moved, copy_id: moved, keyframe_id: keyframe, delta_id: partitioned}
+    assert memory_storage.files == {moved: b"flat", keyframe: b"keyframe", partitioned: b"partitioned"}
+    # Resumed, nothing is left to move
+    assert migrate_table(table) == 0
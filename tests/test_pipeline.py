@@ -0,0 +1,71 @@
+import threading
+import time
+
+from digitaltwin_dataspace.components.base import Component, ScheduleRunnable
+from digitaltwin_dataspace.components.harvester import Harvester, HarvesterConfiguration
+from digitaltwin_dataspace.execution import ThreadExecutionEngine
+from digitaltwin_dataspace.pipeline import Pipeline
+
+
+class _Root(Component, ScheduleRunnable):
+    def __init__(self, name: str):
+        self.name = name
+
+    def run(self):
+        return None
+
+    def get_schedule(self) -> str:
+        return "1m"
+
+    def get_configuration(self) -> HarvesterConfiguration:
+        return HarvesterConfiguration(name=self.name, description="", content_type="application/json")
+
+
+class _Harvester(Harvester):
+    def __init__(self, name: str, source: str, dependencies=None):
+        self.configuration = HarvesterConfiguration(
+            name=name, description="", content_type="application/json", source=source, dependencies=dependencies
+        )
+
+    def get_configuration(self) -> HarvesterConfiguration:
+        return self.configuration
+
+
+def test_roots_sharing_downstream_components_share_a_job():
+    pipeline = Pipeline([
+        _Root("a"),
+        _Root("b"),
+        _Root("c"),
+        _Root("d"),
+        _Harvester("a_b", "a", ["b"]),
+        # Shares a_b_c with a and b only through a_b
+        _Harvester("a_b_c", "a_b", ["c"]),
+        _Harvester("d_only", "d"),
+    ])
+
+    assert pipeline.jobs == {"pipeline_a": ["a", "b", "c"], "d": ["d"]}
+    assert [pipeline.job_name(root) for root in "abcd"] == ["pipeline_a", "pipeline_a", "pipeline_a", "d"]
+
+
+def test_overrunning_ticks_of_a_job_run_their_own_function():
+    engine = ThreadExecutionEngine(max_workers=4)
+    release = threading.Event()
+    runs = []
+
+    def run(root):
+        def func():
+            release.wait(5)
+            runs.append(root)
+        return func
+
+    assert engine.submit("pipeline_a", run("a"), max_concurrency=1, overrun_policy="queue")
+    assert not engine.submit("pipeline_a", run("b"), max_concurrency=1, overrun_policy="queue")
+    assert not engine.submit("pipeline_a", run("c"), max_concurrency=1, overrun_policy="queue")
+    release.set()
+
+    deadline = time.monotonic() + 5
+    while len(runs) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    engine.shutdown()
+
+    assert runs == ["a", "b", "c"]
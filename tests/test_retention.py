@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from digitaltwin_dataspace.components.base import RetentionPolicy
+from digitaltwin_dataspace.data import delta
+from digitaltwin_dataspace.data.cache import blob_cache
+from digitaltwin_dataspace.data.delta import is_delta
+from digitaltwin_dataspace.data.engine import engine
+from digitaltwin_dataspace.data.retention import apply_retention
+from digitaltwin_dataspace.data.retrieve import read_payload
+from digitaltwin_dataspace.data.write import write_result, write_results
+from digitaltwin_dataspace.serialization import dumps
+
+NOW = datetime(2025, 1, 10)
+
+
+def _rows(table):
+    with engine.connect() as connection:
+        return connection.execute(select(table).order_by(table.c.date.asc(), table.c.id.asc())).fetchall()
+
+
+def _read(row) -> bytes:
+    # Read from the storage, not from the payloads cached when writing
+    blob_cache.clear()
+    delta._keyframes.clear()
+    return read_payload(row.data, row.hash, row.encoding)
+
+
+def test_rows_are_thinned_to_the_first_row_of_each_hour_then_day(table_name, table, memory_storage):
+    start = NOW - timedelta(days=7)
+    dates = [start + timedelta(minutes=20 * index) for index in range(7 * 72)]
+    write_results(table_name, "application/json", table, [
+        (dumps({"index": index}), date) for index, date in enumerate(dates)
+    ])
+
+    # Raw for a day, hourly for two days, then daily for three days
+    policy = RetentionPolicy(raw="1d", hourly="2d", daily="3d")
+    deleted = apply_retention(table, policy, now=NOW, batch_size=7)
+
+    raw = [date for date in dates if date >= NOW - timedelta(days=1)]
+    hourly = [date for date in dates if NOW - timedelta(days=3) <= date < NOW - timedelta(days=1) and date.minute == 0]
+    daily = [date for date in dates if NOW - timedelta(days=6) <= date < NOW - timedelta(days=3) and date.hour == 0
+             and date.minute == 0]
+    kept = sorted(daily + hourly + raw)
+    assert [row.date for row in _rows(table)] == kept
+    assert deleted == len(dates) - len(kept)
+    # The data of the deleted rows is deleted as well
+    assert len(memory_storage.files) == len(kept)
+
+
+def test_copies_of_a_deleted_row_are_promoted(table_name, table, memory_storage):
+    payload = dumps({"unchanged": True})
+    original_date = NOW - timedelta(days=5)
+    write_result(table_name, "application/json", table, payload, original_date, deduplicate=True)
+    for hours in (3, 2, 1):
+        write_result(table_name, "application/json", table, payload, NOW - timedelta(hours=hours), deduplicate=True)
+    original, first, second, third = _rows(table)
+    assert [first.copy_id, second.copy_id, third.copy_id] == [original.id] * 3
+
+    assert apply_retention(table, RetentionPolicy(raw="1d", daily="1d"), now=NOW) == 1
+
+    rows = _rows(table)
+    assert [row.id for row in rows] == [first.id, second.id, third.id]
+    # The first kept copy becomes the original row of the others
+    assert [row.copy_id for row in rows] == [None, first.id, first.id]
+    assert memory_storage.files == {original.data: payload}
+    assert all(_read(row) == payload for row in rows)
+
+
+def test_deltas_of_a_deleted_keyframe_are_decoded_byte_for_byte(table_name, table, memory_storage):
+    payloads = [
+        dumps([
+            {"id": index, "name": f"record {index}", "value": tick if index % 10 == 0 else 0} for index in range(100)
+        ])
+        for tick in range(4)
+    ]
+    dates = [NOW - timedelta(days=5)] + [NOW - timedelta(hours=hours) for hours in (3, 2, 1)]
+    for date, payload in zip(dates, payloads):
+        write_result(table_name, "application/json", table, payload, date, compression="gzip",
+                     delta_keyframe_interval=10)
+    keyframe, *deltas = _rows(table)
+    assert all(is_delta(row.encoding) and row.keyframe_id == keyframe.id for row in deltas)
+    decoded = [_read(row) for row in deltas]
+
+    assert apply_retention(table, RetentionPolicy(raw="1d", daily="1d"), now=NOW) == 1
+
+    rows = _rows(table)
+    assert [row.id for row in rows] == [row.id for row in deltas]
+    assert keyframe.data not in memory_storage.files
+    assert all(row.keyframe_id is None and row.encoding == "gzip" for row in rows)
+    assert [_read(row) for row in rows] == decoded
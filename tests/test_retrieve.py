@@ -0,0 +1,69 @@
+import time
+from datetime import datetime, timedelta
+from multiprocessing import Process
+
+from sqlalchemy import INTEGER, TIMESTAMP, VARCHAR, Column, Index, MetaData, Table
+
+from digitaltwin_dataspace.data import retrieve
+from digitaltwin_dataspace.data.engine import engine
+from digitaltwin_dataspace.data.events import FileEventBus
+from digitaltwin_dataspace.data.retrieve import retrieve_latest_row, retrieve_latest_row_cached
+from digitaltwin_dataspace.data.sync_db import get_or_create_standard_component_table
+from digitaltwin_dataspace.data.write import write_result
+
+
+def test_latest_row_is_invalidated_by_rows_written_in_other_processes(table_name, table, tmp_path, monkeypatch):
+    event_bus = FileEventBus(str(tmp_path), poll_interval=0.01)
+    monkeypatch.setattr("digitaltwin_dataspace.data.events.event_bus", event_bus)
+    monkeypatch.setattr(retrieve, "event_bus", event_bus)
+    # Without the event bus, the stale row would be served for an hour
+    monkeypatch.setattr(retrieve, "LATEST_ROW_CACHE_TTL", 3600)
+
+    start = datetime(2025, 1, 1)
+    write_result(table_name, "application/json", table, b'{"tick": 0}', start)
+    assert retrieve_latest_row_cached(table).date == start
+    # The first poll of the event bus only records the current state of the table
+    time.sleep(0.05)
+
+    writer = Process(target=write_result, args=(
+        table_name, "application/json", table, b'{"tick": 1}', start + timedelta(seconds=1)
+    ))
+    writer.start()
+    writer.join()
+    assert writer.exitcode == 0
+
+    deadline = time.monotonic() + 5
+    while retrieve_latest_row_cached(table).date == start and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert retrieve_latest_row_cached(table).date == start + timedelta(seconds=1)
+
+
+def test_legacy_copies_are_backfilled_when_their_table_is_upgraded(table_name):
+    # A table written before the copies were denormalized, lacking the copy_id index and the later columns
+    metadata = MetaData()
+    legacy = Table(
+        table_name,
+        metadata,
+        Column("id", INTEGER, primary_key=True, autoincrement=True),
+        Column("date", TIMESTAMP, nullable=False),
+        Column("data", VARCHAR(512), nullable=True),
+        Column("type", VARCHAR(24), nullable=True),
+        Column("hash", VARCHAR(32), nullable=True),
+        Column("copy_id", INTEGER, nullable=True),
+        Index(f"{table_name}_hash_index", "hash"),
+    )
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(legacy.insert().values(
+            id=1, date=datetime(2025, 1, 1), data="file://original.json", type="application/json", hash="abc"
+        ))
+        connection.execute(legacy.insert().values(
+            id=2, date=datetime(2025, 1, 2), data=None, type="application/json", hash=None, copy_id=1
+        ))
+
+    # Loaded lazily, as by a component, rather than through sync_db_from_configuration
+    latest = retrieve_latest_row(get_or_create_standard_component_table(table_name))
+
+    assert latest.date == datetime(2025, 1, 2)
+    assert latest.url == "file://original.json"
+    assert latest.hash == "abc"
@@ -0,0 +1,97 @@
+import zlib
+from datetime import datetime
+
+import pytest
+
+from digitaltwin_dataspace import metrics
+from digitaltwin_dataspace.scheduler import CronTrigger, IntervalTrigger, Job, Scheduler, parse_schedule, spread_phase
+
+# A Monday
+MONDAY = datetime(2025, 1, 6)
+
+
+def _next(trigger, date: datetime) -> datetime:
+    return datetime.fromtimestamp(trigger.next_after(date.timestamp()))
+
+
+@pytest.mark.parametrize("expression, now, expected", [
+    ("*/15 9-17 * * 1-5", MONDAY.replace(hour=17, minute=50), datetime(2025, 1, 7, 9, 0)),
+    ("0-30/10 * * * *", MONDAY.replace(hour=10, minute=21), MONDAY.replace(hour=10, minute=30)),
+    ("5,45 * * * *", MONDAY.replace(hour=10, minute=5), MONDAY.replace(hour=10, minute=45)),
+    ("@daily", MONDAY.replace(hour=10), datetime(2025, 1, 7)),
+    ("@hourly", MONDAY.replace(hour=10, minute=59, second=59), MONDAY.replace(hour=11)),
+    ("@monthly", MONDAY, datetime(2025, 2, 1)),
+    # 7 is Sunday too
+    ("0 0 * * 7", MONDAY, datetime(2025, 1, 12)),
+    # The 13th or a Friday, whichever comes first
+    ("0 0 13 * 5", MONDAY, datetime(2025, 1, 10)),
+    ("0 0 29 2 *", MONDAY, datetime(2028, 2, 29)),
+])
+def test_cron_expressions(expression, now, expected):
+    assert _next(parse_schedule(expression), now) == expected
+
+
+@pytest.mark.parametrize("expression", [
+    "* * * *", "* * * * * *", "60 * * * *", "* 24 * * *", "*/0 * * * *", "5-1 * * * *", "a * * * *", "0 0 31 2 *",
+])
+def test_invalid_cron_expressions_are_rejected(expression):
+    with pytest.raises(ValueError):
+        _next(CronTrigger(expression), MONDAY)
+
+
+@pytest.mark.parametrize("schedule_string, interval", [
+    ("500ms", 0.5), ("10s", 10), ("1.5m", 90), ("2h", 7200), ("1d", 86400), ("1w", 604800),
+])
+def test_intervals(schedule_string, interval):
+    trigger = parse_schedule(schedule_string)
+
+    assert isinstance(trigger, IntervalTrigger)
+    assert trigger.interval == interval
+
+
+def test_times_of_the_day():
+    assert _next(parse_schedule("08:30"), MONDAY.replace(hour=8, minute=30)) == datetime(2025, 1, 7, 8, 30)
+    assert _next(parse_schedule("8:30:15"), MONDAY.replace(hour=8, minute=30, second=10)) == MONDAY.replace(
+        hour=8, minute=30, second=15
+    )
+
+
+@pytest.mark.parametrize("schedule_string", ["", "10", "10x", "-1s", "every minute", "25:00"])
+def test_invalid_schedules_are_rejected(schedule_string):
+    with pytest.raises(ValueError):
+        _next(parse_schedule(schedule_string), MONDAY)
+
+
+def test_intervals_are_aligned_on_the_epoch_shifted_by_their_phase():
+    trigger = IntervalTrigger(10, phase=3)
+
+    assert trigger.next_after(1_000_001) == 1_000_003
+    assert trigger.next_after(1_000_003) == 1_000_013
+    assert IntervalTrigger(10, phase=23).phase == 3
+
+
+def test_the_phase_of_a_job_is_derived_from_its_name():
+    scheduler = Scheduler(max_spread=60)
+
+    job = scheduler.add("collector", "10s", lambda: None)
+
+    assert job.trigger.phase == (zlib.crc32(b"collector") % 1_000_000) / 1_000_000 * 10
+    # The same on every start, and different for another job
+    assert spread_phase("collector", 10) == job.trigger.phase
+    assert spread_phase("harvester", 10) != job.trigger.phase
+    # Spread over at most max_spread seconds
+    assert spread_phase("collector", 3600, max_spread=60) < 60
+    assert Scheduler(max_spread=0).add("collector", "10s", lambda: None).trigger.phase == 0
+
+
+def test_missed_ticks_are_skipped_and_counted():
+    metrics.reset()
+    job = Job("missed_ticks", IntervalTrigger(1), lambda: None, jitter=0)
+    job.schedule_next(1_000_000.5, 100.0)
+    assert job.due_at == 100.5
+
+    # Blocked for 3.2 seconds after the tick
+    job.schedule_next(1_000_003.7, 103.7)
+
+    assert job.due_at == 104.5
+    assert metrics.get_counter("scheduler.missed_ticks.missed") == 3
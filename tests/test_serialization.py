@@ -0,0 +1,64 @@
+import hashlib
+from datetime import date, datetime
+
+import pytest
+
+from digitaltwin_dataspace import serialization
+from digitaltwin_dataspace.data.write import to_bytes
+from digitaltwin_dataspace.serialization import create_serializer
+
+numpy = pytest.importorskip("numpy")
+
+_BACKENDS = [
+    name for name, module in (("orjson", serialization.orjson), ("msgspec", serialization.msgspec), ("json", True))
+    if module is not None
+]
+
+_VALUE = {
+    "nan": float("nan"),
+    "infinite": [1.5, float("inf"), -float("inf")],
+    "nested": {"values": [{"x": float("nan")}, None, True]},
+    "text": "Bruxelles — ü",
+    "date": date(2025, 1, 2),
+    "datetime": datetime(2025, 1, 1, 12, 0, 0, 5),
+    "array": numpy.array([1.0, numpy.nan]),
+    "scalars": [numpy.float64("nan"), numpy.float64(0.25), numpy.int64(3)],
+}
+
+
+@pytest.mark.parametrize("name", _BACKENDS)
+def test_backends_encode_the_same_bytes(name):
+    encoded = create_serializer(name).dumps(_VALUE)
+
+    assert encoded == (
+        '{"nan":null,"infinite":[1.5,null,null],"nested":{"values":[{"x":null},null,true]},'
+        '"text":"Bruxelles — ü","date":"2025-01-02","datetime":"2025-01-01T12:00:00.000005",'
+        '"array":[1.0,null],"scalars":[null,0.25,3]}'
+    ).encode("utf-8")
+
+
+def test_json_backend_is_valid_json():
+    # NaN is not valid JSON, it is encoded as null as by the other backends
+    encoded = create_serializer("json").dumps({"values": [float("nan")]})
+
+    assert create_serializer("json").loads(encoded) == {"values": [None]}
+    assert b"NaN" not in encoded
+
+
+@pytest.mark.parametrize("name", _BACKENDS)
+def test_the_hashed_encoding_of_results_is_stable(name, monkeypatch):
+    monkeypatch.setattr(serialization, "serializer", create_serializer(name))
+    result = {"type": "FeatureCollection", "features": [
+        {"type": "Feature", "id": 0, "geometry": {"type": "Point", "coordinates": [4.35, 50.85]},
+         "properties": {"name": "Gare du Midi", "line": "T81", "delay": 1.5, "active": True, "stop": None}},
+    ]}
+
+    data = to_bytes(result)
+
+    # Changing these bytes changes the hashes of the results, and breaks their deduplication against stored ones
+    assert data == (
+        '{"type":"FeatureCollection","features":[{"type":"Feature","id":0,"geometry":{"type":"Point",'
+        '"coordinates":[4.35,50.85]},"properties":{"name":"Gare du Midi","line":"T81","delay":1.5,"active":true,'
+        '"stop":null}}]}'
+    ).encode("utf-8")
+    assert hashlib.md5(data).hexdigest() == "536a1b26f0061021c06233831025d47b"
@@ -0,0 +1,132 @@
+import json
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from digitaltwin_dataspace.components import serving
+from digitaltwin_dataspace.components.serving import _ndjson_lines, data_response
+from digitaltwin_dataspace.data.cache import blob_cache
+from digitaltwin_dataspace.data.compression import compress
+from digitaltwin_dataspace.data.retrieve import Data, retrieve_between_datetime
+from digitaltwin_dataspace.data.storage import FileStorageManager
+from digitaltwin_dataspace.data.write import write_results
+
+
+def test_ndjson_lines_are_single_lines(table_name, table):
+    start = datetime(2025, 1, 1)
+    pretty = json.dumps({"a": [1, 2], "b": "c"}, indent=2).encode()
+    write_results(table_name, "application/json", table, [
+        (pretty, start),
+        (b'{"compact": true}', start + timedelta(seconds=1)),
+        (b'{\n"invalid"', start + timedelta(seconds=2)),
+    ])
+
+    lines = list(_ndjson_lines(retrieve_between_datetime(table, start - timedelta(seconds=1), None, None)))
+
+    assert all(line.endswith(b"\n") and line.count(b"\n") == 1 for line in lines)
+    documents = [json.loads(line) for line in lines]
+    assert documents[0]["encoding"] == "json" and documents[0]["data"] == {"a": [1, 2], "b": "c"}
+    assert documents[1]["encoding"] == "json" and documents[1]["data"] == {"compact": True}
+    assert documents[2]["encoding"] == "base64"
+
+
+PAYLOAD = b"0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+@pytest.fixture(params=["file", "stream", "memory"])
+def payload_client(request, tmp_path, memory_storage, monkeypatch):
+    """
+    A client of an app serving PAYLOAD as a file (FileResponse), streamed from the storage or from memory.
+    """
+    hash = uuid.uuid4().hex
+    if request.param == "file":
+        storage = FileStorageManager(str(tmp_path))
+        url = storage.write("payload.txt", PAYLOAD)
+    else:
+        storage = memory_storage
+        url = storage.write("payload.txt", PAYLOAD)
+        if request.param == "memory":
+            blob_cache.put(url, hash, PAYLOAD)
+    monkeypatch.setattr(serving, "storage_manager", storage)
+
+    data = Data(date=datetime(2025, 1, 1), hash=hash, _url=url, content_type="text/plain")
+    app = FastAPI()
+
+    @app.get("/")
+    def serve(request: Request):
+        return data_response(request, data)
+
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("range_header, content", [
+    ("bytes=0-9", PAYLOAD[:10]),
+    ("bytes=10-", PAYLOAD[10:]),
+    ("bytes=-5", PAYLOAD[-5:]),
+    ("bytes=30-100", PAYLOAD[30:]),
+])
+def test_byte_ranges_are_served_partially(payload_client, range_header, content):
+    response = payload_client.get("/", headers={"Range": range_header})
+
+    assert response.status_code == 206
+    assert response.content == content
+    start = PAYLOAD.index(content)
+    assert response.headers["content-range"] == f"bytes {start}-{start + len(content) - 1}/{len(PAYLOAD)}"
+    assert response.headers["accept-ranges"] == "bytes"
+
+
+def test_payloads_are_served_entirely_without_range(payload_client):
+    response = payload_client.get("/")
+
+    assert response.status_code == 200
+    assert response.content == PAYLOAD
+    assert response.headers["accept-ranges"] == "bytes"
+
+
+def test_unsatisfiable_ranges_are_rejected(payload_client):
+    response = payload_client.get("/", headers={"Range": f"bytes={len(PAYLOAD)}-"})
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(PAYLOAD)}"
+
+
+def test_multiple_ranges_are_not_served_as_a_single_one(payload_client):
+    response = payload_client.get("/", headers={"Range": "bytes=0-1,5-6"})
+
+    # Either ignored (the whole payload is served) or served as multipart/byteranges by FileResponse
+    if response.status_code == 200:
+        assert response.content == PAYLOAD
+    else:
+        assert response.status_code == 206
+        assert response.headers["content-type"].startswith("multipart/byteranges")
+
+
+@pytest.mark.parametrize("accept_encoding, content_encoding", [
+    ("gzip, deflate", "gzip"),
+    ("*", "gzip"),
+    ("identity", None),
+    ("gzip;q=0, identity", None),
+])
+def test_compressed_payloads_are_sent_as_is_to_the_clients_accepting_them(
+        memory_storage, monkeypatch, accept_encoding, content_encoding
+):
+    monkeypatch.setattr(serving, "storage_manager", memory_storage)
+    stored, encoding = compress(PAYLOAD, "gzip")
+    data = Data(date=datetime(2025, 1, 1), hash=uuid.uuid4().hex, _url=memory_storage.write("payload.gz", stored),
+                content_type="text/plain", encoding=encoding)
+    app = FastAPI()
+
+    @app.get("/")
+    def serve(request: Request):
+        return data_response(request, data)
+
+    response = TestClient(app).get("/", headers={"Accept-Encoding": accept_encoding})
+
+    assert response.status_code == 200
+    assert response.headers.get("content-encoding") == content_encoding
+    assert response.headers["vary"] == "Accept-Encoding"
+    # Decoded by the client when sent compressed
+    assert response.content == PAYLOAD
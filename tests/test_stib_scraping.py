@@ -0,0 +1,73 @@
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("lxml")
+pytest.importorskip("geopandas")
+BeautifulSoup = pytest.importorskip("bs4").BeautifulSoup
+
+FIXTURES = Path(__file__).parent / "fixtures" / "stib"
+
+
+def _load_stib():
+    path = Path(__file__).parent.parent / "digitaltwin_dataspace" / "src" / "stib.py"
+    spec = importlib.util.spec_from_file_location("stib_collectors", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def parse_with_beautifulsoup(page: bytes):
+    """
+    The parsing of the stops replaced by _parse_thermometer_stops.
+    """
+    soup = BeautifulSoup(page, "html.parser")
+    for li in soup.find_all("li", class_="thermometer__stop"):
+        yield li.get("id"), li.text.replace("\n", "").strip()
+
+
+@pytest.mark.parametrize("fixture", sorted(FIXTURES.glob("*.html")), ids=lambda path: path.name)
+def test_parser_matches_beautifulsoup(fixture):
+    page = fixture.read_bytes()
+
+    assert list(_load_stib()._parse_thermometer_stops(page)) == list(parse_with_beautifulsoup(page))
+
+
+def test_parser_handles_empty_pages():
+    assert list(_load_stib()._parse_thermometer_stops(b"  ")) == []
+
+
+class _Response:
+    status_code = 200
+
+    def __init__(self, content: bytes):
+        self.content = content
+
+
+class _Http:
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def get(self, url, **kwargs):
+        return _Response(self.content)
+
+
+def test_line_stops_are_cached_across_runs(tmp_path):
+    page = sorted(FIXTURES.glob("*.html"))[0].read_bytes()
+    collector = type("Collector", (), {"http": _Http(page)})()
+
+    # Each run of the "process" execution engine starts with a fresh module
+    first_run = _load_stib()
+    first_run.LINE_CACHE_DIRECTORY = str(tmp_path)
+    stops = first_run.STIBStopsCollector._fetch_line_stops(collector, 1, "V")
+    assert stops
+
+    second_run = _load_stib()
+    second_run.LINE_CACHE_DIRECTORY = str(tmp_path)
+
+    def parse(page):
+        raise AssertionError("An unchanged page is parsed again")
+
+    second_run._parse_thermometer_stops = parse
+    assert second_run.STIBStopsCollector._fetch_line_stops(collector, 1, "V") == stops
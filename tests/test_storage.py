@@ -0,0 +1,91 @@
+import os
+import time
+
+import pytest
+
+from digitaltwin_dataspace import metrics
+from digitaltwin_dataspace.data.storage import CachingStorageManager, FileStorageManager
+from digitaltwin_dataspace.execution import ProcessExecutionEngine
+
+
+def test_batched_fsync_is_flushed_before_a_process_tick_exits(tmp_path, monkeypatch):
+    # Synced every hour, only the flush on exit can sync the file within the test
+    manager = FileStorageManager(str(tmp_path), fsync="batch", fsync_interval=3600)
+    monkeypatch.setattr("digitaltwin_dataspace.execution.storage_manager", manager)
+    metrics.reset()
+
+    engine = ProcessExecutionEngine()
+    assert engine.submit("fsync", lambda: manager.write("a/b.json", b"{}"))
+    deadline = time.monotonic() + 10
+    while not metrics.get_counter("file_storage.fsync_batches") and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert (tmp_path / "a" / "b.json").read_bytes() == b"{}"
+    assert metrics.snapshot()["file_storage.fsync_batch_files.sum"] == 1
+
+
+def test_sweep_evicts_the_files_cached_by_other_processes(tmp_path):
+    storage = FileStorageManager(str(tmp_path / "storage"))
+    # Two processes sharing the cache directory, each seeing only its own files
+    first = CachingStorageManager(storage, str(tmp_path / "cache"), max_bytes=250)
+    second = CachingStorageManager(storage, str(tmp_path / "cache"), max_bytes=250)
+
+    urls = [first.write("a", b"a" * 100), second.write("b", b"b" * 100), first.write("c", b"c" * 100)]
+    for used_at, url in enumerate(urls):
+        os.utime(first._path(first._key(url)), (1000 + used_at, 1000 + used_at))
+    cached = [path for path in (tmp_path / "cache").rglob("*") if path.is_file()]
+    assert sum(path.stat().st_size for path in cached) == 300
+
+    first.sweep()
+
+    cached = [path for path in (tmp_path / "cache").rglob("*") if path.is_file()]
+    assert sum(path.stat().st_size for path in cached) == 200
+    # The least recently used file, written by the first process, was evicted
+    assert not os.path.exists(first._path(first._key(urls[0])))
+
+
+def test_write_many_deletes_the_written_files_when_a_write_fails(memory_storage):
+    memory_storage.fail_on = {"c"}
+
+    with pytest.raises(OSError):
+        memory_storage.write_many([(name, name.encode()) for name in "abcde"])
+
+    assert memory_storage.files == {}
+
+
+def test_read_many_reads_concurrently_in_order(memory_storage):
+    urls = memory_storage.write_many([(name, name.encode()) for name in "abcdefgh"])
+    memory_storage.max_concurrency = 0
+
+    assert memory_storage.read_many(urls) == [name.encode() for name in "abcdefgh"]
+    assert memory_storage.max_concurrency > 1
+
+
+def test_read_view_of_a_file(tmp_path):
+    storage = FileStorageManager(str(tmp_path))
+
+    empty = storage.write("a/empty", b"")
+    assert storage.read_view(empty) == memoryview(b"")
+
+    path = storage.write("a/data", b"0123456789")
+    view = storage.read_view(path)
+    assert bytes(view[2:5]) == b"234"
+    assert view.tobytes() == b"0123456789"
+
+
+def test_an_interrupted_write_leaves_no_partial_file(tmp_path, monkeypatch):
+    storage = FileStorageManager(str(tmp_path))
+    path = storage.write("a/data", b"previous")
+
+    def interrupt(source, destination):
+        raise KeyboardInterrupt()
+
+    with monkeypatch.context() as patch, pytest.raises(KeyboardInterrupt):
+        patch.setattr(os, "replace", interrupt)
+        storage.write("a/data", b"next")
+    with monkeypatch.context() as patch, pytest.raises(KeyboardInterrupt):
+        patch.setattr(os, "replace", interrupt)
+        storage.write("a/other", b"other")
+
+    assert sorted(os.listdir(tmp_path / "a")) == ["data"]
+    assert storage.read(path) == b"previous"
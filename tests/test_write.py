@@ -0,0 +1,60 @@
+import hashlib
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+from digitaltwin_dataspace.data.engine import engine
+from digitaltwin_dataspace.data.write import storage_key, write_result, write_results
+
+
+def _rows(table):
+    with engine.connect() as connection:
+        return connection.execute(select(table).order_by(table.c.date.asc())).fetchall()
+
+
+def test_write_results_mixes_copies_and_uploads(table_name, table):
+    start = datetime(2025, 1, 1)
+    write_result(table_name, "application/json", table, b'{"a": 1}', start, deduplicate=True)
+
+    # A copy first, then an upload, then a copy: the rows of the batch have different origins
+    write_results(table_name, "application/json", table, [
+        (b'{"a": 1}', start + timedelta(seconds=1)),
+        (b'{"b": 2}', start + timedelta(seconds=2)),
+        (b'{"a": 1}', start + timedelta(seconds=3)),
+    ], deduplicate=True)
+    # An upload first, then a copy
+    write_results(table_name, "application/json", table, [
+        (b'{"c": 3}', start + timedelta(seconds=4)),
+        (b'{"a": 1}', start + timedelta(seconds=5)),
+    ], deduplicate=True)
+
+    rows = _rows(table)
+    original = rows[0]
+    assert [row.copy_id for row in rows] == [None, original.id, None, original.id, None, original.id]
+    assert [row.data == original.data for row in rows] == [True, True, False, True, False, True]
+
+
+def test_write_results_deletes_the_uploads_when_one_fails(table_name, table, memory_storage):
+    start = datetime(2025, 1, 1)
+    results = [(f'{{"tick": {tick}}}'.encode(), start + timedelta(seconds=tick)) for tick in range(5)]
+    memory_storage.fail_on = {storage_key(table_name, results[3][1], hashlib.md5(results[3][0]).hexdigest())}
+
+    with pytest.raises(OSError):
+        write_results(table_name, "application/json", table, results)
+
+    assert _rows(table) == []
+    assert memory_storage.files == {}
+
+
+def test_write_results_deletes_the_uploads_when_the_insert_fails(table_name, table, memory_storage):
+    start = datetime(2025, 1, 1)
+    results = [(f'{{"tick": {tick}}}'.encode(), start + timedelta(seconds=tick)) for tick in range(5)]
+    table.drop(engine)
+
+    with pytest.raises(OperationalError):
+        write_results(table_name, "application/json", table, results)
+
+    assert memory_storage.max_concurrency > 1
+    assert memory_storage.files == {}